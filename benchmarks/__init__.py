@@ -0,0 +1,6 @@
+# Benchmarks hors ligne du chemin chaud du miner (prétraitement, inférence,
+# softmax, explication top-5, detect_image de bout en bout).
+#
+#   python -m benchmarks run --out bench/base.json
+#   python -m benchmarks run --out bench/new.json
+#   python -m benchmarks compare bench/base.json bench/new.json
@@ -0,0 +1,139 @@
+# benchmarks/__main__.py
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+
+# pas d'écriture dans le cache de graphe ORT de l'utilisateur pendant un bench
+os.environ.setdefault("ORT_GRAPH_CACHE_DIR", "")
+
+from benchmarks import compare as cmp  # noqa: E402
+from benchmarks.fixtures import FORMATS, SIZES, images, tiny_model  # noqa: E402
+from benchmarks.measure import bench  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODEL = os.path.join(ROOT, "services", "miner", "models", "detector.onnx")
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def _meta(det, model_path: str, tiny: bool, threads: int) -> dict:
+    import numpy as np
+    import onnxruntime as ort
+    import PIL
+
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git": _git_rev(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "onnxruntime": ort.__version__,
+        "pillow": PIL.__version__,
+        "cpu": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "ort_num_threads": threads,
+        "model": "tiny" if tiny else model_path,
+        "model_hash": det.model_hash,
+    }
+
+
+def run(args) -> None:
+    from services.miner.impl_onnx import OnnxDetector, _read_model_bytes
+
+    model_path = args.model
+    tiny = not os.path.exists(model_path)
+    tmp = None
+    if tiny:
+        tmp = tempfile.TemporaryDirectory()
+        model_path = tiny_model(os.path.join(tmp.name, "tiny.onnx"))
+        print(f"# {args.model} not found: using a generated tiny model", file=sys.stderr)
+
+    det = OnnxDetector(model_bytes=_read_model_bytes(model_path), labels=[], n_threads=args.threads)
+    imgs = images(args.sizes.split(","), [f.upper() for f in args.formats.split(",")])
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b.strip()]
+
+    from benchmarks.stages import stages
+
+    only = re.compile(args.only) if args.only else None
+    results = {}
+    for name, fn, items in stages(det, imgs, batch_sizes):
+        if only and not only.search(name):
+            continue
+        r = bench(fn, items, min_iters=args.min_iters, max_iters=args.max_iters, min_time_s=args.min_time)
+        results[name] = r
+        print(f"{name:<36} p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f}  p99 {r['p99_ms']:9.3f}  "
+              f"{r['throughput_per_s']:10.1f}/s  peak +{r['peak_rss_delta_mb']} MB", flush=True)
+
+    out = {"meta": _meta(det, model_path, tiny, args.threads), "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(out, f, indent=2)
+        print(f"# results: {args.out}")
+    if tmp is not None:
+        tmp.cleanup()
+
+
+def compare(args) -> None:
+    rows, warnings = cmp.compare(cmp.load(args.base), cmp.load(args.new), args.threshold, args.metric)
+    cmp.print_table(rows, warnings, args.metric)
+    regressions = [r for r in rows if r["status"] == "regression"]
+    if regressions:
+        print(f"# {len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks", description="benchmarks du chemin chaud du miner")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="mesure chaque étape + detect_image de bout en bout")
+    r.add_argument("--model", default=os.getenv("MODEL_PATH", DEFAULT_MODEL),
+                   help="détecteur ONNX ; absent = petit modèle généré")
+    r.add_argument("--sizes", default="small,medium,large", help=f"parmi {','.join(SIZES)}")
+    r.add_argument("--formats", default="jpeg,png", help=f"parmi {','.join(f.lower() for f in FORMATS)}")
+    r.add_argument("--batch-sizes", default="1,8")
+    r.add_argument("--threads", type=int, default=int(os.getenv("ORT_NUM_THREADS", "1")))
+    r.add_argument("--min-iters", type=int, default=20)
+    r.add_argument("--max-iters", type=int, default=2000)
+    r.add_argument("--min-time", type=float, default=1.0, help="secondes minimum par étape")
+    r.add_argument("--only", help="regex sur le nom des étapes")
+    r.add_argument("--out", help="fichier JSON de résultats")
+    r.set_defaults(fn=run)
+
+    c = sub.add_parser("compare", help="compare deux runs, code retour 1 si régression")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.10, help="écart relatif toléré (0.10 = 10 %%)")
+    c.add_argument("--metric", default="p50_ms", choices=("p50_ms", "p95_ms", "p99_ms", "mean_ms"))
+    c.set_defaults(fn=compare)
+
+    args = ap.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
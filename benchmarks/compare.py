@@ -0,0 +1,55 @@
+# benchmarks/compare.py
+import json
+from typing import Any, Dict, List, Tuple
+
+# méta-données qui rendent deux runs non comparables si elles diffèrent
+_META_KEYS = ("cpu", "cpu_count", "ort_num_threads", "model_hash", "onnxruntime", "numpy", "pillow", "python")
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float = 0.10,
+            metric: str = "p50_ms") -> Tuple[List[Dict[str, Any]], List[str]]:
+    # -> (lignes par étape, avertissements) ; statut "regression" si new > base * (1 + threshold)
+    warnings = [
+        f"{k}: {base['meta'].get(k)!r} -> {new['meta'].get(k)!r}"
+        for k in _META_KEYS
+        if base.get("meta", {}).get(k) != new.get("meta", {}).get(k)
+    ]
+    rows = []
+    b_res, n_res = base["results"], new["results"]
+    for name in b_res:
+        if name not in n_res:
+            continue
+        b, n = b_res[name][metric], n_res[name][metric]
+        ratio = n / b if b else float("inf")
+        status = "ok"
+        if ratio > 1.0 + threshold:
+            status = "regression"
+        elif ratio < 1.0 - threshold:
+            status = "improved"
+        rows.append({
+            "stage": name,
+            "base": b,
+            "new": n,
+            "ratio": round(ratio, 3),
+            "p99_ratio": round(n_res[name]["p99_ms"] / b_res[name]["p99_ms"], 3) if b_res[name]["p99_ms"] else None,
+            "status": status,
+        })
+    missing = sorted(set(b_res) ^ set(n_res))
+    if missing:
+        warnings.append("stages present in only one run: " + ", ".join(missing))
+    return rows, warnings
+
+
+def print_table(rows: List[Dict[str, Any]], warnings: List[str], metric: str) -> None:
+    for w in warnings:
+        print(f"warning: {w}")
+    width = max([len(r["stage"]) for r in rows] + [5])
+    print(f"{'stage':<{width}}  {'base ' + metric:>14}  {'new ' + metric:>14}  {'ratio':>7}  {'p99':>7}  status")
+    for r in rows:
+        p99 = f"{r['p99_ratio']:.2f}x" if r["p99_ratio"] is not None else "-"
+        print(f"{r['stage']:<{width}}  {r['base']:>14.3f}  {r['new']:>14.3f}  {r['ratio']:>6.2f}x  {p99:>7}  {r['status']}")
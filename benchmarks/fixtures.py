@@ -0,0 +1,88 @@
+# benchmarks/fixtures.py
+import base64
+import io
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# tailles (nom, largeur, hauteur) : vignette web, photo 2 MP, capteur 12 MP
+SIZES = {
+    "small": (640, 480),
+    "medium": (1920, 1080),
+    "large": (4000, 3000),
+}
+FORMATS = ("JPEG", "PNG", "WEBP")
+_MIME = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def make_image(width: int, height: int, fmt: str, seed: int = 0) -> bytes:
+    # dégradés + bruit : se compresse comme une vraie photo (ni uni, ni bruit pur)
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    rgb[..., 0] = (x * 0.7 + y * 0.3).astype(np.uint8)
+    rgb[..., 1] = ((x + y) % 256).astype(np.uint8)
+    rgb[..., 2] = (255 - y + rng.integers(0, 16, size=(height, 1), dtype=np.uint8)).astype(np.uint8)
+    buf = io.BytesIO()
+    opts = {"quality": 90} if fmt in ("JPEG", "WEBP") else {}
+    Image.fromarray(rgb).save(buf, fmt, **opts)
+    return buf.getvalue()
+
+
+def data_url(data: bytes, fmt: str) -> str:
+    return f"data:{_MIME[fmt]};base64,{base64.b64encode(data).decode()}"
+
+
+def images(sizes: List[str], formats: List[str]) -> Dict[str, Tuple[bytes, str]]:
+    # "medium.jpeg" -> (octets, data URL)
+    out = {}
+    for name in sizes:
+        w, h = SIZES[name]
+        for fmt in formats:
+            data = make_image(w, h, fmt)
+            out[f"{name}.{fmt.lower()}"] = (data, data_url(data, fmt))
+    return out
+
+
+def tiny_model(path: str, classes: int = 1000, size: int = 224) -> str:
+    # petit CNN (3 Conv/BN/Relu + GAP + Gemm), batch dynamique, même E/S que
+    # detector.onnx : utilisé quand le vrai modèle n'est pas téléchargé
+    try:
+        import onnx
+        from onnx import TensorProto, helper, numpy_helper
+    except ImportError:
+        raise SystemExit("detector.onnx not found and `onnx` is not installed (pip install onnx) for the tiny model")
+
+    rng = np.random.default_rng(0)
+    inits = []
+    nodes = []
+    prev, c = "input", 3
+    for i, co in enumerate((16, 32, 64)):
+        inits.append(numpy_helper.from_array((rng.standard_normal((co, c, 3, 3)) * 0.1).astype(np.float32), f"w{i}"))
+        for n, v in (("s", np.ones(co)), ("b", np.zeros(co)), ("m", np.zeros(co)), ("v", np.ones(co))):
+            inits.append(numpy_helper.from_array(v.astype(np.float32), f"{n}{i}"))
+        nodes.append(helper.make_node("Conv", [prev, f"w{i}"], [f"c{i}"], pads=[1, 1, 1, 1], strides=[2, 2]))
+        nodes.append(helper.make_node("BatchNormalization", [f"c{i}", f"s{i}", f"b{i}", f"m{i}", f"v{i}"], [f"n{i}"]))
+        nodes.append(helper.make_node("Relu", [f"n{i}"], [f"r{i}"]))
+        prev, c = f"r{i}", co
+    inits.append(numpy_helper.from_array((rng.standard_normal((c, classes)) * 0.1).astype(np.float32), "fc_w"))
+    inits.append(numpy_helper.from_array(np.zeros(classes, dtype=np.float32), "fc_b"))
+    nodes += [
+        helper.make_node("GlobalAveragePool", [prev], ["gap"]),
+        helper.make_node("Flatten", ["gap"], ["flat"]),
+        helper.make_node("Gemm", ["flat", "fc_w", "fc_b"], ["logits"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "tiny_detector",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 3, size, size])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["N", classes])],
+        inits,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8  # lisible par les onnxruntime plus anciens
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    onnx.save(model, path)
+    return path
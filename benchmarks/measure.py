@@ -0,0 +1,67 @@
+# benchmarks/measure.py
+import resource
+import statistics
+import time
+from typing import Any, Callable, Dict
+
+
+def proc_kb(field: str) -> int:
+    # VmRSS / VmHWM (Linux) ; repli sur ru_maxrss ailleurs
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak() -> bool:
+    # remet VmHWM au RSS courant (Linux >= 4.0) : pic mesuré par étape
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _pct(sorted_ms, q: float) -> float:
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * q))]
+
+
+def bench(
+    fn: Callable[[], Any],
+    items_per_call: int = 1,
+    min_iters: int = 20,
+    max_iters: int = 2000,
+    min_time_s: float = 1.0,
+    warmup: int = 3,
+) -> Dict[str, Any]:
+    # au moins min_iters appels, puis jusqu'à min_time_s (borné par max_iters)
+    for _ in range(warmup):
+        fn()
+    peak_ok = reset_peak()
+    base_kb = proc_kb("VmRSS")
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_iters or (len(times) < max_iters and time.perf_counter() - start < min_time_s):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    total_s = time.perf_counter() - start
+    peak_kb = proc_kb("VmHWM")
+    times.sort()
+    return {
+        "n": len(times),
+        "items_per_call": items_per_call,
+        "p50_ms": round(statistics.median(times), 4),
+        "p95_ms": round(_pct(times, 0.95), 4),
+        "p99_ms": round(_pct(times, 0.99), 4),
+        "mean_ms": round(statistics.fmean(times), 4),
+        "throughput_per_s": round(len(times) * items_per_call / total_s, 2),
+        "peak_rss_mb": round(peak_kb / 1024.0, 1),
+        # pic au-dessus du RSS d'avant l'étape (None si VmHWM non réinitialisable)
+        "peak_rss_delta_mb": round((peak_kb - base_kb) / 1024.0, 1) if peak_ok else None,
+    }
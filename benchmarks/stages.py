@@ -0,0 +1,91 @@
+# benchmarks/stages.py
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from services.common import metrics
+from services.miner import impl_onnx
+from services.miner import preprocess as pp
+
+Stage = Tuple[str, Callable[[], Any], int]  # (nom, appel, items par appel)
+
+
+def _without_metrics(fn: Callable[..., Any], *args: Any) -> Any:
+    metrics.set_enabled(False)
+    try:
+        return fn(*args)
+    finally:
+        metrics.set_enabled(True)
+
+
+def metric_stages() -> List[Stage]:
+    # surcoût unitaire de l'instrumentation (services/common/metrics.py)
+    c = metrics.Counter("bench_counter", "bench", ["outcome"])
+    h = metrics.Histogram("bench_seconds", "bench", ["stage"])
+    child = h.labels("decode")
+    child.observe(0.001)
+
+    def _timer() -> None:
+        with child.time():
+            pass
+
+    return [
+        ("metrics.counter_inc", lambda: c.labels("ok").inc(), 1),
+        ("metrics.histogram_labels_observe", lambda: h.labels("decode").observe(0.003), 1),
+        ("metrics.histogram_observe", lambda: child.observe(0.003), 1),
+        ("metrics.timer", _timer, 1),
+        ("metrics.render", metrics.render, 1),
+    ]
+
+
+def stages(
+    det: "impl_onnx.OnnxDetector",
+    imgs: Dict[str, Tuple[bytes, str]],
+    batch_sizes: List[int],
+) -> List[Stage]:
+    # une étape = une fonction du chemin chaud appelée seule, puis detect_image complet
+    out: List[Stage] = []
+    size = pp.IMG_SIZE
+
+    for key, (data, url) in imgs.items():
+        out.append((f"decode_b64[{key}]", lambda u=url: pp.decode_b64(u), 1))
+        out.append((f"load_rgb_crop[{key}]", lambda d=data: pp.load_rgb_crop(d, size), 1))
+        # chemin chaud : écrit dans un buffer réutilisé
+        buf = np.empty((1, 3, size, size), dtype=np.float32)
+        out.append((f"preprocess_into[{key}]", lambda d=data, b=buf: pp.preprocess_into(d, b[0]), 1))
+        # variante allouante (b64 -> tenseur neuf)
+        out.append((f"preprocess_b64[{key}]", lambda u=url: impl_onnx._preprocess_b64(u), 1))
+
+    data0, url0 = next(iter(imgs.values()))
+    rgb = pp.load_rgb_crop(data0, size)
+    x1 = np.empty((1, 3, size, size), dtype=np.float32)
+    out.append(("normalize_into", lambda: pp.normalize_into(rgb, x1[0]), 1))
+    pp.normalize_into(rgb, x1[0])
+
+    rng = np.random.default_rng(0)
+    out.append(("inference[b1]", lambda: det._inference(x1), 1))
+    for n in batch_sizes:
+        if n > 1:
+            xn = np.repeat(x1, n, axis=0)
+            out.append((f"inference_batch[b{n}]", lambda x=xn: det._inference_batch(x), n))
+    for n in sorted({1, *batch_sizes}):
+        logits = rng.standard_normal((n, 1000)).astype(np.float32)
+        out.append((f"softmax[b{n}]", lambda l=logits: impl_onnx._softmax(l), n))
+
+    probs = det._inference_batch(x1)[0]
+    out.append(("format_top1", lambda: det._format(probs, False), 1))
+    out.append(("format_top5_explanation", lambda: det._format(probs, True), 1))
+
+    for key, (_data, url) in imgs.items():
+        out.append((f"detect_image[{key}]", lambda u=url: det.detect_image(u, False), 1))
+    out.append(("detect_image_explanation", lambda: det.detect_image(url0, True), 1))
+    # même appel que detect_image[<1re image>], observations coupées :
+    # l'écart = coût des métriques par image
+    key0 = next(iter(imgs))
+    out.append((f"detect_image_nometrics[{key0}]", lambda: _without_metrics(det.detect_image, url0, False), 1))
+    for n in batch_sizes:
+        if n > 1 and det.dynamic_batch:
+            items = [(url0, False)] * n
+            out.append((f"detect_batch[b{n}]", lambda it=items: det.detect_batch(it), n))
+    out.extend(metric_stages())
+    return out
@@ -2,7 +2,7 @@
 set -euo pipefail
 source .venv/bin/activate
 python - <<'PY'
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from pydantic import BaseModel
 import uvicorn
 
@@ -19,6 +19,12 @@ async def dispatch_image(req: ImageReq):
     return {"ok": True, "type": "image", "received": req.model_dump(),
             "detections": [{"label": "stub-cat", "score": 0.99}]}
 
+@app.post("/dispatch/image/raw")
+async def dispatch_image_raw(request: Request):
+    data = await request.body()
+    return {"ok": True, "type": "image", "received_bytes": len(data),
+            "detections": [{"label": "stub-cat", "score": 0.99}]}
+
 class VideoReq(BaseModel):
     video_url: str | None = None
 
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# Coût de l'établissement de connexion : un AsyncClient neuf par requête
+# (ancien comportement gateway/scheduler) contre un ClientPool keep-alive
+# (services/common/http.py), à même concurrence.
+#
+# Cible : petit serveur uvicorn local (défaut, aucun réseau) ou --url d'un
+# service existant (ex. http://miner1:6061/health, http://scheduler:7080/health).
+#
+#   python scripts/bench_http_pool.py --requests 2000 --concurrency 8
+#   python scripts/bench_http_pool.py --url http://127.0.0.1:6061/health --concurrency 16
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+from services.common.http import ClientPool  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _local_server() -> str:
+    # app ASGI minimale : on mesure le transport, pas le handler
+    import uvicorn
+
+    body = json.dumps({"status": "ok"}).encode()
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise SystemExit("local server did not start")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/"
+
+
+async def _run(mode: str, url: str, n: int, concurrency: int, timeout: float) -> Dict[str, Any]:
+    pool = ClientPool(f"bench_{mode}", timeout=timeout, max_connections=concurrency)
+    lat: List[float] = []
+    errors = 0
+    todo = iter(range(n))
+
+    async def _one() -> None:
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            if mode == "per_request":
+                async with httpx.AsyncClient(timeout=timeout) as cx:
+                    r = await cx.get(url)
+            else:
+                r = await pool.client.get(url)
+            r.raise_for_status()
+            lat.append((time.perf_counter() - t0) * 1000.0)
+        except Exception:
+            errors += 1
+
+    async def _worker() -> None:
+        for _ in todo:
+            await _one()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[_worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - t0
+    stats = pool.stats()
+    await pool.aclose()
+    lat.sort()
+    q = lambda p: round(lat[min(len(lat) - 1, int(len(lat) * p))], 3) if lat else None  # noqa: E731
+    return {
+        "mode": mode,
+        "requests": n,
+        "errors": errors,
+        "rps": round(len(lat) / wall, 1),
+        "p50_ms": q(0.50),
+        "p95_ms": q(0.95),
+        "p99_ms": q(0.99),
+        "mean_ms": round(statistics.fmean(lat), 3) if lat else None,
+        # per_request : une connexion par requête par construction
+        "connections_opened": stats["connections_opened"] if mode == "pooled" else n,
+        "avg_connect_ms": stats["avg_connect_ms"],
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="client par requête vs pool keep-alive")
+    ap.add_argument("--url", help="cible GET (défaut : serveur uvicorn local)")
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--warmup", type=int, default=50)
+    ap.add_argument("--out", help="fichier JSON de résultats")
+    args = ap.parse_args()
+
+    url = args.url or _local_server()
+    results = []
+    for mode in ("per_request", "pooled"):
+        asyncio.run(_run(mode, url, args.warmup, args.concurrency, args.timeout))
+        r = asyncio.run(_run(mode, url, args.requests, args.concurrency, args.timeout))
+        results.append(r)
+        print(f"{mode:<12} p50 {r['p50_ms']:8.3f} ms  p95 {r['p95_ms']:8.3f}  p99 {r['p99_ms']:8.3f}  "
+              f"{r['rps']:8.1f} req/s  connections {r['connections_opened']}  errors {r['errors']}", flush=True)
+    base, new = results
+    if base["p50_ms"] and new["p50_ms"]:
+        print(f"# connection setup per hop ~ {base['p50_ms'] - new['p50_ms']:.3f} ms (p50 difference), "
+              f"x{base['p50_ms'] / new['p50_ms']:.2f} p50, x{new['rps'] / base['rps']:.2f} throughput")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"url": url, "concurrency": args.concurrency, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
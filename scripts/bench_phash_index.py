@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# Benchmark de l'index de quasi-doublons (services/miner/phash.py) :
+# coût d'insertion, mémoire et latence de recherche à 1M entrées, comparés à
+# un balayage linéaire numpy (XOR + popcount) sur le même jeu de hashes.
+#
+#   python scripts/bench_phash_index.py                   # 1M entrées, distance 3
+#   python scripts/bench_phash_index.py --entries 200000 --distance 7
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from services.miner.phash import NearDupIndex  # noqa: E402
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return float("nan")
+
+
+def _flip(h: int, n: int, rng: random.Random) -> int:
+    for b in rng.sample(range(64), n):
+        h ^= 1 << b
+    return h
+
+
+def _pct(sorted_us, q):
+    return sorted_us[min(len(sorted_us) - 1, int(len(sorted_us) * q))]
+
+
+def _linear_scan(arr: np.ndarray, h: int, max_d: int) -> bool:
+    x = np.bitwise_xor(arr, np.uint64(h)).view(np.uint8).reshape(-1, 8)
+    d = _POPCOUNT8[x].sum(axis=1, dtype=np.uint16)
+    return bool((d <= max_d).any())
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="benchmark de l'index de quasi-doublons")
+    ap.add_argument("--entries", type=int, default=1_000_000)
+    ap.add_argument("--distance", type=int, default=3)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--linear-queries", type=int, default=20, help="requêtes pour le balayage linéaire")
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(args.entries)]
+    result = {"detections": [{"label": "x", "score": 0.5}]}
+
+    rss0 = _rss_mb()
+    index = NearDupIndex(max_entries=args.entries, max_distance=args.distance)
+    t0 = time.perf_counter()
+    for h in hashes:
+        index.insert(h, result)
+    build_s = time.perf_counter() - t0
+    rss1 = _rss_mb()
+
+    def _bench(queries):
+        lat = []
+        found = 0
+        for q in queries:
+            t = time.perf_counter()
+            found += index.lookup(q) is not None
+            lat.append((time.perf_counter() - t) * 1e6)
+        lat.sort()
+        return lat, found
+
+    misses = [rng.getrandbits(64) for _ in range(args.queries)]
+    near = [_flip(rng.choice(hashes), rng.randint(1, args.distance), rng) for _ in range(args.queries)]
+    lat_miss, f_miss = _bench(misses)
+    lat_near, f_near = _bench(near)
+
+    arr = np.array(hashes, dtype=np.uint64)
+    lin = []
+    for q in misses[: args.linear_queries]:
+        t = time.perf_counter()
+        _linear_scan(arr, q, args.distance)
+        lin.append((time.perf_counter() - t) * 1e6)
+    lin.sort()
+
+    print(f"# NearDupIndex: {args.entries} entrées, distance max {args.distance}")
+    print(f"build: {build_s:.2f} s ({args.entries / build_s:,.0f} insert/s), RSS +{rss1 - rss0:.0f} MB")
+    for name, lat, found in (("lookup miss", lat_miss, f_miss), ("lookup near", lat_near, f_near)):
+        print(f"{name:<12} p50 {statistics.median(lat):8.1f} us  p99 {_pct(lat, 0.99):8.1f} us  "
+              f"found {found}/{len(lat)}")
+    print(f"{'linear scan':<12} p50 {statistics.median(lin):8.1f} us  (numpy, {len(lin)} requêtes)")
+    print(f"stats: {index.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# Micro-benchmark du prétraitement miner : ancien pipeline (_preprocess_b64
+# d'origine : décodage pleine résolution + temporaires float32) vs module
+# partagé services/miner/preprocess.py (draft JPEG + buffer réutilisé).
+#
+# Chaque variante tourne dans un sous-process pour isoler le pic mémoire (RSS).
+#
+#   python scripts/bench_preprocess.py                # 12 MP, 30 itérations
+#   python scripts/bench_preprocess.py --mp 24 -n 50
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _make_image(path: str, megapixels: float, fmt: str) -> None:
+    import numpy as np
+    from PIL import Image
+
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    # dégradés + bruit : se compresse comme une vraie photo (ni uni, ni bruit pur)
+    x = np.linspace(0, 255, w, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(0)
+    rgb = np.empty((h, w, 3), dtype=np.uint8)
+    rgb[..., 0] = (x * 0.7 + y * 0.3).astype(np.uint8)
+    rgb[..., 1] = ((x + y) % 256).astype(np.uint8)
+    rgb[..., 2] = (255 - y + rng.integers(0, 16, size=(h, 1), dtype=np.uint8)).astype(np.uint8)
+    opts = {"quality": 90} if fmt in ("JPEG", "WEBP") else {}
+    Image.fromarray(rgb).save(path, fmt, **opts)
+
+
+def _legacy(data: bytes):
+    # copie conforme de l'ancien impl_onnx._preprocess_b64 (après décodage b64)
+    import numpy as np
+    from PIL import Image
+
+    mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    w, h = img.size
+    if w < h:
+        new_w, new_h = 256, int(h * 256 / w)
+    else:
+        new_h, new_w = 256, int(w * 256 / h)
+    img = img.resize((new_w, new_h), Image.BILINEAR)
+    left = (img.width - 224) // 2
+    top = (img.height - 224) // 2
+    img = img.crop((left, top, left + 224, top + 224))
+    x = np.asarray(img).astype(np.float32) / 255.0
+    x = (x - mean) / std
+    x = np.transpose(x, (2, 0, 1))
+    return np.expand_dims(x, 0)
+
+
+def _proc_kb(field: str) -> int:
+    # VmRSS / VmHWM (Linux) ; repli sur ru_maxrss ailleurs
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _reset_peak() -> None:
+    # remet VmHWM au RSS courant (Linux >= 4.0), sinon le pic des imports compte
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _worker(variant: str, path: str, n: int) -> dict:
+    import numpy as np  # noqa: F401  (imports hors mesure)
+    from PIL import Image  # noqa: F401
+    from services.miner import preprocess as pp
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if variant == "legacy":
+        fn = _legacy
+    else:
+        def fn(b):
+            x = pp.batch_buffer(1)
+            pp.preprocess_into(b, x[0])
+            return x
+
+    # RSS de référence : interpréteur + imports + octets de l'image
+    _reset_peak()
+    base_kb = _proc_kb("VmRSS")
+    fn(data)  # warmup (plugins PIL, buffer)
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn(data)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    peak_kb = _proc_kb("VmHWM")
+    times.sort()
+    return {
+        "variant": variant,
+        "n": n,
+        "p50_ms": round(statistics.median(times), 2),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 2),
+        "mean_ms": round(statistics.fmean(times), 2),
+        "peak_rss_mb": round(peak_kb / 1024.0, 1),
+        "peak_rss_delta_mb": round((peak_kb - base_kb) / 1024.0, 1),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="benchmark du prétraitement miner")
+    ap.add_argument("--mp", type=float, default=12.0, help="mégapixels de l'image de test")
+    ap.add_argument("--format", default="JPEG", choices=["JPEG", "PNG", "WEBP"])
+    ap.add_argument("-n", type=int, default=30, help="itérations par variante")
+    ap.add_argument("--worker", nargs=2, metavar=("VARIANT", "PATH"), help=argparse.SUPPRESS)
+    ap.add_argument("--json", action="store_true", help="sortie JSON uniquement")
+    args = ap.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker(args.worker[0], args.worker[1], args.n)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"bench.{args.format.lower()}")
+        _make_image(path, args.mp, args.format)
+        size_kb = os.path.getsize(path) / 1024.0
+        results = []
+        for variant in ("legacy", "shared"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", variant, path, "-n", str(args.n)],
+                check=True, capture_output=True, text=True,
+            )
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    report = {"megapixels": args.mp, "format": args.format, "file_kb": round(size_kb, 1), "results": results}
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"# {args.mp} MP {args.format} ({size_kb:.0f} KB), {args.n} itérations")
+    print(f"{'variant':<8} {'p50 ms':>8} {'p95 ms':>8} {'peak RSS MB':>12} {'Δ RSS MB':>9}")
+    for r in results:
+        print(f"{r['variant']:<8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['peak_rss_mb']:>12} {r['peak_rss_delta_mb']:>9}")
+    legacy, shared = results
+    if shared["p50_ms"]:
+        print(f"speedup p50: x{legacy['p50_ms'] / shared['p50_ms']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# Générateur de charge en boucle ouverte pour gateway -> scheduler -> miner.
+#
+# Les requêtes partent à des instants planifiés (débit cible, uniforme ou
+# Poisson) quel que soit le temps de réponse : un serveur lent ne ralentit pas
+# la charge. La latence est mesurée depuis l'instant *planifié* (correction de
+# l'omission coordonnée) ; le temps de service (depuis l'envoi réel) est
+# rapporté à part.
+#
+# Images : corpus local (--images DIR) ou synthétique, envoyées en b64
+# inline, en binaire, ou via source_url servies par un serveur HTTP local
+# (--mode url). Aucun accès internet.
+#
+#   python scripts/loadgen.py --rate 20 --duration 30
+#   python scripts/loadgen.py --sweep 5,10,20,40,80 --duration 20 --slo-ms 500
+#   python scripts/loadgen.py --saturate --start 5 --duration 15 --out load.json
+import argparse
+import asyncio
+import base64
+import functools
+import http.server
+import json
+import math
+import os
+import random
+import socketserver
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+_MIME = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+
+
+# ---------- Corpus ----------
+def _load_corpus(folder: Optional[str], synthetic: int, size: str) -> List[Dict[str, Any]]:
+    # -> [{"name", "data", "mime"}]
+    corpus = []
+    if folder:
+        for name in sorted(os.listdir(folder)):
+            ext = os.path.splitext(name)[1].lower()
+            if ext in IMAGE_EXTS:
+                with open(os.path.join(folder, name), "rb") as f:
+                    corpus.append({"name": name, "data": f.read(), "mime": _MIME[ext]})
+        if not corpus:
+            raise SystemExit(f"no image in {folder}")
+        return corpus
+    from benchmarks.fixtures import SIZES, make_image
+
+    w, h = SIZES[size]
+    for i in range(synthetic):
+        corpus.append({"name": f"synthetic-{i}.jpg", "data": make_image(w, h, "JPEG", seed=i), "mime": "image/jpeg"})
+    return corpus
+
+
+class _Quiet(http.server.SimpleHTTPRequestHandler):
+    # ?v=<jeton> : fichier + "#<jeton>" en fin, même queue unique qu'en b64 /
+    # binaire, sinon les caches par contenu (gateway, miner) répondraient
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path, _, query = self.path.partition("?")
+        token = urllib.parse.parse_qs(query).get("v", [""])[0]
+        if not token:
+            return super().do_GET()
+        try:
+            with open(self.translate_path(path), "rb") as f:
+                body = f.read() + f"#{token}".encode()
+        except OSError:
+            return self.send_error(404)
+        self.send_response(200)
+        self.send_header("content-type", self.guess_type(path))
+        self.send_header("content-length", str(len(body)))
+        self.send_header("cache-control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def _serve(folder: str, port: int) -> socketserver.TCPServer:
+    handler = functools.partial(_Quiet, directory=folder)
+    srv = _Server(("0.0.0.0", port), handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+# ---------- Histogramme ----------
+class Histogram:
+    # valeurs brutes (percentiles exacts) + compteurs par puissance de 2 en ms
+    def __init__(self) -> None:
+        self.values: List[float] = []
+
+    def record(self, ms: float) -> None:
+        self.values.append(ms)
+
+    def summary(self) -> Dict[str, Any]:
+        v = sorted(self.values)
+        if not v:
+            return {"count": 0}
+
+        def pct(q: float) -> float:
+            return round(v[min(len(v) - 1, int(len(v) * q))], 2)
+
+        buckets: Dict[str, int] = {}
+        for x in v:
+            ub = 2 ** max(0, math.ceil(math.log2(max(x, 1e-9))))
+            key = f"<={ub}ms"
+            buckets[key] = buckets.get(key, 0) + 1
+        return {
+            "count": len(v),
+            "mean": round(statistics.fmean(v), 2),
+            "p50": pct(0.50),
+            "p90": pct(0.90),
+            "p99": pct(0.99),
+            "p999": pct(0.999),
+            "max": round(v[-1], 2),
+            "buckets": buckets,
+        }
+
+
+# ---------- Requêtes ----------
+class Target:
+    def __init__(self, args: argparse.Namespace, corpus: List[Dict[str, Any]]) -> None:
+        self.url = args.gateway.rstrip("/") + "/v1/detect/image"
+        self.mode = args.mode
+        self.cache_bust = args.cache_bust
+        self.corpus = corpus
+        self.headers = {"x-api-key": args.api_key}
+        self.url_base = f"http://{args.serve_host}:{args.serve_port}/"
+        self.explain = args.explain
+        self._rng = random.Random(0)
+        # data URLs pré-encodées : le générateur ne doit pas être le goulot
+        self._b64 = [
+            f"data:{c['mime']};base64,{base64.b64encode(c['data']).decode()}" for c in corpus
+        ]
+
+    def request_kwargs(self, i: int) -> Dict[str, Any]:
+        k = i % len(self.corpus)
+        item = self.corpus[k]
+        # octets en fin de fichier ignorés par les décodeurs : rend chaque requête
+        # unique pour les caches exacts (gateway, miner), pas pour l'index dHash
+        tail = f"#{i}-{self._rng.getrandbits(32)}" if self.cache_bust else ""
+        if self.mode == "b64":
+            data = self._b64[k]
+            if tail:
+                data = f"data:{item['mime']};base64,{base64.b64encode(item['data'] + tail.encode()).decode()}"
+            return {"json": {"image_b64": data, "return_explanation": self.explain}, "headers": self.headers}
+        if self.mode == "binary":
+            return {
+                "content": item["data"] + tail.encode(),
+                "headers": {**self.headers, "content-type": item["mime"]},
+                "params": {"return_explanation": str(self.explain).lower()},
+            }
+        url = self.url_base + item["name"] + (f"?v={urllib.parse.quote(tail[1:])}" if tail else "")
+        return {"json": {"source_url": url, "return_explanation": self.explain}, "headers": self.headers}
+
+
+async def _one(cx: httpx.AsyncClient, target: Target, i: int, scheduled: float,
+               sem: asyncio.Semaphore, stats: Dict[str, Any]) -> None:
+    kwargs = target.request_kwargs(i)
+    async with sem:
+        sent = time.perf_counter()
+        try:
+            r = await cx.post(target.url, **kwargs)
+            status = r.status_code
+        except Exception as e:
+            status = type(e).__name__
+    done = time.perf_counter()
+    key = str(status)
+    stats["status"][key] = stats["status"].get(key, 0) + 1
+    if status == 200:
+        stats["latency"].record((done - scheduled) * 1000.0)
+        stats["service"].record((done - sent) * 1000.0)
+        stats["ok"] += 1
+        stats["last_ok"] = done
+    else:
+        stats["errors"] += 1
+
+
+async def run_step(cx: httpx.AsyncClient, target: Target, rate: float, duration: float,
+                   arrival: str, max_inflight: int, drain_s: float) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {
+        "latency": Histogram(), "service": Histogram(), "status": {}, "ok": 0, "errors": 0, "last_ok": 0.0,
+    }
+    sem = asyncio.Semaphore(max_inflight)
+    rng = random.Random(int(rate * 1000))
+    tasks = []
+    start = time.perf_counter()
+    t = 0.0
+    i = 0
+    while t < duration:
+        scheduled = start + t
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_one(cx, target, i, scheduled, sem, stats)))
+        i += 1
+        t += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    sent_end = time.perf_counter()
+    done, pending = await asyncio.wait(tasks, timeout=drain_s) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    # fenêtre = durée nominale, ou jusqu'à la dernière réponse si le serveur traîne
+    window = max(duration, (stats["last_ok"] or sent_end) - start)
+    total = i
+    timeouts = len(pending)
+    return {
+        "offered_rps": rate,
+        # arrivées de Poisson : le débit réellement envoyé fluctue autour du cible
+        "sent_rps": round(total / duration, 2),
+        "sent": total,
+        "duration_s": round(window, 2),
+        "achieved_rps": round(stats["ok"] / window, 2),
+        "ok": stats["ok"],
+        "errors": stats["errors"] + timeouts,
+        "error_rate": round((stats["errors"] + timeouts) / total, 4) if total else 0.0,
+        "status": {**stats["status"], **({"unfinished": timeouts} if timeouts else {})},
+        "latency_ms": stats["latency"].summary(),
+        "service_ms": stats["service"].summary(),
+    }
+
+
+def _saturated(step: Dict[str, Any], slo_ms: Optional[float], max_error_rate: float) -> Optional[str]:
+    if step["error_rate"] > max_error_rate:
+        return f"error rate {step['error_rate']:.1%}"
+    if step["achieved_rps"] < 0.95 * step["sent_rps"]:
+        return f"achieved {step['achieved_rps']} < 95% of {step['sent_rps']} rps sent"
+    p99 = step["latency_ms"].get("p99")
+    if slo_ms is not None and p99 is not None and p99 > slo_ms:
+        return f"p99 {p99} ms > SLO {slo_ms} ms"
+    return None
+
+
+def _print_step(step: Dict[str, Any]) -> None:
+    lat, svc = step["latency_ms"], step["service_ms"]
+    print(
+        f"offered {step['offered_rps']:7.1f} rps  achieved {step['achieved_rps']:7.1f}  "
+        f"err {step['error_rate']:6.1%}  p50 {lat.get('p50', '-'):>8}  p99 {lat.get('p99', '-'):>8}  "
+        f"p99.9 {lat.get('p999', '-'):>8} ms  (service p99 {svc.get('p99', '-')} ms)",
+        flush=True,
+    )
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    corpus = _load_corpus(args.images, args.synthetic, args.size)
+    srv = None
+    if args.mode == "url":
+        folder = args.images
+        if folder is None:
+            # corpus synthétique écrit dans un dossier temporaire servi en local
+            import tempfile
+
+            tmp = tempfile.mkdtemp(prefix="loadgen-")
+            for c in corpus:
+                with open(os.path.join(tmp, c["name"]), "wb") as f:
+                    f.write(c["data"])
+            folder = tmp
+        srv = _serve(folder, args.serve_port)
+    target = Target(args, corpus)
+
+    if args.saturate:
+        rates = [args.start * args.factor ** k for k in range(args.max_steps)]
+    elif args.sweep:
+        rates = [float(r) for r in args.sweep.split(",") if r.strip()]
+    else:
+        rates = [args.rate]
+
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    steps = []
+    saturation = None
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as cx:
+        if args.warmup > 0:
+            await run_step(cx, target, min(rates[0], 5.0), args.warmup, "uniform", args.max_inflight, args.timeout)
+        for rate in rates:
+            step = await run_step(cx, target, rate, args.duration, args.arrival, args.max_inflight, args.timeout)
+            steps.append(step)
+            _print_step(step)
+            reason = _saturated(step, args.slo_ms, args.max_error_rate)
+            if reason:
+                step["saturated"] = reason
+                if saturation is None:
+                    ok_steps = [s for s in steps if "saturated" not in s]
+                    saturation = {
+                        "saturated_at_rps": rate,
+                        "reason": reason,
+                        "max_sustained_rps": max((s["achieved_rps"] for s in ok_steps), default=None),
+                    }
+                if args.saturate or args.stop_on_saturation:
+                    break
+            if args.pause > 0:
+                await asyncio.sleep(args.pause)
+    if srv is not None:
+        srv.shutdown()
+
+    if saturation:
+        sustained = saturation["max_sustained_rps"]
+        print(f"# saturation at {saturation['saturated_at_rps']} rps ({saturation['reason']}); "
+              + (f"max sustained {sustained} rps" if sustained is not None else "already saturated at the first step"))
+    elif len(steps) > 1:
+        print("# no saturation reached")
+    return {
+        "config": {
+            "gateway": args.gateway, "mode": args.mode, "arrival": args.arrival, "duration_s": args.duration,
+            "corpus": len(corpus), "cache_bust": args.cache_bust, "slo_ms": args.slo_ms,
+        },
+        "steps": steps,
+        "saturation": saturation,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="générateur de charge en boucle ouverte (/v1/detect/image)")
+    ap.add_argument("--gateway", default=os.getenv("GATEWAY_URL", "http://127.0.0.1:7070"))
+    ap.add_argument("--api-key", default=os.getenv("API_KEY", "dev"))
+    ap.add_argument("--mode", choices=("b64", "binary", "url"), default="b64")
+    ap.add_argument("--images", help="dossier d'images (défaut : corpus synthétique)")
+    ap.add_argument("--synthetic", type=int, default=64, help="taille du corpus synthétique")
+    ap.add_argument("--size", default="small", choices=("small", "medium", "large"))
+    ap.add_argument("--serve-host", default="127.0.0.1", help="hôte du serveur d'images vu par le gateway (--mode url)")
+    ap.add_argument("--serve-port", type=int, default=8765)
+    ap.add_argument("--explain", action="store_true", help="return_explanation=true")
+    ap.add_argument("--cache-bust", action=argparse.BooleanOptionalAction, default=True,
+                    help="rend chaque requête unique pour les caches exacts")
+
+    ap.add_argument("--rate", type=float, default=10.0, help="débit cible (req/s)")
+    ap.add_argument("--sweep", help="liste de débits, ex. 5,10,20,40")
+    ap.add_argument("--saturate", action="store_true", help="débit x --factor jusqu'à saturation")
+    ap.add_argument("--start", type=float, default=5.0)
+    ap.add_argument("--factor", type=float, default=1.5)
+    ap.add_argument("--max-steps", type=int, default=20)
+    ap.add_argument("--stop-on-saturation", action="store_true")
+    ap.add_argument("--arrival", choices=("uniform", "poisson"), default="poisson")
+    ap.add_argument("--duration", type=float, default=20.0, help="secondes par palier")
+    ap.add_argument("--warmup", type=float, default=3.0, help="secondes de chauffe (non comptées)")
+    ap.add_argument("--pause", type=float, default=1.0, help="pause entre paliers")
+    ap.add_argument("--max-inflight", type=int, default=512)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--slo-ms", type=float, help="p99 max avant de considérer le palier saturé")
+    ap.add_argument("--max-error-rate", type=float, default=0.01)
+    ap.add_argument("--out", help="résultats JSON")
+    args = ap.parse_args()
+
+    result = asyncio.run(main_async(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"# results: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# Quantification INT8 du modèle miner (detector.onnx) + rapport de précision
+# et de latence contre le modèle FP32.
+#
+#  - dynamic : poids INT8, activations quantifiées à la volée (pas de calibration) ;
+#  - static  : poids + activations INT8 (format QDQ, par canal), plages calibrées
+#              sur un dossier d'images local. Recommandé pour ResNet (Conv).
+#
+# Rapport : accord top-1 / recouvrement top-5 sur les images d'évaluation et
+# latence p50/p99 batch 1 des deux modèles, avec les mêmes options de session
+# que le miner (OnnxDetector). Les images d'évaluation ne servent jamais à la
+# calibration : --eval-dir distinct, sinon une part (--holdout) de --calib-dir
+# est mise de côté avant calibration.
+#
+#   pip install onnx   # requis par onnxruntime.quantization
+#   python scripts/quantize_model.py --model services/miner/models/detector.onnx \
+#       --mode static --calib-dir ./calib --calib-max 200
+#   MODEL_PRECISION=int8 ./run-miner.sh   # charge detector.int8.onnx
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from services.miner.impl_onnx import OnnxDetector, _read_model_bytes  # noqa: E402
+from services.miner.preprocess import IMG_SIZE, preprocess_bytes  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")
+
+
+def _list_images(folder: str, limit: int) -> list:
+    paths = []
+    for dirpath, _dirs, files in os.walk(folder):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTS):
+                paths.append(os.path.join(dirpath, name))
+    paths.sort()
+    return paths[:limit] if limit > 0 else paths
+
+
+def _split_holdout(paths: list, fraction: float) -> tuple:
+    # tirage fixe (seed 0) : --report-only retrouve le même découpage
+    if fraction <= 0 or len(paths) < 2:
+        return paths, []
+    shuffled = list(paths)
+    random.Random(0).shuffle(shuffled)
+    n = min(len(paths) - 1, max(1, round(len(paths) * fraction)))
+    return sorted(shuffled[n:]), sorted(shuffled[:n])
+
+
+def _load_tensors(paths: list, size: int) -> list:
+    out = []
+    for p in paths:
+        with open(p, "rb") as f:
+            try:
+                out.append(preprocess_bytes(f.read(), size))
+            except Exception as e:
+                print(f"skip {p}: {e}", file=sys.stderr)
+    return out
+
+
+def _input_info(model_path: str):
+    import onnxruntime as ort
+
+    sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    inp = sess.get_inputs()[0]
+    size = inp.shape[-1] if isinstance(inp.shape[-1], int) else IMG_SIZE
+    return inp.name, size
+
+
+class _CalibReader:
+    # CalibrationDataReader : une image (1,3,s,s) par appel
+    def __init__(self, input_name: str, tensors: list) -> None:
+        self.input_name = input_name
+        self._it = iter(tensors)
+
+    def get_next(self):
+        x = next(self._it, None)
+        return None if x is None else {self.input_name: x}
+
+
+def _pre_process(model: str, tmpdir: str) -> str:
+    # inférence de formes + fusions : conseillé avant quantification
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    out = os.path.join(tmpdir, "preprocessed.onnx")
+    try:
+        quant_pre_process(model, out, skip_symbolic_shape=True)
+        return out
+    except Exception as e:
+        print(f"quant_pre_process failed ({e}), quantizing the raw model", file=sys.stderr)
+        return model
+
+
+def quantize(args, input_name: str, calib: list) -> None:
+    from onnxruntime.quantization import (
+        CalibrationMethod,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = _pre_process(args.model, tmp) if not args.no_pre_process else args.model
+        if args.mode == "dynamic":
+            quantize_dynamic(src, args.out, weight_type=QuantType.QInt8, per_channel=args.per_channel)
+            return
+        if not calib:
+            raise SystemExit("--mode static needs calibration images (--calib-dir)")
+        method = {
+            "minmax": CalibrationMethod.MinMax,
+            "entropy": CalibrationMethod.Entropy,
+            "percentile": CalibrationMethod.Percentile,
+        }[args.calib_method]
+        quantize_static(
+            src,
+            args.out,
+            _CalibReader(input_name, calib),
+            quant_format=QuantFormat.QDQ,
+            per_channel=args.per_channel,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=method,
+        )
+
+
+def _latency_ms(det: OnnxDetector, x: np.ndarray, runs: int, warmup: int) -> list:
+    for _ in range(warmup):
+        det._inference_batch(x)
+    lat = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        det._inference_batch(x)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    lat.sort()
+    return lat
+
+
+def _pct(sorted_ms: list, q: float) -> float:
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * q))]
+
+
+def report(args, size: int, evals: list, eval_source: str | None) -> dict:
+    dets = {
+        "fp32": OnnxDetector(model_bytes=_read_model_bytes(args.model), labels=[], n_threads=args.threads, precision="fp32"),
+        "int8": OnnxDetector(model_bytes=_read_model_bytes(args.out), labels=[], n_threads=args.threads, precision="int8"),
+    }
+    out = {
+        "mode": args.mode,
+        "calib_method": args.calib_method if args.mode == "static" else None,
+        "fp32_model": args.model,
+        "int8_model": args.out,
+        "size_mb": {
+            "fp32": round(os.path.getsize(args.model) / 1e6, 2),
+            "int8": round(os.path.getsize(args.out) / 1e6, 2),
+        },
+        "threads": args.threads,
+        "eval_images": len(evals),
+        "eval_source": eval_source,
+    }
+
+    if evals:
+        top1 = 0
+        top5 = 0.0
+        max_diff = 0.0
+        for x in evals:
+            p32 = dets["fp32"]._inference_batch(x)[0]
+            p8 = dets["int8"]._inference_batch(x)[0]
+            top1 += int(np.argmax(p32) == np.argmax(p8))
+            top5 += len(set(np.argsort(-p32)[:5]) & set(np.argsort(-p8)[:5])) / 5.0
+            max_diff = max(max_diff, float(np.max(np.abs(p32 - p8))))
+        out["top1_agreement"] = round(top1 / len(evals), 4)
+        out["top5_overlap"] = round(top5 / len(evals), 4)
+        out["max_abs_prob_diff"] = round(max_diff, 4)
+
+    x = evals[0] if evals else np.random.default_rng(0).standard_normal((1, 3, size, size), dtype=np.float32)
+    out["latency_ms"] = {}
+    for name, det in dets.items():
+        lat = _latency_ms(det, x, args.runs, args.warmup)
+        out["latency_ms"][name] = {
+            "p50": round(statistics.median(lat), 3),
+            "p99": round(_pct(lat, 0.99), 3),
+            "mean": round(statistics.fmean(lat), 3),
+        }
+    p50 = out["latency_ms"]
+    out["speedup_p50"] = round(p50["fp32"]["p50"] / p50["int8"]["p50"], 2) if p50["int8"]["p50"] else None
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="quantification INT8 du modèle miner + rapport")
+    ap.add_argument("--model", default=os.getenv("MODEL_PATH", "services/miner/models/detector.onnx"))
+    ap.add_argument("--out", help="défaut : <model sans .onnx>.int8.onnx (MODEL_PATH_INT8 du miner)")
+    ap.add_argument("--mode", choices=("dynamic", "static"), default="static")
+    ap.add_argument("--calib-dir", help="dossier d'images de calibration (requis en static)")
+    ap.add_argument("--calib-max", type=int, default=200)
+    ap.add_argument("--calib-method", choices=("minmax", "entropy", "percentile"), default="minmax")
+    ap.add_argument("--per-channel", action=argparse.BooleanOptionalAction, default=True)
+    ap.add_argument("--no-pre-process", action="store_true", help="saute quant_pre_process")
+    ap.add_argument("--eval-dir", help="images d'évaluation, distinctes de la calibration")
+    ap.add_argument("--holdout", type=float, default=0.2,
+                    help="sans --eval-dir : part de --calib-dir réservée à l'évaluation (mode static)")
+    ap.add_argument("--eval-max", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=int(os.getenv("ORT_NUM_THREADS", "1")))
+    ap.add_argument("--runs", type=int, default=100)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--report", help="défaut : <out>.report.json")
+    ap.add_argument("--report-only", action="store_true", help="ne requantifie pas, compare --out existant")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.model):
+        raise SystemExit(f"model not found: {args.model}")
+    args.out = args.out or os.path.splitext(args.model)[0] + ".int8.onnx"
+    args.report = args.report or os.path.splitext(args.out)[0] + ".report.json"
+
+    input_name, size = _input_info(args.model)
+    calib_paths = _list_images(args.calib_dir, 0) if args.calib_dir else []
+    same_dir = bool(args.eval_dir and args.calib_dir
+                    and os.path.realpath(args.eval_dir) == os.path.realpath(args.calib_dir))
+    if args.eval_dir and not same_dir:
+        eval_paths, eval_source = _list_images(args.eval_dir, args.eval_max), "eval_dir"
+    elif args.mode == "static":
+        # calibration et évaluation sur les mêmes images = accord surestimé
+        calib_paths, eval_paths = _split_holdout(calib_paths, args.holdout)
+        eval_source = "calib_holdout" if eval_paths else None
+        if not eval_paths:
+            print("no held-out images: pass --eval-dir or --holdout > 0 for an accuracy report", file=sys.stderr)
+    else:
+        # dynamic : --calib-dir ne sert pas à quantifier, on peut l'évaluer en entier
+        eval_paths, eval_source = calib_paths, "calib_dir" if calib_paths else None
+    if args.calib_max > 0:
+        calib_paths = calib_paths[:args.calib_max]
+    if args.eval_max > 0:
+        eval_paths = eval_paths[:args.eval_max]
+    calib = _load_tensors(calib_paths, size) if args.mode == "static" else []
+
+    if not args.report_only:
+        t0 = time.perf_counter()
+        quantize(args, input_name, calib)
+        print(f"# {args.mode} INT8 -> {args.out} ({time.perf_counter() - t0:.1f} s, {len(calib)} calibration images)")
+
+    evals = _load_tensors(eval_paths, size)
+    rep = report(args, size, evals, eval_source)
+    with open(args.report, "w") as f:
+        json.dump(rep, f, indent=2)
+
+    print(f"size: fp32 {rep['size_mb']['fp32']} MB, int8 {rep['size_mb']['int8']} MB")
+    if evals:
+        print(f"top-1 agreement {rep['top1_agreement']:.2%}  top-5 overlap {rep['top5_overlap']:.2%}  "
+              f"({len(evals)} images, {eval_source})")
+    for name, lat in rep["latency_ms"].items():
+        print(f"{name}: p50 {lat['p50']:.2f} ms  p99 {lat['p99']:.2f} ms  ({args.threads} thread(s))")
+    print(f"speedup p50 x{rep['speedup_p50']}  report: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# Nœud JSON-RPC factice pour tester l'éligibilité PRVX de la gateway sans
+# chaîne : répond à eth_call balanceOf(address) (appels simples et batch),
+# eth_chainId et eth_blockNumber, avec une latence réglable.
+#
+# Soldes : --balances fichier JSON {"0xadresse": wei, ...}, sinon dérivés de
+# l'adresse : dernier octet x 10^20 wei (dernier octet >= 0x0a -> >= 1000 PRVX,
+# éligible au seuil par défaut). Une adresse finissant par "dead" fait
+# reverter balanceOf (cache négatif côté gateway).
+#
+#   python scripts/stub_prvx_rpc.py --port 8545 --latency-ms 50
+#   PRVX_RPC_URL=http://127.0.0.1:8545 \
+#   PRVX_TOKEN_ADDRESS=0x1111111111111111111111111111111111111111 uvicorn services.gateway.app.main:app ...
+#   curl -s 127.0.0.1:8545/stats      # requêtes HTTP et eth_call reçus
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+_BALANCE_OF = "0x70a08231"
+
+
+class _State:
+    def __init__(self, balances: Dict[str, int], latency_s: float) -> None:
+        self.balances = balances
+        self.latency_s = latency_s
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.calls = 0
+
+
+def _balance(state: _State, address: str) -> int:
+    if address in state.balances:
+        return state.balances[address]
+    return int(address[-2:], 16) * 10 ** 20
+
+
+def _answer(state: _State, call: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"jsonrpc": "2.0", "id": call.get("id")}
+    method = call.get("method")
+    if method == "eth_chainId":
+        out["result"] = "0x1"
+    elif method == "eth_blockNumber":
+        out["result"] = hex(int(time.time()))
+    elif method == "eth_call":
+        data = ((call.get("params") or [{}])[0] or {}).get("data", "")
+        if not data.startswith(_BALANCE_OF) or len(data) != len(_BALANCE_OF) + 64:
+            out["error"] = {"code": -32602, "message": "unsupported call"}
+            return out
+        address = "0x" + data[-40:].lower()
+        with state.lock:
+            state.calls += 1
+        if address.endswith("dead"):
+            out["error"] = {"code": 3, "message": "execution reverted"}
+        else:
+            out["result"] = "0x" + format(_balance(state, address), "064x")
+    else:
+        out["error"] = {"code": -32601, "message": f"method not found: {method}"}
+    return out
+
+
+def _handler(state: _State):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def _send(self, body: Any) -> None:
+            raw = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self) -> None:
+            with state.lock:
+                self._send({"requests": state.requests, "batches": state.batches, "calls": state.calls})
+
+        def do_POST(self) -> None:
+            req = json.loads(self.rfile.read(int(self.headers.get("content-length", "0"))) or b"null")
+            with state.lock:
+                state.requests += 1
+                state.batches += isinstance(req, list)
+            if state.latency_s:
+                time.sleep(state.latency_s)
+            if isinstance(req, list):
+                self._send([_answer(state, c) for c in req])
+            else:
+                self._send(_answer(state, req or {}))
+
+    return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="nœud JSON-RPC factice (balanceOf PRVX)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8545)
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="latence ajoutée par requête HTTP")
+    ap.add_argument("--balances", help="fichier JSON {adresse: solde en wei}")
+    args = ap.parse_args()
+
+    balances: Dict[str, int] = {}
+    if args.balances:
+        with open(args.balances) as f:
+            balances = {k.lower(): int(v) for k, v in json.load(f).items()}
+    state = _State(balances, args.latency_ms / 1000.0)
+    server = ThreadingHTTPServer((args.host, args.port), _handler(state))
+    print(json.dumps({"listening": f"http://{args.host}:{args.port}", "latency_ms": args.latency_ms,
+                      "balances": len(balances)}))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# services/common/batching.py
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Micro-batching dynamique : les requêtes concurrentes sont regroupées en un seul
+# batch NCHW, borné par une taille max et une attente max (ms), puis exécutées
+# ensemble ; chaque appelant récupère son propre résultat.
+#
+# `run_batch(items) -> results` reçoit la liste des items et renvoie une liste de
+# même longueur ; un élément qui est une Exception fait échouer uniquement
+# l'appelant correspondant. Une exception levée par `run_batch` fait échouer tout
+# le batch. run_batch synchrone (miner : inférence) tourne dans `executor`,
+# une coroutine (scheduler : un POST par batch) directement sur la boucle.
+
+_Pending = Tuple[Any, asyncio.Future, float]
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_inflight_batches: int = 1,
+        executor: Optional[Executor] = None,
+        on_queue_wait: Optional[Callable[[float], None]] = None,
+    ) -> None:
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_inflight_batches = max(1, int(max_inflight_batches))
+        self.executor = executor
+        # appelé avec l'attente en file (s) de chaque item, ex. Histogram.observe
+        self.on_queue_wait = on_queue_wait
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+
+        # Métriques
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.size_hist: Dict[int, int] = {}
+        self.wait_ms_sum = 0.0
+        self.run_ms_sum = 0.0
+
+    # ---------- Cycle de vie ----------
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_inflight_batches)
+        self._task = asyncio.create_task(self._collect_loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        # réveille les appelants encore en file
+        while self._queue is not None and not self._queue.empty():
+            _item, fut, _t = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("batcher stopped"))
+
+    # ---------- API ----------
+    async def submit(self, item: Any) -> Any:
+        if self._queue is None:
+            raise RuntimeError("batcher not started")
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, fut, time.perf_counter()))
+        return await fut
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait_s * 1000.0, 3),
+            "max_inflight_batches": self.max_inflight_batches,
+            "queue_depth": self.queue_depth(),
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "avg_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+            "avg_queue_wait_ms": round(self.wait_ms_sum / self.items, 3) if self.items else 0.0,
+            "avg_batch_run_ms": round(self.run_ms_sum / self.batches, 3) if self.batches else 0.0,
+            "batch_size_hist": {str(k): v for k, v in sorted(self.size_hist.items())},
+        }
+
+    # ---------- Internals ----------
+    async def _collect_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        assert self._queue is not None and self._slots is not None
+        while True:
+            # un slot d'exécution libre avant de former le batch : pendant qu'un
+            # batch tourne, les requêtes s'accumulent et le suivant sera plus gros
+            await self._slots.acquire()
+            try:
+                batch: List[_Pending] = [await self._queue.get()]
+                deadline = loop.time() + self.max_wait_s
+                while len(batch) < self.max_batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    except asyncio.QueueEmpty:
+                        pass
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[_Pending]) -> None:
+        assert self._slots is not None
+        t0 = time.perf_counter()
+        items = [it for it, _fut, _t in batch]
+        if self.on_queue_wait is not None:
+            for _it, _fut, t in batch:
+                self.on_queue_wait(t0 - t)
+        try:
+            if asyncio.iscoroutinefunction(self.run_batch):
+                results = await self.run_batch(items)
+            else:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(self.executor, self.run_batch, items)
+            if len(results) != len(batch):
+                raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            self.errors += len(batch)
+            for _it, fut, _t in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for (_it, fut, _t), res in zip(batch, results):
+                if fut.done():
+                    continue
+                if isinstance(res, BaseException):
+                    self.errors += 1
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
+        finally:
+            self._slots.release()
+
+        n = len(batch)
+        self.batches += 1
+        self.items += n
+        self.size_hist[n] = self.size_hist.get(n, 0) + 1
+        self.wait_ms_sum += sum((t0 - t) * 1000.0 for _it, _fut, t in batch)
+        self.run_ms_sum += (time.perf_counter() - t0) * 1000.0
@@ -0,0 +1,68 @@
+# services/common/consensus.py
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Consensus d'un comité de miners sur une probabilité : z-score pour écarter
+# les valeurs aberrantes, moyenne tronquée des autres. Utilisé par le
+# validator (/assess) et, en direct, par le scheduler (fan-out multi-miners).
+
+# labels de détection qui portent une proba "image générée par IA" ; le score
+# top-1 d'une autre classe (chat 0.93, chien 0.91) n'en est pas une
+AI_LABELS = tuple(l.strip() for l in os.getenv("CONSENSUS_AI_LABELS", "").split(",") if l.strip())
+
+
+def trimmed_mean(vals: List[float], r: float) -> float:
+    vals = sorted(vals)
+    n, k = len(vals), int(len(vals)*r)
+    vals = vals[k:n-k] if n>2*k else vals
+    return float(np.mean(vals)) if len(vals) else 0.5
+
+
+def assess(probs: List[float], z_threshold: float = 2.0, trim_ratio: float = 0.2) -> Dict[str, Any]:
+    arr = np.array(probs, dtype=float)
+    mu, sigma = float(np.mean(arr)), float(np.std(arr)+1e-9)
+    z = np.abs((arr - mu)/sigma)
+    inliers = arr[z <= z_threshold]
+    outliers = arr[z > z_threshold]
+    consensus = trimmed_mean(inliers.tolist(), trim_ratio) if len(inliers) else trimmed_mean(arr.tolist(), trim_ratio)
+    std = float(np.std(inliers)) if len(inliers) else float(np.std(arr))
+    confidence = max(0.0, min(1.0, 1.0 - std)) * (len(inliers)/max(1,len(arr)))
+    return {
+        "consensus_prob": round(consensus,4),
+        "confidence": round(confidence,4),
+        "inliers": int(len(inliers)),
+        "outliers": int(len(outliers)),
+        "flags": []
+    }
+
+
+def agreeing(probs: List[float], tolerance: float) -> int:
+    # plus grand nombre de probas tenant dans un intervalle de largeur tolerance
+    vals = sorted(probs)
+    best, lo = 0, 0
+    for hi, v in enumerate(vals):
+        while v - vals[lo] > tolerance:
+            lo += 1
+        best = max(best, hi - lo + 1)
+    return best
+
+
+def miner_vote(result: Dict[str, Any], ai_labels: Sequence[str] = AI_LABELS) -> Optional[Tuple[str, float]]:
+    # (label, proba IA) : "prob" explicite (miners historiques) ou score d'une
+    # détection dont le label est une classe IA désignée ; None sinon (no_prob)
+    if isinstance(result.get("prob"), (int, float)):
+        return "prob", float(result["prob"])
+    for det in result.get("detections") or []:
+        if det.get("label") in ai_labels and isinstance(det.get("score"), (int, float)):
+            return det["label"], float(det["score"])
+    return None
+
+
+def agreeing_votes(votes: List[Tuple[str, float]], tolerance: float) -> int:
+    # agreeing() par label : deux votes ne s'accordent que sur le même label
+    by_label: Dict[str, List[float]] = {}
+    for label, p in votes:
+        by_label.setdefault(label, []).append(p)
+    return max((agreeing(ps, tolerance) for ps in by_label.values()), default=0)
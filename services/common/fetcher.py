@@ -0,0 +1,310 @@
+# services/common/fetcher.py
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from services.common import metrics
+from services.common.http import ClientPool
+from services.common.urlguard import FETCH_ALLOWED_HOSTS, check_public_url
+
+# Téléchargement des images distantes (gateway : source_url ; miner : repli
+# quand le corps ne porte que source_url), entièrement asynchrone :
+#  - lecture en flux, coupée dès FETCH_MAX_MB dépassé (Content-Length annoncé
+#    vérifié avant de lire) : jamais de corps entier non borné en mémoire ;
+#  - type reconnu sur les premiers octets (signatures JPEG/PNG/GIF/WebP/...),
+#    un corps qui n'est pas une image est abandonné avant d'être lu en entier ;
+#  - au plus FETCH_PER_HOST_CONCURRENCY téléchargements simultanés par hôte,
+#    connexions keep-alive partagées (ClientPool) ;
+#  - petit cache mémoire (LRU en octets) qui respecte Cache-Control / Expires
+#    et revalide par GET conditionnel (ETag / Last-Modified -> 304) ;
+#  - https et adresses publiques seulement, vérifié à chaque requête, redirections
+#    comprises (services/common/urlguard.py ; exemptions : FETCH_ALLOWED_HOSTS).
+
+FETCH_TIMEOUT_S = float(os.getenv("FETCH_TIMEOUT_S", "10"))
+FETCH_DEADLINE_S = float(os.getenv("FETCH_DEADLINE_S", "30"))  # total, corps compris
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "50"))
+FETCH_PER_HOST_CONCURRENCY = int(os.getenv("FETCH_PER_HOST_CONCURRENCY", "8"))
+FETCH_MAX_BYTES = int(float(os.getenv("FETCH_MAX_MB", os.getenv("MAX_IMAGE_MB", "10"))) * 1024 * 1024)
+FETCH_CACHE_MB = float(os.getenv("FETCH_CACHE_MB", "32"))  # 0 = pas de cache
+FETCH_CACHE_ENTRIES = int(os.getenv("FETCH_CACHE_ENTRIES", "1000"))
+FETCH_CACHE_MAX_TTL_S = float(os.getenv("FETCH_CACHE_MAX_TTL_S", "3600"))
+
+_CHUNK = 64 * 1024
+_SNIFF_BYTES = 32
+
+_REQUESTS = metrics.Counter("fetch_requests", "Téléchargements par fetcher et issue du cache", ["fetcher", "cache"])
+_ERRORS = metrics.Counter("fetch_errors", "Téléchargements en échec par fetcher et motif", ["fetcher", "reason"])
+_BYTES = metrics.Counter("fetch_bytes", "Octets reçus du réseau par fetcher", ["fetcher"])
+_SECONDS = metrics.Histogram("fetch_seconds", "Durée d'un téléchargement (cache compris)", ["fetcher"])
+_CACHE_BYTES = metrics.Gauge("fetch_cache_bytes", "Octets du cache de téléchargement", ["fetcher"])
+_HOST_WAITING = metrics.Gauge("fetch_host_waiting", "Téléchargements en attente d'un slot par hôte", ["fetcher"])
+
+
+class FetchError(Exception):
+    # status_code : statut HTTP à renvoyer au client (413, 415...)
+    def __init__(self, status_code: int, reason: str, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+
+
+class Fetched(NamedTuple):
+    data: bytes
+    content_type: str
+    cache: str  # "miss" | "hit" | "revalidated"
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:2] == b"BM":
+        return "image/bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis", b"heic", b"heix", b"mif1"):
+        return "image/avif" if head[8:11] == b"avi" else "image/heic"
+    return None
+
+
+def _freshness_s(headers: httpx.Headers) -> Optional[float]:
+    # durée de fraîcheur ; None = ne pas stocker (no-store, private, Vary: *)
+    cc = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        k, _, v = part.strip().partition("=")
+        if k:
+            cc[k] = v.strip('"')
+    if "no-store" in cc or "private" in cc or headers.get("vary", "").strip() == "*":
+        return None
+    if "no-cache" in cc:
+        return 0.0
+    age = float(headers["age"]) if headers.get("age", "").isdigit() else 0.0
+    for k in ("s-maxage", "max-age"):
+        if cc.get(k, "").isdigit():
+            return max(0.0, float(cc[k]) - age)
+    expires = headers.get("expires")
+    if expires:
+        try:
+            exp = parsedate_to_datetime(expires)
+            date = parsedate_to_datetime(headers["date"]) if headers.get("date") else None
+            now = date.timestamp() if date is not None else time.time()
+            return max(0.0, exp.timestamp() - now - age)
+        except (TypeError, ValueError, IndexError):
+            return 0.0
+    return 0.0  # pas d'info : revalidation à chaque usage (si ETag / Last-Modified)
+
+
+class _Entry:
+    __slots__ = ("data", "content_type", "etag", "last_modified", "fresh_until")
+
+    def __init__(self, data: bytes, content_type: str, headers: httpx.Headers, fresh_s: float) -> None:
+        self.data = data
+        self.content_type = content_type
+        self.etag = headers.get("etag")
+        self.last_modified = headers.get("last-modified")
+        self.fresh_until = time.monotonic() + min(fresh_s, FETCH_CACHE_MAX_TTL_S)
+
+
+class Fetcher:
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int = FETCH_MAX_BYTES,
+        timeout: float = FETCH_TIMEOUT_S,
+        max_connections: int = FETCH_MAX_CONNECTIONS,
+        per_host: int = FETCH_PER_HOST_CONCURRENCY,
+        cache_bytes: int = int(FETCH_CACHE_MB * 1024 * 1024),
+        cache_entries: int = FETCH_CACHE_ENTRIES,
+        require_image: bool = True,
+        allowed_hosts: Iterable[str] = FETCH_ALLOWED_HOSTS,
+    ) -> None:
+        self.name = name
+        self.max_bytes = max_bytes
+        self.per_host = max(1, per_host)
+        self.require_image = require_image
+        self.allowed_hosts = set(allowed_hosts)
+        self.pool = ClientPool(
+            name, timeout=timeout, max_connections=max_connections, follow_redirects=True,
+            event_hooks={"request": [self._guard]},
+        )
+        self._hosts: Dict[str, list] = {}  # hôte -> [Semaphore, utilisateurs]
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.cache_max_bytes = max(0, cache_bytes)
+        self.cache_max_entries = max(0, cache_entries)
+        self.cache_bytes = 0
+        self.counts: Dict[str, int] = {}
+        self.bytes_in = 0
+        self._requests = {c: _REQUESTS.labels(name, c) for c in ("miss", "hit", "revalidated")}
+        self._bytes = _BYTES.labels(name)
+        self._seconds = _SECONDS.labels(name)
+        self._waiting = 0
+        _CACHE_BYTES.labels(name).set_function(lambda: self.cache_bytes)
+        _HOST_WAITING.labels(name).set_function(lambda: self._waiting)
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+    # ---------- API ----------
+    async def fetch(self, url: str) -> Fetched:
+        t0 = time.perf_counter()
+        try:
+            res = await asyncio.wait_for(self._fetch(url), FETCH_DEADLINE_S)
+        except asyncio.TimeoutError:
+            self._error("deadline")
+            raise FetchError(504, "deadline", f"fetch exceeded {FETCH_DEADLINE_S:g}s")
+        except FetchError as e:
+            self._error(e.reason)
+            raise
+        except httpx.HTTPStatusError:
+            self._error("http_status")
+            raise
+        except httpx.HTTPError:
+            self._error("network")
+            raise
+        finally:
+            self._seconds.observe(time.perf_counter() - t0)
+        self.counts[res.cache] = self.counts.get(res.cache, 0) + 1
+        self._requests[res.cache].inc()
+        return res
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_bytes": self.max_bytes,
+            "per_host": self.per_host,
+            "hosts_active": len(self._hosts),
+            "waiting": self._waiting,
+            "requests": dict(self.counts),
+            "bytes_in": self.bytes_in,
+            "cache": {"entries": len(self._cache), "bytes": self.cache_bytes, "max_bytes": self.cache_max_bytes},
+            "http_pool": self.pool.stats(),
+        }
+
+    # ---------- Internals ----------
+    async def _guard(self, request: httpx.Request) -> None:
+        # appelé par httpx avant chaque requête, y compris après une redirection
+        try:
+            await check_public_url(str(request.url), self.allowed_hosts, "source_url")
+        except ValueError as e:
+            raise FetchError(400, "blocked", str(e))
+
+    def _error(self, reason: str) -> None:
+        self.counts["error"] = self.counts.get("error", 0) + 1
+        _ERRORS.labels(self.name, reason).inc()
+
+    async def _fetch(self, url: str) -> Fetched:
+        entry = self._cache.get(url)
+        if entry is not None and time.monotonic() < entry.fresh_until:
+            self._cache.move_to_end(url)
+            return Fetched(entry.data, entry.content_type, "hit")
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["if-none-match"] = entry.etag
+            if entry.last_modified:
+                headers["if-modified-since"] = entry.last_modified
+        async with self._host_slot(urlsplit(url).hostname or ""):
+            async with self.pool.client.stream("GET", url, headers=headers) as r:
+                if r.status_code == 304 and entry is not None:
+                    fresh_s = _freshness_s(r.headers)
+                    entry.fresh_until = time.monotonic() + min(fresh_s or 0.0, FETCH_CACHE_MAX_TTL_S)
+                    self._cache.move_to_end(url)
+                    return Fetched(entry.data, entry.content_type, "revalidated")
+                r.raise_for_status()
+                data, content_type = await self._read(r)
+        self._store(url, data, content_type, r.headers)
+        return Fetched(data, content_type, "miss")
+
+    async def _read(self, r: httpx.Response) -> tuple[bytes, str]:
+        declared = r.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        length = r.headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            raise FetchError(413, "too_large", f"remote image too large ({int(length)} > {self.max_bytes} bytes)")
+        buf = bytearray()
+        content_type: Optional[str] = None
+        async for chunk in r.aiter_bytes(_CHUNK):
+            buf += chunk
+            self.bytes_in += len(chunk)
+            self._bytes.inc(len(chunk))
+            if len(buf) > self.max_bytes:
+                raise FetchError(413, "too_large", f"remote image too large (> {self.max_bytes} bytes)")
+            if content_type is None and len(buf) >= _SNIFF_BYTES:
+                content_type = self._content_type(bytes(buf[:_SNIFF_BYTES]), declared)
+        if not buf:
+            raise FetchError(400, "empty", "empty remote body")
+        if content_type is None:
+            content_type = self._content_type(bytes(buf[:_SNIFF_BYTES]), declared)
+        return bytes(buf), content_type
+
+    def _content_type(self, head: bytes, declared: str) -> str:
+        sniffed = sniff_image_type(head)
+        if sniffed is not None:
+            return sniffed
+        if declared.startswith("image/") or not self.require_image:
+            return declared or "application/octet-stream"
+        raise FetchError(415, "not_image", f"remote body is not an image (content-type: {declared or 'none'})")
+
+    def _store(self, url: str, data: bytes, content_type: str, headers: httpx.Headers) -> None:
+        if not self.cache_max_bytes or not self.cache_max_entries:
+            return
+        fresh_s = _freshness_s(headers)
+        if fresh_s is None or len(data) > self.cache_max_bytes // 4:
+            return
+        if fresh_s <= 0 and not (headers.get("etag") or headers.get("last-modified")):
+            return  # ni fraîcheur ni validateur : rien à réutiliser
+        old = self._cache.pop(url, None)
+        if old is not None:
+            self.cache_bytes -= len(old.data)
+        self._cache[url] = _Entry(data, content_type, headers, fresh_s)
+        self.cache_bytes += len(data)
+        while self._cache and (self.cache_bytes > self.cache_max_bytes or len(self._cache) > self.cache_max_entries):
+            _, ev = self._cache.popitem(last=False)
+            self.cache_bytes -= len(ev.data)
+
+    def _host_slot(self, host: str) -> "_HostSlot":
+        return _HostSlot(self, host)
+
+
+class _HostSlot:
+    # sémaphore par hôte, retiré du dict quand plus personne ne l'utilise
+    def __init__(self, fetcher: Fetcher, host: str) -> None:
+        self.fetcher = fetcher
+        self.host = host
+
+    async def __aenter__(self) -> None:
+        f = self.fetcher
+        slot = f._hosts.get(self.host)
+        if slot is None:
+            slot = f._hosts[self.host] = [asyncio.Semaphore(f.per_host), 0]
+        slot[1] += 1
+        if slot[0].locked():
+            f._waiting += 1
+            try:
+                await slot[0].acquire()
+            except BaseException:
+                self._leave(slot)
+                raise
+            finally:
+                f._waiting -= 1
+        else:
+            await slot[0].acquire()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        slot = self.fetcher._hosts[self.host]
+        slot[0].release()
+        self._leave(slot)
+
+    def _leave(self, slot: list) -> None:
+        slot[1] -= 1
+        if slot[1] == 0:
+            self.fetcher._hosts.pop(self.host, None)
@@ -0,0 +1,170 @@
+# services/common/http.py
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from services.common import metrics
+
+# Clients HTTP de la durée de vie de l'app : connexions keep-alive réutilisées
+# entre requêtes au lieu d'un AsyncClient (donc d'un TCP/TLS neuf) par appel.
+# Un ClientPool = un AsyncClient + ses limites ; un pool par amont (scheduler,
+# chaque miner, fetch d'images externes) pour borner chacun séparément.
+#
+# HTTP/2 : négocié par ALPN sur https:// (amont derrière un proxy TLS) ;
+# uvicorn ne parle que HTTP/1.1, un miner en http:// reste en HTTP/1.1.
+# Nécessite le paquet h2 (pip install 'httpx[http2]'), sinon repli HTTP/1.1.
+
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+
+log = logging.getLogger("uvicorn.error")
+
+_REQUESTS = metrics.Counter("http_client_requests", "Requêtes sortantes par pool", ["pool"])
+_ERRORS = metrics.Counter("http_client_errors", "Requêtes sortantes en échec (réseau, timeout) par pool", ["pool"])
+_CONNECTS = metrics.Counter("http_client_connections_opened", "Connexions TCP ouvertes par pool", ["pool"])
+_CONNECT_SECONDS = metrics.Histogram(
+    "http_client_connect_seconds", "Établissement de connexion (TCP + TLS) par pool", ["pool", "phase"],
+)
+_INFLIGHT = metrics.Gauge("http_client_inflight", "Requêtes en cours par pool", ["pool"])
+_CONNECTIONS = metrics.Gauge("http_client_connections", "Connexions ouvertes par pool et état", ["pool", "state"])
+
+
+def _has_h2() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _TracedTransport(httpx.AsyncBaseTransport):
+    # compte les requêtes en cours et chronomètre l'ouverture des connexions
+    # (extension "trace" d'httpcore : aucun coût sur une connexion réutilisée)
+    def __init__(self, inner: httpx.AsyncHTTPTransport, pool: "ClientPool") -> None:
+        self.inner = inner
+        self.pool = pool
+
+    def _tracer(self):
+        started: Dict[str, float] = {}
+        pool = self.pool
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            if not event.startswith("connection.") or event.endswith(".failed"):
+                return
+            step, _, phase = event[len("connection."):].rpartition(".")
+            if phase == "started":
+                started[step] = time.perf_counter()
+            elif phase == "complete" and step in ("connect_tcp", "start_tls") and step in started:
+                dt = time.perf_counter() - started.pop(step)
+                pool._connect_hist[step].observe(dt)
+                if step == "connect_tcp":
+                    pool.connects += 1
+                    pool._connects.inc()
+                pool.connect_s += dt
+        return trace
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pool = self.pool
+        request.extensions.setdefault("trace", self._tracer())
+        pool.requests += 1
+        pool.in_flight += 1
+        pool._requests.inc()
+        try:
+            return await self.inner.handle_async_request(request)
+        except Exception:
+            pool.errors += 1
+            pool._errors.inc()
+            raise
+        finally:
+            pool.in_flight -= 1
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ClientPool:
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        max_connections: int = 100,
+        max_keepalive: Optional[int] = None,
+        http2: bool = False,
+        follow_redirects: bool = False,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY_S,
+        event_hooks: Optional[Dict[str, list]] = None,
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive if max_keepalive is not None else max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and not _has_h2():
+            log.warning("http pool %s: h2 not installed, falling back to HTTP/1.1", name)
+            http2 = False
+        self.http2 = http2
+        self.follow_redirects = follow_redirects
+        self.event_hooks = event_hooks
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.connects = 0
+        self.connect_s = 0.0
+        self._requests = _REQUESTS.labels(name)
+        self._errors = _ERRORS.labels(name)
+        self._connects = _CONNECTS.labels(name)
+        self._connect_hist = {p: _CONNECT_SECONDS.labels(name, p) for p in ("connect_tcp", "start_tls")}
+        _INFLIGHT.labels(name).set_function(lambda: self.in_flight)
+        _CONNECTIONS.labels(name, "active").set_function(lambda: self._connection_counts()[0])
+        _CONNECTIONS.labels(name, "idle").set_function(lambda: self._connection_counts()[1])
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # créé au premier usage (dans la boucle de l'app), fermé par aclose()
+        if self._client is None or self._client.is_closed:
+            self._transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            self._client = httpx.AsyncClient(
+                transport=_TracedTransport(self._transport, self),
+                timeout=self.timeout,
+                follow_redirects=self.follow_redirects,
+                event_hooks=self.event_hooks,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._transport = None
+
+    def _connection_counts(self) -> tuple:
+        # connexions du pool httpcore : (actives, inactives keep-alive)
+        pool = getattr(self._transport, "_pool", None)
+        conns = list(getattr(pool, "connections", None) or [])
+        idle = sum(1 for c in conns if c.is_idle())
+        return len(conns) - idle, idle
+
+    def stats(self) -> Dict[str, Any]:
+        active, idle = self._connection_counts()
+        limit = self.limits.max_connections
+        return {
+            "http2": self.http2,
+            "max_connections": limit,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "in_flight": self.in_flight,
+            "utilization": round(self.in_flight / limit, 3) if limit else None,
+            "connections_active": active,
+            "connections_idle": idle,
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections_opened": self.connects,
+            "reuse_ratio": round(1 - self.connects / self.requests, 3) if self.requests else None,
+            "avg_connect_ms": round(self.connect_s / self.connects * 1000.0, 3) if self.connects else None,
+        }
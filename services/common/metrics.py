@@ -0,0 +1,253 @@
+# services/common/metrics.py
+import abc
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Métriques en mémoire au format texte Prometheus (/metrics), sans dépendance.
+# Coût visé : < 1 µs par observation sur le chemin chaud (voir
+# `python -m benchmarks run --only metrics`). Les séries étiquetées sont créées
+# une fois via .labels(...) puis réutilisées ; garder la référence dans une
+# variable de module évite même la recherche dans le dict.
+
+# secondes : de 0,5 ms (softmax, b64) à 30 s (vidéo, retries)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+# METRICS_ENABLED=0 : plus d'observation et /metrics répond 404
+_enabled = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool) -> None:
+    # coupe toutes les observations (mesure du surcoût, tests)
+    global _enabled
+    _enabled = bool(flag)
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    @abc.abstractmethod
+    def _new_child(self):
+        ...
+
+    def labels(self, *values: str, **kv: str):
+        if kv:
+            values = tuple(str(kv[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        # métrique sans étiquette : une seule série
+        return self.labels()
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        if _enabled:
+            with self._lock:
+                self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}_total{_label_str(self.labelnames, k)} {_fmt(c.value)}"
+            for k, c in list(self._children.items())
+        ]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "fn", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.fn: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        # valeur calculée au moment du scrape (profondeur de file, etc.)
+        self.fn = fn
+
+    def get(self) -> float:
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, v: float) -> None:
+        self._default().set(v)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        self._default().set_function(fn)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_fmt(c.get())}" for k, c in list(self._children.items())]
+
+
+class _Timer:
+    __slots__ = ("_h", "_t0")
+
+    def __init__(self, h: "_HistogramChild") -> None:
+        self._h = h
+
+    def __enter__(self) -> "_Timer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._h.observe(time.perf_counter() - self._t0)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, v: float) -> None:
+        if not _enabled:
+            return
+        i = bisect.bisect_left(self.bounds, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, doc, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, v: float) -> None:
+        self._default().observe(v)
+
+    def time(self) -> _Timer:
+        return self._default().time()
+
+    def _samples(self) -> List[str]:
+        out = []
+        for k, c in list(self._children.items()):
+            with c._lock:
+                counts, total, n = list(c.counts), c.sum, c.count
+            acc = 0
+            for b, cnt in zip(self.buckets + (math.inf,), counts):
+                acc += cnt
+                le = 'le="%s"' % _fmt(b)
+                out.append(f"{self.name}_bucket{_label_str(self.labelnames, k, le)} {acc}")
+            out.append(f"{self.name}_sum{_label_str(self.labelnames, k)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_label_str(self.labelnames, k)} {n}")
+        return out
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
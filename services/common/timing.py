@@ -0,0 +1,126 @@
+# services/common/timing.py
+import json
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Décomposition du temps d'une requête de bout en bout : chaque service ajoute
+# ses étapes (préfixées gw. / sched. / miner.) et les renvoie dans l'en-tête
+# standard Server-Timing ; l'appelant les fusionne avec les siennes. Le même
+# X-Request-ID suit la requête gateway -> scheduler -> miner.
+
+REQUEST_ID_HEADER = "x-request-id"
+SERVER_TIMING_HEADER = "server-timing"
+
+# Log JSON d'une fraction des requêtes (+ toutes celles au-delà de SLOW_MS)
+TIMING_LOG_SAMPLE = float(os.getenv("TIMING_LOG_SAMPLE", "0.01"))
+TIMING_LOG_SLOW_MS = float(os.getenv("TIMING_LOG_SLOW_MS", "1000"))
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+# name;dur=1.2;desc="..." (desc éventuellement entre guillemets)
+_ENTRY_RE = re.compile(r'\s*([^;,\s]+)((?:\s*;\s*[^;,=\s]+\s*=\s*(?:"(?:[^"\\]|\\.)*"|[^;,]*))*)\s*(?:,|$)')
+_PARAM_RE = re.compile(r'\s*;\s*([^;,=\s]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;,]*)')
+
+Entry = Tuple[str, float, Optional[str]]  # (nom, durée ms, description)
+
+
+def request_id(incoming: Optional[str] = None) -> str:
+    # réutilise l'ID du client s'il est raisonnable, sinon en génère un
+    if incoming and _REQUEST_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def parse_server_timing(value: Optional[str]) -> List[Entry]:
+    out: List[Entry] = []
+    for m in _ENTRY_RE.finditer(value or ""):
+        if not m.group(1):
+            continue
+        dur, desc = 0.0, None
+        for k, v in _PARAM_RE.findall(m.group(2) or ""):
+            v = v.strip()
+            if v.startswith('"'):
+                v = v[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+            if k == "dur":
+                try:
+                    dur = float(v)
+                except ValueError:
+                    pass
+            elif k == "desc":
+                desc = v
+        out.append((m.group(1), dur, desc))
+    return out
+
+
+def _quote(desc: str) -> str:
+    return '"' + desc.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class Timings:
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+        self.entries: List[Entry] = []
+        self._t0 = time.perf_counter()
+
+    def add(self, name: str, ms: float, desc: Optional[str] = None) -> None:
+        self.entries.append((name, ms, desc))
+
+    @contextmanager
+    def span(self, name: str, desc: Optional[str] = None,
+             observe: Optional[Callable[[float], None]] = None) -> Iterator[None]:
+        # observe : reçoit aussi la durée en s (ex. Histogram.observe de /metrics)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            self.add(name, dt * 1000.0, desc)
+            if observe is not None:
+                observe(dt)
+
+    def merge(self, header: Optional[str]) -> None:
+        # étapes renvoyées par le service appelé (déjà préfixées)
+        self.entries.extend(parse_server_timing(header))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000.0
+
+    def header(self) -> str:
+        parts = []
+        for name, ms, desc in self.entries:
+            p = f"{name};dur={ms:.2f}"
+            if desc:
+                p += f";desc={_quote(desc)}"
+            parts.append(p)
+        return ", ".join(parts)
+
+    def as_list(self) -> List[Dict[str, Any]]:
+        out = []
+        for name, ms, desc in self.entries:
+            e: Dict[str, Any] = {"name": name, "dur_ms": round(ms, 3)}
+            if desc:
+                e["desc"] = desc
+            out.append(e)
+        return out
+
+
+def log_sampled(log: logging.Logger, timings: Timings, total_ms: float, **fields: Any) -> bool:
+    # une ligne JSON par requête échantillonnée (analyse de la queue de latence)
+    slow = TIMING_LOG_SLOW_MS > 0 and total_ms >= TIMING_LOG_SLOW_MS
+    if not slow and (TIMING_LOG_SAMPLE <= 0 or random.random() >= TIMING_LOG_SAMPLE):
+        return False
+    rec = {
+        "event": "request_timing",
+        "request_id": timings.request_id,
+        "total_ms": round(total_ms, 3),
+        "slow": slow,
+        **fields,
+        "timings": {name: round(ms, 3) for name, ms, _d in timings.entries},
+    }
+    log.info(json.dumps(rec, separators=(",", ":"), default=str))
+    return True
@@ -0,0 +1,70 @@
+# services/common/urlguard.py
+import asyncio
+import ipaddress
+import os
+import socket
+import urllib.parse
+from typing import Iterable, List, Optional, Set, Tuple
+
+# Garde des URL fournies par les clients (webhook_url, source_url, video_url) :
+# sans elle, la gateway ou le miner peuvent être utilisés pour joindre le réseau
+# interne (loopback, privé, link-local, métadonnées cloud...). https obligatoire
+# et toutes les adresses résolues doivent être publiques. Les hôtes listés
+# (allowed) échappent aux deux vérifications : récepteur interne, http en dev.
+# Refaite à chaque requête, redirections comprises (hook httpx) : la résolution
+# DNS a pu changer depuis la soumission.
+
+
+def allowed_hosts(value: str) -> Set[str]:
+    # liste d'hôtes séparés par des virgules (variable d'env)
+    return {h.strip().lower() for h in value.split(",") if h.strip()}
+
+
+# hôtes exemptés pour les téléchargements (source_url, video_url)
+FETCH_ALLOWED_HOSTS = allowed_hosts(os.getenv("FETCH_ALLOWED_HOSTS", ""))
+
+
+def _target(url: str, allowed: Iterable[str], what: str) -> Optional[Tuple[str, int]]:
+    # (hôte, port) à résoudre ; None si l'hôte est exempté
+    parsed = urllib.parse.urlsplit(url)
+    host = (parsed.hostname or "").lower()
+    if not host:
+        raise ValueError(f"{what} has no host")
+    if host in allowed:
+        return None
+    if parsed.scheme != "https":
+        raise ValueError(f"{what} must use https")
+    return host, parsed.port or 443
+
+
+def _check_addresses(infos: List[tuple], what: str) -> None:
+    for info in infos:
+        addr = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped:
+            addr = addr.ipv4_mapped
+        if not addr.is_global or addr.is_multicast:
+            raise ValueError(f"{what} resolves to a non-public address: {addr}")
+
+
+async def check_public_url(url: str, allowed: Iterable[str] = (), what: str = "url") -> None:
+    # ValueError si l'URL peut viser le réseau interne
+    target = _target(url, allowed, what)
+    if target is None:
+        return
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(*target, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"{what} host does not resolve: {target[0]}")
+    _check_addresses(infos, what)
+
+
+def check_public_url_sync(url: str, allowed: Iterable[str] = (), what: str = "url") -> None:
+    # variante bloquante, pour le code qui tourne dans un thread (décodage vidéo)
+    target = _target(url, allowed, what)
+    if target is None:
+        return
+    try:
+        infos = socket.getaddrinfo(*target, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"{what} host does not resolve: {target[0]}")
+    _check_addresses(infos, what)
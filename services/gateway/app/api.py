@@ -1,10 +1,20 @@
-import os, time, base64
-from typing import Optional
-from fastapi import FastAPI, APIRouter, HTTPException, Header
-from pydantic import BaseModel, HttpUrl
+import os, time, base64, binascii, hashlib, logging, json, asyncio
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl, ValidationError
 import httpx
 from .deps import require_api_key
-from .qos import is_eligible
+from .qos import InvalidAddress, eligibility
+from .cache import SingleFlight, TTLCache, normalize_url, through_cache
+from .jobs import JobPool, JobStore, check_webhook_url
+from services.common import consensus, metrics
+from services.common.batching import MicroBatcher
+from services.common.fetcher import Fetcher, FetchError
+from services.common.http import ClientPool
+from services.common.timing import REQUEST_ID_HEADER, SERVER_TIMING_HEADER, Timings, log_sampled, request_id
+from services.common.urlguard import FETCH_ALLOWED_HOSTS, check_public_url
 
 router = APIRouter()
 # ✅ corrige le port par défaut du scheduler
@@ -14,126 +24,778 @@ SCHEDULER_URL = os.getenv("SCHEDULER_URL", "http://scheduler:7080")
 TIMEOUT_IMAGE_CLIENT_S = float(os.getenv("TIMEOUT_IMAGE_MS", "20000")) / 1000.0
 TIMEOUT_VIDEO_CLIENT_S = float(os.getenv("TIMEOUT_VIDEO_MS", "30000")) / 1000.0
 
+# Clients HTTP partagés (keep-alive) : un pool vers le scheduler, un fetcher
+# séparé pour les images externes (source_url), bornés indépendamment
+_scheduler_http = ClientPool(
+    "scheduler",
+    timeout=TIMEOUT_IMAGE_CLIENT_S,
+    max_connections=int(os.getenv("SCHEDULER_MAX_CONNECTIONS", "100")),
+    http2=os.getenv("SCHEDULER_HTTP2", "0").lower() in ("1", "true", "yes", "on"),
+)
+# taille max d'une image envoyée en binaire (multipart / octets bruts)
+MAX_IMAGE_BYTES = int(float(os.getenv("MAX_IMAGE_MB", "10")) * 1024 * 1024)
+
+# flux borné (FETCH_MAX_MB, défaut MAX_IMAGE_MB), type vérifié, slots par hôte, cache HTTP (redirections suivies)
+_fetcher = Fetcher("image_fetch")
+
+# cache de résultats (URL normalisée + hash du contenu) et coalescence des requêtes identiques
+_result_cache = TTLCache(
+    max_entries=int(os.getenv("GATEWAY_CACHE_ENTRIES", "10000")),
+    max_bytes=int(float(os.getenv("GATEWAY_CACHE_MB", "32")) * 1024 * 1024),
+    ttl_s=float(os.getenv("GATEWAY_CACHE_TTL_S", "300")),
+)
+_flights = SingleFlight()
+
+log = logging.getLogger("uvicorn.error")
+
+# métriques Prometheus (/metrics) : durée par étape, issue par endpoint
+_STAGE = metrics.Histogram("gateway_stage_seconds", "Durée par étape côté gateway", ["stage"])
+_st_parse = _STAGE.labels("parse")        # lecture + validation du corps
+_st_qos = _STAGE.labels("qos")            # éligibilité PRVX (RPC)
+_st_fetch = _STAGE.labels("fetch")        # téléchargement source_url
+_st_dispatch = _STAGE.labels("dispatch")  # aller-retour scheduler (retries compris)
+_REQUEST_SECONDS = metrics.Histogram("gateway_request_seconds", "Durée totale par endpoint", ["endpoint"])
+_REQUESTS = metrics.Counter("gateway_requests", "Requêtes par endpoint et issue (cache ou erreur)", ["endpoint", "outcome"])
+_INFLIGHT = metrics.Gauge("gateway_inflight_requests", "Requêtes en cours par endpoint", ["endpoint"])
+_CACHE_ENTRIES = metrics.Gauge("gateway_cache_entries", "Entrées du cache de résultats")
+_CACHE_ENTRIES.set_function(lambda: _result_cache.stats()["entries"])
+_CACHE_BYTES = metrics.Gauge("gateway_cache_bytes", "Octets du cache de résultats")
+_CACHE_BYTES.set_function(lambda: _result_cache.bytes)
+
+# Détection en masse (/detect/images) : clé API et QoS vérifiées une fois,
+# URLs téléchargées à concurrence bornée, images envoyées au scheduler par
+# lots (/dispatch/image/batch, regroupées entre requêtes par un MicroBatcher),
+# résultats renvoyés en NDJSON dans l'ordre où ils arrivent
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "100"))
+BULK_MAX_BODY_BYTES = int(float(os.getenv("BULK_MAX_BODY_MB", "64")) * 1024 * 1024)
+BULK_FETCH_CONCURRENCY = int(os.getenv("BULK_FETCH_CONCURRENCY", "8"))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "16"))
+BULK_BATCH_WAIT_MS = float(os.getenv("BULK_BATCH_WAIT_MS", "10"))
+BULK_DISPATCH_CONCURRENCY = int(os.getenv("BULK_DISPATCH_CONCURRENCY", "4"))
+_bulk_batcher: MicroBatcher | None = None
+_st_dispatch_batch = _STAGE.labels("dispatch_batch")  # un POST /dispatch/image/batch
+_BULK_ITEMS = metrics.Counter("gateway_bulk_items", "Images de /detect/images par issue", ["outcome"])
+
+
+class UpstreamError(HTTPException):
+    # échec du scheduler (donc du miner) ou de source_url rendu au client en
+    # 400 / 502 ; outcome garde l'origine (upstream_503, timeout...) pour les
+    # métriques et la reprise des jobs
+    def __init__(self, status_code: int, detail: str, outcome: str) -> None:
+        super().__init__(status_code, detail)
+        self.outcome = outcome
+
+
+def _outcome(e: Exception) -> str:
+    # cardinalité bornée : code HTTP, erreur amont ou classe d'erreur réseau
+    if isinstance(e, UpstreamError):
+        return e.outcome
+    if isinstance(e, HTTPException):
+        return str(e.status_code)
+    if isinstance(e, RequestValidationError):
+        return "422"
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"upstream_{e.response.status_code}"
+    if isinstance(e, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(e, httpx.HTTPError):
+        return "network_error"
+    return "error"
+
+
+async def _observed(endpoint: str, handler):
+    # durée totale, requêtes en cours et issue ("hit"/"miss"/"coalesced" ou erreur)
+    inflight = _INFLIGHT.labels(endpoint)
+    inflight.inc()
+    t0 = time.perf_counter()
+    try:
+        result = await handler()
+    except Exception as e:
+        _REQUESTS.labels(endpoint, _outcome(e)).inc()
+        raise
+    finally:
+        inflight.dec()
+        _REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - t0)
+    _REQUESTS.labels(endpoint, result.get("cache", "ok")).inc()
+    return result
+
 
 class ImageReq(BaseModel):
     image_b64: Optional[str] = None
     source_url: Optional[HttpUrl] = None
     return_explanation: bool = False
+    return_timings: bool = False  # décomposition gw/sched/miner dans "timings"
     client_ref: Optional[str] = None
+    # consensus multi-miners côté scheduler (None = réglage du scheduler)
+    committee_size: Optional[int] = Field(None, ge=1)
+    quorum: Optional[int] = Field(None, ge=1)
+    consensus_timeout_ms: Optional[int] = Field(None, ge=1)
 
 
 class VideoReq(BaseModel):
     video_url: HttpUrl
     max_duration_sec: int = 6
-    sampling: str = "keyframes"
+    sampling: str = "keyframes"  # "keyframes" | "fps"
+    sample_fps: Optional[float] = None
+    return_explanation: bool = False
     client_ref: Optional[str] = None
 
 
+@router.on_event("shutdown")
+async def _close_http_pools():
+    await _jobs.stop()
+    await eligibility.aclose()
+    if _bulk_batcher is not None:
+        await _bulk_batcher.stop()
+    await _scheduler_http.aclose()
+    await _fetcher.aclose()
+
+
 @router.get("/health")
 async def health():
-    async with httpx.AsyncClient(timeout=2.0) as cx:
-        r = await cx.get(f"{SCHEDULER_URL}/health")
-        r.raise_for_status()
-        sched = r.json()
-    return {"gateway_status": "ok", **sched}
+    r = await _scheduler_http.client.get(f"{SCHEDULER_URL}/health", timeout=2.0)
+    r.raise_for_status()
+    sched = r.json()
+    return {
+        "gateway_status": "ok",
+        **sched,
+        "gateway_http_pools": {"scheduler": _scheduler_http.stats(), "image_fetch": _fetcher.pool.stats()},
+        "gateway_image_fetch": _fetcher.stats(),
+        "gateway_jobs": _jobs.stats(),
+    }
 
 
 @router.get("/qos/eligibility")
 async def qos_eligibility(address: str, threshold_wei: int | None = None, x_api_key: str = Header(None)):
     require_api_key(x_api_key)
     try:
-        ok, bal = is_eligible(address, threshold_wei)
+        ok, bal = await eligibility.is_eligible(address, threshold_wei)
         return {
             "address": address,
             "eligible": ok,
             "balance_wei": str(bal),
             "threshold_wei": str(threshold_wei) if threshold_wei is not None else None,
         }
+    except InvalidAddress as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
-        raise HTTPException(500, f"qos check error: {e}")
+        raise HTTPException(503, f"qos check error: {e}")
 
 
-async def _fetch_as_data_url(url: str) -> str:
-    # Suivre les redirections (picsum, etc.)
-    async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as cx:
-        r = await cx.get(url)
-        r.raise_for_status()
-        ct = r.headers.get("content-type", "image/jpeg")
-        b64 = base64.b64encode(r.content).decode()
-        return f"data:{ct};base64,{b64}"
+@router.get("/qos/stats")
+async def qos_stats(x_api_key: str = Header(None)):
+    require_api_key(x_api_key)
+    return eligibility.stats()
+
+
+async def _fetch_bytes(url: str, timing: Timings | None = None) -> tuple[bytes, str]:
+    t0 = time.perf_counter()
+    cache = None
+    try:
+        res = await _fetcher.fetch(url)
+        cache = res.cache
+        return res.data, res.content_type
+    except FetchError as e:
+        raise HTTPException(e.status_code, str(e))
+    except httpx.HTTPStatusError as e:
+        # source_url répond en erreur : 4xx = URL du client, 5xx = hôte distant
+        code = e.response.status_code
+        raise UpstreamError(400 if code < 500 else 502, f"failed to fetch source_url: HTTP {code}", _outcome(e))
+    except httpx.HTTPError as e:
+        raise UpstreamError(502, f"failed to fetch source_url: {str(e) or type(e).__name__}", _outcome(e))
+    finally:
+        _st_fetch.observe(time.perf_counter() - t0)
+        if timing is not None:
+            timing.add("gw.fetch", (time.perf_counter() - t0) * 1000.0, cache)
+
+
+def _truthy(v: str | None) -> bool:
+    return (v or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _form_opts(src, loc: str) -> ImageReq:
+    # options des formes multipart (champs) et binaire (query string)
+    fields = {f: src.get(f) for f in ("committee_size", "quorum", "consensus_timeout_ms") if src.get(f)}
+    try:
+        return ImageReq(
+            return_explanation=_truthy(src.get("return_explanation")),
+            return_timings=_truthy(src.get("return_timings")),
+            client_ref=src.get("client_ref") or None,
+            **fields,
+        )
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": (loc, *err["loc"])} for err in e.errors()])
+
+
+async def _parse_image_request(request: Request) -> tuple[ImageReq, bytes | None, str]:
+    # Trois formes acceptées sur /detect/image :
+    #  - application/json           : {"image_b64"| "source_url", ...} (historique)
+    #  - multipart/form-data        : champ "file" + champs optionnels
+    #  - image/* | octet-stream     : octets bruts, options en query string
+    ct = request.headers.get("content-type", "application/json")
+    mime = ct.split(";", 1)[0].strip().lower()
+
+    if mime == "application/json":
+        try:
+            return ImageReq.model_validate_json(await request.body()), None, ""
+        except ValidationError as e:
+            raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+
+    if mime == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(400, "multipart field 'file' required")
+        data = await upload.read()
+        opts = _form_opts(form, "form")
+        img_ct = upload.content_type or "application/octet-stream"
+    elif mime.startswith("image/") or mime == "application/octet-stream":
+        data = await request.body()
+        opts = _form_opts(request.query_params, "query")
+        img_ct = mime
+    else:
+        raise HTTPException(415, f"unsupported content-type: {mime}")
+
+    if not data:
+        raise HTTPException(400, "empty image body")
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(413, "image too large")
+    return opts, data, img_ct
+
+
+async def _dispatch_image(payload: dict, img: bytes | None, img_ct: str, timing: Timings) -> tuple[dict, str]:
+    with timing.span("gw.dispatch", observe=_st_dispatch.observe):
+        return await _post_image(payload, img, img_ct, timing)
+
+
+async def _post_image(payload: dict, img: bytes | None, img_ct: str, timing: Timings) -> tuple[dict, str]:
+    # X-Request-ID suit la requête ; les étapes sched.* / miner.* reviennent en Server-Timing
+    headers = {REQUEST_ID_HEADER: timing.request_id}
+    if img is not None:
+        params = {k: str(v).lower() if isinstance(v, bool) else str(v)
+                  for k, v in payload.items()
+                  if v is not None and k not in ("image_b64", "source_url")}
+        r = await _scheduler_post(
+            f"{SCHEDULER_URL}/dispatch/image/raw",
+            content=img,
+            headers={**headers, "content-type": img_ct},
+            params=params,
+        )
+    else:
+        r = await _scheduler_post(f"{SCHEDULER_URL}/dispatch/image", json=payload, headers=headers)
+    timing.merge(r.headers.get(SERVER_TIMING_HEADER))
+    _raise_for_scheduler(r)
+    return r.json(), "miss"
+
+
+async def _scheduler_post(url: str, **kwargs: Any) -> httpx.Response:
+    # scheduler injoignable (connexion, timeout) -> 502 au client
+    try:
+        return await _scheduler_http.client.post(url, **kwargs)
+    except httpx.HTTPError as e:
+        raise UpstreamError(502, f"scheduler unreachable: {str(e) or type(e).__name__}", _outcome(e))
+
+
+def _upstream_detail(r: httpx.Response) -> str:
+    try:
+        return str(r.json()["detail"])
+    except (ValueError, KeyError, TypeError):
+        return r.text
+
+
+def _raise_for_scheduler(r: httpx.Response) -> None:
+    # délestage du scheduler (429) relayé tel quel : le client peut réessayer ;
+    # 4xx (image refusée par le miner...) -> 400 avec le détail du miner,
+    # 5xx -> 502
+    if r.status_code == 429:
+        raise HTTPException(429, "overloaded, retry later", headers={"Retry-After": r.headers.get("retry-after", "1")})
+    if r.status_code >= 400:
+        raise UpstreamError(400 if r.status_code < 500 else 502, _upstream_detail(r), f"upstream_{r.status_code}")
+
+
+def _content_key(data: bytes, variant: tuple) -> tuple:
+    # hash des octets de l'image, quelle que soit la forme d'arrivée (b64, binaire, URL)
+    return ("sha", hashlib.blake2b(data, digest_size=16).hexdigest(), variant)
+
+
+def _decode_image_b64(image_b64: str) -> bytes:
+    # data URL ou b64 pur -> octets (une fois, pour la clé de cache) ; décodage
+    # strict (caractères hors alphabet refusés, pas d'image vide) et même
+    # plafond MAX_IMAGE_BYTES que les envois binaires et les URLs
+    try:
+        data = base64.b64decode("".join(image_b64.split(",", 1)[-1].split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(400, "invalid image_b64")
+    if not data:
+        raise HTTPException(400, "empty image_b64")
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(413, "image too large")
+    return data
+
+
+def _error_info(e: Exception) -> dict:
+    # erreur JSON d'une ligne NDJSON ou d'un job
+    if isinstance(e, HTTPException):
+        return {"status": e.status_code, "outcome": _outcome(e), "detail": e.detail}
+    return {"status": 502, "outcome": _outcome(e), "detail": str(e)}
+
+
+def _label(result: dict) -> str:
+    # consensus du comité, sinon proba IA explicite du miner (jamais le top-1 d'une classe quelconque)
+    p = result.get("consensus_prob")
+    if p is None:
+        vote = consensus.miner_vote(result)
+        p = vote[1] if vote is not None else 0.5
+    return "ai_likely" if p >= 0.8 else ("ai_unlikely" if p <= 0.2 else "uncertain")
+
+
+async def _prvx_priority(payload: dict, address: str, timing: Timings | None = None) -> None:
+    # Injection priorité PRVX si adresse fournie et éligible (solde en cache le plus souvent)
+    t0 = time.perf_counter()
+    try:
+        try:
+            ok, _bal = await eligibility.is_eligible(address, None)
+            payload["priority"] = bool(ok)
+            payload["prvx_address"] = address
+        except Exception:
+            payload["priority"] = False
+    finally:
+        _st_qos.observe(time.perf_counter() - t0)
+        if timing is not None:
+            timing.add("gw.qos", (time.perf_counter() - t0) * 1000.0)
+
+
+def _finish_timing(timing: Timings, endpoint: str, outcome: str, response: Response | None = None,
+                   miner_url: str | None = None) -> None:
+    # gw.total, en-têtes de réponse et log JSON échantillonné (queue de latence)
+    total_ms = timing.elapsed_ms()
+    timing.add("gw.total", total_ms)
+    if response is not None:
+        response.headers[SERVER_TIMING_HEADER] = timing.header()
+        response.headers[REQUEST_ID_HEADER] = timing.request_id
+    log_sampled(log, timing, total_ms, endpoint=endpoint, outcome=outcome, miner_url=miner_url)
 
 
 @router.post("/detect/image")
 async def detect_image(
-    body: ImageReq,
+    request: Request,
+    response: Response,
     x_api_key: str = Header(None),
     x_prvx_address: str | None = Header(default=None),
+    x_request_id: str | None = Header(default=None),
 ):
+    timing = Timings(request_id(x_request_id))
+    try:
+        result = await _observed("image", lambda: _detect_image(request, x_api_key, x_prvx_address, timing))
+    except Exception as e:
+        _finish_timing(timing, "image", _outcome(e))
+        raise
+    want = result.pop("_return_timings", False)
+    _finish_timing(timing, "image", result.get("cache", "ok"), response, result.get("miner_url"))
+    if want:
+        result["timings"] = {"request_id": timing.request_id, "stages": timing.as_list()}
+    return result
+
+
+async def _detect_image(request: Request, x_api_key: str | None, x_prvx_address: str | None,
+                        timing: Timings) -> dict:
     require_api_key(x_api_key)
-    if not (body.image_b64 or body.source_url):
+    with timing.span("gw.parse", observe=_st_parse.observe):
+        body, img, img_ct = await _parse_image_request(request)
+    if img is None and not (body.image_b64 or body.source_url):
         raise HTTPException(400, "image_b64 or source_url required")
 
-    payload = body.model_dump()
-    # Convertir source_url -> data URL pour les mineurs
-    if body.source_url and not body.image_b64:
-        payload["image_b64"] = await _fetch_as_data_url(str(body.source_url))
-        payload["source_url"] = None
-
-    # Injection priorité PRVX si adresse fournie et éligible
+    payload = body.model_dump(mode="json", exclude={"return_timings"})
     if x_prvx_address:
-        try:
-            ok, _bal = is_eligible(x_prvx_address, None)
-            payload["priority"] = bool(ok)
-            payload["prvx_address"] = x_prvx_address
-        except Exception:
-            payload["priority"] = False
+        await _prvx_priority(payload, x_prvx_address, timing)
 
+    # tout ce qui change la réponse entre dans la clé de cache
+    variant = (body.return_explanation, body.committee_size, body.quorum, body.consensus_timeout_ms)
     t0 = time.perf_counter()
-    async with httpx.AsyncClient(timeout=TIMEOUT_IMAGE_CLIENT_S) as cx:
-        r = await cx.post(f"{SCHEDULER_URL}/dispatch/image", json=payload)
-        r.raise_for_status()
-        result = r.json()
+    if img is None and body.source_url and not body.image_b64:
+        # source_url -> octets pour les mineurs (chemin binaire, sans b64).
+        # Clé URL normalisée, puis clé contenu : deux URLs vers la même image
+        # partagent le résultat.
+        async def _from_url():
+            data, ct = await _fetch_bytes(str(body.source_url), timing)
+            payload["source_url"] = None
+            return await through_cache(
+                _result_cache, _flights, _content_key(data, variant),
+                lambda: _dispatch_image(payload, data, ct, timing),
+            )
+        url_key = ("url", normalize_url(str(body.source_url)), variant)
+        result, cache_status = await through_cache(_result_cache, _flights, url_key, _from_url)
+    else:
+        content = img if img is not None else _decode_image_b64(body.image_b64)
+        result, cache_status = await through_cache(
+            _result_cache, _flights, _content_key(content, variant),
+            lambda: _dispatch_image(payload, img, img_ct, timing),
+        )
+    if cache_status != "miss":
+        timing.add("gw.cache", 0.0, cache_status)
+
     result["latency_ms"] = int((time.perf_counter() - t0) * 1000)
-    p = result.get("consensus_prob", 0.5)
-    result["label"] = "ai_likely" if p >= 0.8 else ("ai_unlikely" if p <= 0.2 else "uncertain")
+    result["cache"] = cache_status
+    result["label"] = _label(result)
     if x_prvx_address:
         result["prvx_address"] = x_prvx_address
+    if body.return_timings:
+        result["_return_timings"] = True
     return result
 
 
+@router.get("/cache/stats")
+async def cache_stats(x_api_key: str = Header(None)):
+    require_api_key(x_api_key)
+    return {"result_cache": _result_cache.stats(), "single_flight": _flights.stats()}
+
+
 @router.post("/detect/video")
 async def detect_video(
     body: VideoReq,
     x_api_key: str = Header(None),
     x_prvx_address: str | None = Header(default=None),
 ):
+    return await _observed("video", lambda: _detect_video(body, x_api_key, x_prvx_address))
+
+
+async def _detect_video(body: VideoReq, x_api_key: str | None, x_prvx_address: str | None) -> dict:
     require_api_key(x_api_key)
+    result = await _dispatch_video(await _video_payload(body, x_prvx_address))
+    if x_prvx_address:
+        result["prvx_address"] = x_prvx_address
+    return result
 
-    payload = body.model_dump()
-    payload["video_url"] = str(body.video_url)
 
+async def _video_payload(body: VideoReq, x_prvx_address: str | None) -> dict:
+    # video_url téléchargée par le miner : même garde que source_url, refusée ici
+    # avant tout dispatch (le miner revérifie à chaque requête)
+    try:
+        await check_public_url(str(body.video_url), FETCH_ALLOWED_HOSTS, "video_url")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    payload = body.model_dump(mode="json", exclude={"webhook_url"})
     if x_prvx_address:
-        try:
-            ok, _bal = is_eligible(x_prvx_address, None)
-            payload["priority"] = bool(ok)
-            payload["prvx_address"] = x_prvx_address
-        except Exception:
-            payload["priority"] = False
+        await _prvx_priority(payload, x_prvx_address)
+    return payload
 
+
+async def _dispatch_video(payload: dict) -> dict:
     t0 = time.perf_counter()
-    async with httpx.AsyncClient(timeout=TIMEOUT_VIDEO_CLIENT_S) as cx:
-        r = await cx.post(f"{SCHEDULER_URL}/dispatch/video", json=payload)
-        r.raise_for_status()
+    with _STAGE.labels("dispatch_video").time():
+        r = await _scheduler_post(
+            f"{SCHEDULER_URL}/dispatch/video", json=payload, timeout=TIMEOUT_VIDEO_CLIENT_S,
+        )
+        _raise_for_scheduler(r)
         result = r.json()
     result["latency_ms"] = int((time.perf_counter() - t0) * 1000)
-    p = result.get("consensus_prob", 0.5)
-    result["label"] = "ai_likely" if p >= 0.8 else ("ai_unlikely" if p <= 0.2 else "uncertain")
+    result["label"] = _label(result)
+    return result
+
+
+class BulkReq(BaseModel):
+    # items validés un par un (ImageReq) : un item invalide n'échoue que sa ligne
+    items: List[Dict[str, Any]]
+
+
+@router.post("/detect/images")
+async def detect_images(
+    request: Request,
+    x_api_key: str = Header(None),
+    x_prvx_address: str | None = Header(default=None),
+    x_request_id: str | None = Header(default=None),
+):
+    # NDJSON : une ligne {"index", ...résultat | "error"} par image, dans l'ordre
+    # de fin, puis une ligne {"done": true, ...} de bilan
+    require_api_key(x_api_key)
+    timing = Timings(request_id(x_request_id))
+    with timing.span("gw.parse", observe=_st_parse.observe):
+        try:
+            body = BulkReq.model_validate_json(await _read_body(request, BULK_MAX_BODY_BYTES))
+        except ValidationError as e:
+            raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+    if not body.items:
+        raise HTTPException(400, "items required")
+    if len(body.items) > BULK_MAX_ITEMS:
+        raise HTTPException(413, f"too many items ({len(body.items)} > {BULK_MAX_ITEMS})")
+    qos: dict = {}
     if x_prvx_address:
-        result["prvx_address"] = x_prvx_address
+        await _prvx_priority(qos, x_prvx_address, timing)
+    # pas de Server-Timing : les en-têtes partent avant le traitement des items,
+    # les durées par étape vont dans le log échantillonné (_finish_timing)
+    headers = {REQUEST_ID_HEADER: timing.request_id}
+    return StreamingResponse(_bulk_stream(body.items, qos, timing), media_type="application/x-ndjson", headers=headers)
+
+
+async def _read_body(request: Request, limit: int) -> bytes:
+    # corps lu par morceaux, 413 dès que le plafond est dépassé (Content-Length
+    # absent ou mensonger compris)
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise HTTPException(413, "request body too large")
+    chunks: List[bytes] = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(413, "request body too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _bulk_stream(items: List[Dict[str, Any]], qos: dict, timing: Timings):
+    inflight = _INFLIGHT.labels("bulk")
+    inflight.inc()
+    tasks = _bulk_tasks(items, qos)
+    errors = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            errors += "error" in line
+            yield json.dumps(line, separators=(",", ":")) + "\n"
+        yield json.dumps({"done": True, "items": len(items), "errors": errors,
+                          "latency_ms": int(timing.elapsed_ms())}) + "\n"
+        outcome = "ok"
+    except BaseException:
+        outcome = "aborted"  # client parti en cours de flux
+        raise
+    finally:
+        for t in tasks:
+            t.cancel()
+        inflight.dec()
+        _REQUESTS.labels("bulk", outcome).inc()
+        _REQUEST_SECONDS.labels("bulk").observe(timing.elapsed_ms() / 1000.0)
+        _finish_timing(timing, "bulk", outcome)
+
+
+def _bulk_tasks(items: List[Dict[str, Any]], qos: dict) -> List[asyncio.Task]:
+    fetch_slots = asyncio.Semaphore(BULK_FETCH_CONCURRENCY)
+    return [asyncio.create_task(_bulk_item(i, raw, qos, fetch_slots)) for i, raw in enumerate(items)]
+
+
+async def _bulk_item(index: int, raw: Dict[str, Any], qos: dict, fetch_slots: asyncio.Semaphore) -> dict:
+    # même cache / single-flight que /detect/image ; les ratés passent par le lot
+    t0 = time.perf_counter()
+    line: Dict[str, Any] = {"index": index}
+    try:
+        try:
+            body = ImageReq.model_validate(raw)
+        except ValidationError as e:
+            raise HTTPException(422, e.errors(include_url=False))
+        if body.client_ref:
+            line["client_ref"] = body.client_ref
+        if not (body.image_b64 or body.source_url):
+            raise HTTPException(400, "image_b64 or source_url required")
+        # options par image du lot multipart ; les octets partent bruts (ni b64 ni JSON)
+        opts = {**body.model_dump(mode="json", exclude={"return_timings", "image_b64", "source_url", "client_ref"},
+                                  exclude_none=True), **qos}
+        variant = (body.return_explanation, body.committee_size, body.quorum, body.consensus_timeout_ms)
+        if body.image_b64:
+            data = _decode_image_b64(body.image_b64)
+            result, cache_status = await through_cache(
+                _result_cache, _flights, _content_key(data, variant),
+                lambda: _bulk_dispatch((data, _data_url_type(body.image_b64), opts)),
+            )
+        else:
+            async def _from_url():
+                async with fetch_slots:
+                    data, ct = await _fetch_bytes(str(body.source_url))
+                return await through_cache(
+                    _result_cache, _flights, _content_key(data, variant),
+                    lambda: _bulk_dispatch((data, ct, opts)),
+                )
+            url_key = ("url", normalize_url(str(body.source_url)), variant)
+            result, cache_status = await through_cache(_result_cache, _flights, url_key, _from_url)
+    except Exception as e:
+        error = _error_info(e)
+        _BULK_ITEMS.labels(error["outcome"]).inc()
+        return {**line, "error": error}
+    _BULK_ITEMS.labels(cache_status).inc()
+    result.update(line)
+    result["cache"] = cache_status
+    result["label"] = _label(result)
+    result["latency_ms"] = int((time.perf_counter() - t0) * 1000)
+    return result
+
+
+def _data_url_type(image_b64: str) -> str:
+    # "data:image/png;base64,..." -> image/png ; b64 pur -> octet-stream (le miner sniffe)
+    if image_b64.startswith("data:"):
+        mime = image_b64[5:].split(",", 1)[0].split(";", 1)[0].strip().lower()
+        if mime:
+            return mime
+    return "application/octet-stream"
+
+
+async def _bulk_dispatch(item: tuple) -> tuple[dict, str]:
+    # item = (octets, content-type, options) ; attend son lot
+    global _bulk_batcher
+    if _bulk_batcher is None:
+        _bulk_batcher = MicroBatcher(
+            _send_bulk_batch,
+            max_batch_size=BULK_BATCH_SIZE,
+            max_wait_ms=BULK_BATCH_WAIT_MS,
+            max_inflight_batches=BULK_DISPATCH_CONCURRENCY,
+        )
+        _bulk_batcher.start()
+    return await _bulk_batcher.submit(item), "miss"
+
+
+async def _send_bulk_batch(items: List[tuple]) -> list:
+    # un POST multipart pour le lot ; une erreur d'image n'échoue que son appelant
+    files = [("image", (str(i), data, ct)) for i, (data, ct, _opts) in enumerate(items)]
+    meta = json.dumps([opts for _data, _ct, opts in items], separators=(",", ":"))
+    with _st_dispatch_batch.time():
+        r = await _scheduler_post(f"{SCHEDULER_URL}/dispatch/image/batch", files=files, data={"items": meta})
+        _raise_for_scheduler(r)
+        results = r.json()["results"]
+    return [HTTPException(res["error"]["status"], res["error"]["detail"]) if "error" in res else res
+            for res in results]
+
+
+# Jobs asynchrones : vidéo et détection en masse sans connexion HTTP ouverte
+# (202 + job_id, puis GET /jobs/{id} ou webhook) ; file et workers dans jobs.py
+JOBS_MAX_ITEMS = int(os.getenv("JOBS_MAX_ITEMS", "1000"))
+
+
+class JobOpts(BaseModel):
+    webhook_url: Optional[HttpUrl] = None  # POST du job terminé (succès, échec ou annulation)
+
+
+class VideoJobReq(VideoReq, JobOpts):
+    pass
+
+
+class ImagesJobReq(BulkReq, JobOpts):
+    pass
+
+
+async def _webhook_url(opts: JobOpts) -> Optional[str]:
+    # https + adresse publique (ou hôte de JOBS_WEBHOOK_ALLOWED_HOSTS), sinon 400
+    if opts.webhook_url is None:
+        return None
+    url = str(opts.webhook_url)
+    try:
+        await check_webhook_url(url)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return url
+
+
+def _job_owner(api_key: str) -> str:
+    # un job n'est visible que de la clé API qui l'a soumis
+    return hashlib.sha256(api_key.encode()).hexdigest()[:32]
+
+
+def _job_error(e: BaseException) -> tuple[dict, bool]:
+    # (erreur, transitoire ?) : délestage, timeout, réseau ou 5xx amont -> nouvelle tentative
+    error = _error_info(e)
+    outcome = error["outcome"]
+    return error, outcome in ("429", "timeout", "network_error") or outcome.startswith("upstream_5")
+
+
+async def _run_video_job(payload: dict, progress) -> dict:
+    # le miner ne rend compte qu'à la fin : frames décodées / inférées une fois la vidéo analysée
+    progress(stage="dispatched")
+    result = await _dispatch_video(payload["request"])
+    if payload.get("prvx_address"):
+        result["prvx_address"] = payload["prvx_address"]
+    video = result.get("video") or {}
+    progress(stage="done", **{k: video[k] for k in ("frames_decoded", "frames_inferred") if k in video})
     return result
 
 
+async def _run_images_job(payload: dict, progress) -> dict:
+    # mêmes items que /detect/images ; résultats rangés par index
+    items = payload["items"]
+    results: List[Optional[dict]] = [None] * len(items)
+    errors = 0
+    progress(items_total=len(items), items_done=0, errors=0)
+    tasks = _bulk_tasks(items, payload.get("qos") or {})
+    try:
+        for done, next_done in enumerate(asyncio.as_completed(tasks), 1):
+            line = await next_done
+            results[line["index"]] = line
+            errors += "error" in line
+            progress(items_done=done, errors=errors)
+    finally:
+        for t in tasks:
+            t.cancel()
+    return {"results": results, "items": len(items), "errors": errors}
+
+
+_jobs = JobPool(JobStore(), {"video": _run_video_job, "images": _run_images_job}, _job_error)
+
+
+@router.on_event("startup")
+async def _start_jobs():
+    _jobs.start()
+
+
+@router.post("/jobs/video", status_code=202)
+async def submit_video_job(
+    body: VideoJobReq,
+    response: Response,
+    x_api_key: str = Header(None),
+    x_prvx_address: str | None = Header(default=None),
+):
+    require_api_key(x_api_key)
+    webhook_url = await _webhook_url(body)
+    payload = {"request": await _video_payload(body, x_prvx_address), "prvx_address": x_prvx_address}
+    job = await _jobs.submit("video", _job_owner(x_api_key), payload, webhook_url)
+    response.headers["Location"] = f"/v1/jobs/{job['job_id']}"
+    return job
+
+
+@router.post("/jobs/images", status_code=202)
+async def submit_images_job(
+    body: ImagesJobReq,
+    response: Response,
+    x_api_key: str = Header(None),
+    x_prvx_address: str | None = Header(default=None),
+):
+    require_api_key(x_api_key)
+    if not body.items:
+        raise HTTPException(400, "items required")
+    if len(body.items) > JOBS_MAX_ITEMS:
+        raise HTTPException(413, f"too many items ({len(body.items)} > {JOBS_MAX_ITEMS})")
+    webhook_url = await _webhook_url(body)
+    qos: dict = {}
+    if x_prvx_address:
+        await _prvx_priority(qos, x_prvx_address)
+    job = await _jobs.submit("images", _job_owner(x_api_key), {"items": body.items, "qos": qos}, webhook_url)
+    response.headers["Location"] = f"/v1/jobs/{job['job_id']}"
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, x_api_key: str = Header(None)):
+    require_api_key(x_api_key)
+    job = await _jobs.get(job_id, _job_owner(x_api_key))
+    if job is None:
+        raise HTTPException(404, "job not found")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, x_api_key: str = Header(None)):
+    # job en file : annulé ; en cours : "cancel_requested" puis "cancelled" ; terminé : inchangé
+    require_api_key(x_api_key)
+    job = await _jobs.cancel(job_id, _job_owner(x_api_key))
+    if job is None:
+        raise HTTPException(404, "job not found")
+    return job
+
+
+async def prometheus_metrics():
+    # format texte Prometheus ; monté à la racine (/metrics) par les apps, hors clé API
+    if not metrics.enabled():
+        raise HTTPException(404, "metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ✅ EXPORT ASGI : obligatoire pour Uvicorn
 app = FastAPI(title="PrivacyX Gateway")
 app.include_router(router, prefix="/v1")
+app.add_api_route("/metrics", prometheus_metrics, methods=["GET"], include_in_schema=False)
 
@@ -0,0 +1,125 @@
+import asyncio, copy, json, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Cache de résultats côté gateway + coalescence "single-flight" :
+# N requêtes identiques simultanées -> 1 seul fetch + 1 seul dispatch,
+# tous les appelants reçoivent le même résultat.
+# Tout tourne sur la boucle asyncio : pas de verrou.
+
+
+def normalize_url(url: str) -> str:
+    # schéma/hôte en minuscules, port par défaut et fragment retirés, query triée
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024, ttl_s: float = 300.0):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_s = float(ttl_s)
+        self._data: "OrderedDict[Hashable, tuple[float, int, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_s > 0
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+                self.bytes -= entry[1]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[2])
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        size = len(json.dumps(value, separators=(",", ":"), default=str))
+        if size > self.max_bytes:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self._data[key] = (time.monotonic() + self.ttl_s, size, copy.deepcopy(value))
+        self.bytes += size
+        while self._data and (len(self._data) > self.max_entries or self.bytes > self.max_bytes):
+            _k, (_e, sz, _v) = self._data.popitem(last=False)
+            self.bytes -= sz
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        # -> (résultat, partagé?) ; le travail tourne dans sa propre tâche pour
+        # survivre à la déconnexion du client qui l'a lancé
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+async def through_cache(
+    cache: TTLCache,
+    flights: SingleFlight,
+    key: Hashable,
+    fn: Callable[[], Awaitable[tuple[Any, str]]],
+) -> tuple[Any, str]:
+    # fn() -> (résultat, statut) ; statut renvoyé : "hit" | "coalesced" | statut de fn
+    # cache désactivé (TTL/entrées à 0) : la coalescence reste active
+    if cache.enabled:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit, "hit"
+
+    async def _run():
+        res, status = await fn()
+        cache.put(key, res)
+        return res, status
+
+    (res, status), shared = await flights.do(key, _run)
+    return copy.deepcopy(res), ("coalesced" if shared else status)
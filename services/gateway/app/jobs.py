@@ -0,0 +1,533 @@
+import asyncio, hashlib, hmac, json, logging, os, sqlite3, tempfile, threading, time, uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from services.common import metrics
+from services.common.http import ClientPool
+from services.common.urlguard import allowed_hosts, check_public_url
+
+# Jobs asynchrones (vidéo, détection en masse) : le client soumet, reçoit un
+# job_id (202) puis interroge /v1/jobs/{id} ou attend le webhook de fin.
+# Stockage SQLite (WAL) : les jobs survivent au redémarrage de la gateway et
+# plusieurs processus peuvent partager le fichier. Un job en cours porte un
+# bail renouvelé par son worker ; bail expiré (processus mort) -> le job est
+# repris par un autre worker, au plus JOBS_MAX_ATTEMPTS tentatives en tout.
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(tempfile.gettempdir(), "px-gateway-jobs.sqlite3"))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))  # jobs simultanés par processus, 0 = soumission seule
+JOBS_POLL_MS = float(os.getenv("JOBS_POLL_MS", "1000"))
+JOBS_LEASE_S = float(os.getenv("JOBS_LEASE_S", "30"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_RETRY_BACKOFF_S = float(os.getenv("JOBS_RETRY_BACKOFF_S", "2"))  # doublé à chaque tentative
+JOBS_TIMEOUT_S = float(os.getenv("JOBS_TIMEOUT_S", "600"))
+JOBS_PROGRESS_INTERVAL_MS = float(os.getenv("JOBS_PROGRESS_INTERVAL_MS", "500"))
+JOBS_RETENTION_S = float(os.getenv("JOBS_RETENTION_S", "86400"))  # jobs terminés gardés 24 h
+JOBS_WEBHOOK_RETRIES = int(os.getenv("JOBS_WEBHOOK_RETRIES", "3"))
+JOBS_WEBHOOK_SECRET = os.getenv("JOBS_WEBHOOK_SECRET", "")  # signe le corps (HMAC-SHA256) si défini
+# hôtes dispensés des contrôles ci-dessous (récepteur interne, http en dev) ;
+# les autres doivent être en https et ne résoudre que vers des adresses publiques
+JOBS_WEBHOOK_ALLOWED_HOSTS = allowed_hosts(os.getenv("JOBS_WEBHOOK_ALLOWED_HOSTS", ""))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+TERMINAL = (SUCCEEDED, FAILED, CANCELLED)
+
+log = logging.getLogger("uvicorn.error")
+
+_JOBS = metrics.Counter("gateway_jobs", "Jobs terminés par type et statut", ["kind", "status"])
+_JOB_SECONDS = metrics.Histogram("gateway_job_seconds", "Durée d'exécution d'une tentative de job", ["kind"])
+_JOB_WAIT = metrics.Histogram("gateway_job_queue_seconds", "Attente en file avant exécution", ["kind"])
+_JOBS_RUNNING = metrics.Gauge("gateway_jobs_running", "Jobs en cours dans ce processus")
+_JOBS_STORED = metrics.Gauge("gateway_jobs_stored", "Jobs en base par statut", ["status"])
+_WEBHOOKS = metrics.Counter("gateway_job_webhooks", "Envois de webhook par issue", ["result"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    webhook_url TEXT,
+    webhook_status TEXT,
+    webhook_attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, run_after);
+CREATE INDEX IF NOT EXISTS jobs_webhook ON jobs(webhook_status);
+"""
+
+
+def _loads(v: Optional[str]) -> Any:
+    return json.loads(v) if v else None
+
+
+def _dumps(v: Any) -> Optional[str]:
+    return None if v is None else json.dumps(v, separators=(",", ":"))
+
+
+async def check_webhook_url(url: str) -> None:
+    # ValueError si l'URL peut viser la gateway elle-même ou le réseau interne
+    # (services/common/urlguard.py). Refait avant chaque envoi : la résolution
+    # DNS a pu changer depuis la soumission.
+    await check_public_url(url, JOBS_WEBHOOK_ALLOWED_HOSTS, "webhook_url")
+
+
+def view(row: sqlite3.Row, progress: Optional[dict] = None) -> Dict[str, Any]:
+    # représentation renvoyée par l'API et postée au webhook
+    out: Dict[str, Any] = {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "progress": progress if progress is not None else _loads(row["progress"]) or {},
+        "attempts": row["attempts"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+    }
+    if row["status"] == SUCCEEDED:
+        out["result"] = _loads(row["result"])
+    if row["error"]:
+        out["error"] = _loads(row["error"])  # dernière erreur (aussi sur un job remis en file)
+    if row["status"] == RUNNING and row["cancel_requested"]:
+        out["cancel_requested"] = True
+    if row["webhook_url"]:
+        out["webhook"] = {"status": row["webhook_status"], "attempts": row["webhook_attempts"]}
+    return out
+
+
+class JobStore:
+    # accès synchrone (une connexion, un verrou) ; JobPool l'appelle via asyncio.to_thread
+    def __init__(self, path: str = JOBS_DB_PATH) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def submit(self, kind: str, owner: str, payload: dict, webhook_url: Optional[str] = None) -> sqlite3.Row:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO jobs (id, kind, owner, status, payload, run_after, created_at, webhook_url)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, QUEUED, _dumps(payload), now, now, webhook_url),
+            )
+            return db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[sqlite3.Row]:
+        with self._lock:
+            row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row if row is not None and (owner is None or row["owner"] == owner) else None
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        # prochain job prêt, ou job "running" dont le bail a expiré (processus mort)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = db.execute(
+                        "SELECT * FROM jobs WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?)"
+                        " ORDER BY run_after LIMIT 1",
+                        (QUEUED, now, RUNNING, now),
+                    ).fetchone()
+                    if row is None:
+                        break
+                    if row["status"] == RUNNING and (row["cancel_requested"] or row["attempts"] >= JOBS_MAX_ATTEMPTS):
+                        cancelled = bool(row["cancel_requested"])
+                        error = None if cancelled else {"status": 500, "outcome": "interrupted",
+                                                        "detail": f"worker lost after {row['attempts']} attempts"}
+                        self._finish(db, row, CANCELLED if cancelled else FAILED, None, error, now)
+                        continue
+                    db.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?,"
+                        " started_at = COALESCE(started_at, ?) WHERE id = ?",
+                        (RUNNING, now + JOBS_LEASE_S, now, row["id"]),
+                    )
+                    row = db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                    break
+                db.execute("COMMIT")
+                return row
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def heartbeat(self, job_id: str, attempt: int, progress: Optional[dict]) -> str:
+        # prolonge le bail (et enregistre la progression) : "ok" | "cancel" | "lost"
+        with self._lock:
+            db = self._db()
+            if progress is None:
+                cur = db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND attempts = ?",
+                                 (time.time() + JOBS_LEASE_S, job_id, RUNNING, attempt))
+            else:
+                cur = db.execute(
+                    "UPDATE jobs SET lease_until = ?, progress = ? WHERE id = ? AND status = ? AND attempts = ?",
+                    (time.time() + JOBS_LEASE_S, _dumps(progress), job_id, RUNNING, attempt),
+                )
+            if cur.rowcount == 0:
+                return "lost"
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return "cancel" if row["cancel_requested"] else "ok"
+
+    def finish(self, job_id: str, attempt: int, status: str, result: Any = None, error: Optional[dict] = None,
+               progress: Optional[dict] = None) -> Optional[sqlite3.Row]:
+        # None si le job ne nous appartient plus (bail repris par un autre worker)
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT * FROM jobs WHERE id = ? AND status = ? AND attempts = ?",
+                             (job_id, RUNNING, attempt)).fetchone()
+            if row is None:
+                return None
+            return self._finish(db, row, status, result, error, time.time(), progress)
+
+    def _finish(self, db: sqlite3.Connection, row: sqlite3.Row, status: str, result: Any, error: Optional[dict],
+                now: float, progress: Optional[dict] = None) -> sqlite3.Row:
+        db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, progress = COALESCE(?, progress), lease_until = NULL,"
+            " finished_at = ?, webhook_status = CASE WHEN webhook_url IS NULL THEN NULL ELSE 'pending' END"
+            " WHERE id = ?",
+            (status, _dumps(result), _dumps(error), _dumps(progress), now, row["id"]),
+        )
+        return db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+    def requeue(self, job_id: str, attempt: int, error: Optional[dict], delay_s: float, refund: bool = False) -> bool:
+        # erreur transitoire (retry différé) ou arrêt propre du processus (refund : tentative non comptée)
+        with self._lock:
+            cur = self._db().execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, run_after = ?, error = COALESCE(?, error),"
+                " attempts = attempts - ? WHERE id = ? AND status = ? AND attempts = ?",
+                (QUEUED, time.time() + delay_s, _dumps(error), int(refund), job_id, RUNNING, attempt),
+            )
+        return cur.rowcount > 0
+
+    def cancel(self, job_id: str, owner: str) -> tuple[Optional[sqlite3.Row], bool]:
+        # en file : annulé tout de suite (True) ; en cours : demande relevée par le worker
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT * FROM jobs WHERE id = ? AND owner = ?", (job_id, owner)).fetchone()
+                cancelled = row is not None and row["status"] == QUEUED
+                if cancelled:
+                    row = self._finish(db, row, CANCELLED, None, None, time.time())
+                elif row is not None and row["status"] == RUNNING:
+                    db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                    row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                db.execute("COMMIT")
+                return row, cancelled
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def webhook_done(self, job_id: str, status: str, attempts: int) -> None:
+        with self._lock:
+            self._db().execute("UPDATE jobs SET webhook_status = ?, webhook_attempts = webhook_attempts + ? WHERE id = ?",
+                               (status, attempts, job_id))
+
+    def stale_webhooks(self, older_than_s: float) -> List[sqlite3.Row]:
+        # webhooks restés "pending" (processus arrêté pendant l'envoi)
+        with self._lock:
+            return self._db().execute(
+                "SELECT * FROM jobs WHERE webhook_status = 'pending' AND finished_at < ? LIMIT 100",
+                (time.time() - older_than_s,),
+            ).fetchall()
+
+    def purge(self, older_than_s: float) -> int:
+        with self._lock:
+            cur = self._db().execute(
+                "DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?"
+                " AND COALESCE(webhook_status, '') != 'pending'",
+                (*TERMINAL, time.time() - older_than_s),
+            )
+        return cur.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+
+# runner(payload, progress) -> résultat JSON ; progress(**champs) met à jour la progression
+Runner = Callable[[dict, Callable[..., None]], Awaitable[Any]]
+
+
+class _Run:
+    # tentative en cours dans ce processus
+    def __init__(self, row: sqlite3.Row) -> None:
+        self.row = row
+        self.progress: Dict[str, Any] = _loads(row["progress"]) or {}
+        self.dirty = False
+        self.stop_reason: Optional[str] = None  # "cancel" | "lost" | "shutdown"
+        self.task: Optional[asyncio.Task] = None
+
+    def update(self, **fields: Any) -> None:
+        self.progress.update(fields)
+        self.dirty = True
+
+    def stop(self, reason: str) -> None:
+        if self.stop_reason is None:
+            self.stop_reason = reason
+        if self.task is not None:
+            self.task.cancel()
+
+
+class JobPool:
+    def __init__(self, store: JobStore, runners: Dict[str, Runner],
+                 classify: Callable[[BaseException], tuple[dict, bool]], workers: int = JOBS_WORKERS) -> None:
+        # classify(e) -> (erreur JSON, transitoire ?) ; transitoire = nouvelle tentative différée
+        self.store = store
+        self.runners = runners
+        self.classify = classify
+        self.workers = max(0, workers)
+        self._runs: Dict[str, _Run] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._webhook_tasks: set = set()
+        self._delivering: set = set()  # job_ids dont le webhook part depuis ce processus
+        self._settling: set = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._counts: Dict[str, int] = {}
+        self._webhook_http = ClientPool("webhook", timeout=float(os.getenv("JOBS_WEBHOOK_TIMEOUT_S", "5")),
+                                        max_connections=int(os.getenv("JOBS_WEBHOOK_MAX_CONNECTIONS", "20")))
+        _JOBS_RUNNING.set_function(lambda: len(self._runs))
+        for status in (QUEUED, RUNNING, *TERMINAL):
+            _JOBS_STORED.labels(status).set_function(lambda s=status: self._counts.get(s, 0))
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.to_thread(fn, *args)
+
+    # ---------- Cycle de vie ----------
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._housekeeping()))
+
+    async def stop(self) -> None:
+        # les jobs en cours sont rendus à la file (tentative non comptée) pour le prochain démarrage
+        for run in list(self._runs.values()):
+            run.stop("shutdown")
+        # webhooks interrompus : restés "pending", renvoyés par l'entretien au redémarrage
+        for t in (*self._tasks, *self._webhook_tasks):
+            t.cancel()
+        await asyncio.gather(*self._tasks, *self._webhook_tasks, return_exceptions=True)
+        await asyncio.gather(*self._settling, return_exceptions=True)
+        self._tasks = []
+        await self._webhook_http.aclose()
+        self.store.close()
+
+    # ---------- API ----------
+    async def submit(self, kind: str, owner: str, payload: dict, webhook_url: Optional[str] = None) -> Dict[str, Any]:
+        row = await self._call(self.store.submit, kind, owner, payload, webhook_url)
+        if self._wake is not None:
+            self._wake.set()
+        return view(row)
+
+    async def get(self, job_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        row = await self._call(self.store.get, job_id, owner)
+        if row is None:
+            return None
+        run = self._runs.get(job_id)  # exécuté ici : progression la plus fraîche
+        return view(row, dict(run.progress) if run is not None and row["status"] == RUNNING else None)
+
+    async def cancel(self, job_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        row, cancelled = await self._call(self.store.cancel, job_id, owner)
+        if row is None:
+            return None
+        run = self._runs.get(job_id)
+        if run is not None and row["status"] == RUNNING:
+            run.stop("cancel")
+        if cancelled:
+            _JOBS.labels(row["kind"], CANCELLED).inc()
+            if row["webhook_url"]:
+                self._notify(row)
+        return view(row)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running_here": len(self._runs),
+            "stored": dict(self._counts),
+            "db_path": self.store.path,
+        }
+
+    # ---------- Workers ----------
+    async def _worker(self) -> None:
+        while True:
+            try:
+                row = await self._call(self.store.claim)
+            except Exception as e:
+                log.warning("jobs: claim failed: %s", e)
+                row = None
+            if row is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOBS_POLL_MS / 1000.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(row)
+
+    async def _run(self, row: sqlite3.Row) -> None:
+        job_id, kind = row["id"], row["kind"]
+        run = _Run(row)
+        self._runs[job_id] = run
+        _JOB_WAIT.labels(kind).observe(max(0.0, time.time() - row["run_after"]))
+        runner = self.runners.get(kind)
+        t0 = time.perf_counter()
+        run.task = asyncio.create_task(asyncio.wait_for(runner(_loads(row["payload"]), run.update), JOBS_TIMEOUT_S)
+                                       if runner else self._unknown(kind))
+        beat = asyncio.create_task(self._heartbeat(run))
+        stopped = None
+        try:
+            result, error, retry = await run.task, None, False
+        except asyncio.CancelledError:
+            # annulation demandée, bail perdu, ou worker lui-même annulé (arrêt)
+            stopped = run.stop_reason or "shutdown"
+            result, error, retry = None, None, False
+        except asyncio.TimeoutError:
+            result, error, retry = None, {"status": 504, "outcome": "timeout",
+                                          "detail": f"job exceeded {JOBS_TIMEOUT_S:g}s"}, False
+        except Exception as e:
+            result, (error, retry) = None, self.classify(e)
+        finally:
+            beat.cancel()
+            await asyncio.gather(beat, return_exceptions=True)
+            self._runs.pop(job_id, None)
+            _JOB_SECONDS.labels(kind).observe(time.perf_counter() - t0)
+        # écritures finales protégées : un arrêt du worker ne doit pas laisser le job à mi-chemin
+        settle = asyncio.ensure_future(self._settle(run, stopped, result, error, retry))
+        self._settling.add(settle)
+        settle.add_done_callback(self._settling.discard)
+        await asyncio.shield(settle)
+        if stopped == "shutdown":
+            raise asyncio.CancelledError
+
+    async def _settle(self, run: _Run, stopped: Optional[str], result: Any, error: Optional[dict],
+                      retry: bool) -> None:
+        row = run.row
+        job_id, kind, attempt = row["id"], row["kind"], row["attempts"]
+        if stopped == "lost":
+            return
+        if stopped == "shutdown":
+            await self._call(self.store.requeue, job_id, attempt, None, 0.0, True)
+            return
+        if retry and attempt < JOBS_MAX_ATTEMPTS:
+            delay = JOBS_RETRY_BACKOFF_S * 2 ** (attempt - 1)
+            if await self._call(self.store.requeue, job_id, attempt, error, delay):
+                log.info("jobs: %s requeued in %.1fs after %s", job_id, delay, error.get("outcome"))
+                return
+        if stopped == "cancel":
+            status = CANCELLED
+        else:
+            status = SUCCEEDED if error is None else FAILED
+        done = await self._call(self.store.finish, job_id, attempt, status, result, error, run.progress)
+        if done is None:
+            return
+        _JOBS.labels(kind, status).inc()
+        if done["webhook_url"]:
+            self._notify(done)
+
+    async def _unknown(self, kind: str) -> Any:
+        raise ValueError(f"unknown job kind: {kind}")
+
+    async def _heartbeat(self, run: _Run) -> None:
+        # bail + progression (au plus tous les JOBS_PROGRESS_INTERVAL_MS) + annulation demandée ailleurs
+        interval = min(JOBS_PROGRESS_INTERVAL_MS / 1000.0, JOBS_LEASE_S / 3.0)
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            if not run.dirty and time.monotonic() - last < JOBS_LEASE_S / 3.0:
+                continue
+            progress = dict(run.progress) if run.dirty else None
+            run.dirty = False
+            try:
+                state = await self._call(self.store.heartbeat, run.row["id"], run.row["attempts"], progress)
+            except Exception as e:
+                log.warning("jobs: heartbeat failed for %s: %s", run.row["id"], e)
+                continue
+            last = time.monotonic()
+            if state != "ok":
+                run.stop(state)
+                return
+
+    # ---------- Webhooks ----------
+    def _notify(self, row: sqlite3.Row) -> None:
+        if row["id"] in self._delivering:
+            return
+        self._delivering.add(row["id"])
+        t = asyncio.create_task(self._deliver(row))
+        self._webhook_tasks.add(t)
+        t.add_done_callback(self._webhook_tasks.discard)
+        t.add_done_callback(lambda _t: self._delivering.discard(row["id"]))
+
+    async def _deliver(self, row: sqlite3.Row) -> None:
+        # POST du job terminé, quelques essais espacés ; livraison "au moins une fois"
+        body = json.dumps(view(row), separators=(",", ":")).encode()
+        headers = {"content-type": "application/json", "x-px-event": f"job.{row['status']}", "x-px-job-id": row["id"]}
+        if JOBS_WEBHOOK_SECRET:
+            sig = hmac.new(JOBS_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+            headers["x-px-signature"] = f"sha256={sig}"
+        status, attempts = "failed", 0
+        for attempt in range(max(1, JOBS_WEBHOOK_RETRIES)):
+            try:
+                await check_webhook_url(row["webhook_url"])
+            except ValueError as e:
+                log.warning("jobs: webhook %s rejected: %s", row["id"], e)
+                status = "rejected"
+                break
+            attempts += 1
+            try:
+                r = await self._webhook_http.client.post(row["webhook_url"], content=body, headers=headers)
+                if r.status_code < 300:
+                    status = "delivered"
+                    break
+                log.info("jobs: webhook %s -> HTTP %s", row["id"], r.status_code)
+            except Exception as e:
+                log.info("jobs: webhook %s failed: %s", row["id"], e)
+            if attempt + 1 < JOBS_WEBHOOK_RETRIES:
+                _WEBHOOKS.labels("retry").inc()
+                await asyncio.sleep(2 ** attempt)
+        _WEBHOOKS.labels(status).inc()
+        await self._call(self.store.webhook_done, row["id"], status, attempts)
+
+    # ---------- Entretien ----------
+    async def _housekeeping(self) -> None:
+        # compteurs par statut à chaque tour ; purge et webhooks orphelins toutes les minutes
+        last_sweep = 0.0
+        while True:
+            try:
+                self._counts = await self._call(self.store.counts)
+                if time.monotonic() - last_sweep >= 60.0:
+                    last_sweep = time.monotonic()
+                    purged = await self._call(self.store.purge, JOBS_RETENTION_S)
+                    if purged:
+                        log.info("jobs: purged %d finished jobs", purged)
+                    for row in await self._call(self.store.stale_webhooks, JOBS_LEASE_S + 2 ** JOBS_WEBHOOK_RETRIES):
+                        self._notify(row)
+            except Exception as e:
+                log.warning("jobs: housekeeping failed: %s", e)
+            await asyncio.sleep(JOBS_POLL_MS / 1000.0)
@@ -1,4 +1,5 @@
 from fastapi import FastAPI
-from .api import router as api_router
+from .api import prometheus_metrics, router as api_router
 app = FastAPI(title="PrivacyX Gateway")
 app.include_router(api_router, prefix="/v1")
+app.add_api_route("/metrics", prometheus_metrics, methods=["GET"], include_in_schema=False)
@@ -1,26 +1,261 @@
-import os
-from web3 import Web3
+import asyncio, logging, os, re, time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from services.common import metrics
+from services.common.batching import MicroBatcher
+from services.common.http import ClientPool
+from .cache import SingleFlight
+
+# Éligibilité PRVX (QoS) : balanceOf(address) du token lu en JSON-RPC
+# (eth_call) sur la boucle asyncio, sans client web3 bloquant.
+#  - cache LRU des soldes : QOS_CACHE_TTL_S pour un solde éligible,
+#    QOS_NEGATIVE_TTL_S (plus long) pour un solde sous le seuil ou une adresse
+#    que le nœud ne sait pas résoudre (cache négatif) ;
+#  - refresh-ahead : une adresse "chaude" (QOS_HOT_HITS hits) est relue en
+#    tâche de fond passé QOS_REFRESH_AHEAD x TTL, avant d'expirer ;
+#  - single-flight : N lookups simultanés d'une adresse -> 1 seul eth_call ;
+#  - ratés simultanés regroupés (MicroBatcher) en une requête JSON-RPC batch,
+#    un eth_call par adresse, au plus QOS_BATCH_MAX par POST.
+# Une adresse mal formée est rejetée avant tout lookup (InvalidAddress).
 
 RPC = os.getenv("PRVX_RPC_URL")
 TOKEN = os.getenv("PRVX_TOKEN_ADDRESS")
 THRESHOLD_WEI = int(os.getenv("PRVX_QOS_THRESHOLD_WEI","1000000000000000000000"))
-ERC20_ABI = [{
-  "constant": True,
-  "inputs":[{"name":"_owner","type":"address"}],
-  "name":"balanceOf",
-  "outputs":[{"name":"balance","type":"uint256"}],
-  "type":"function"
-}]
-
-_w3 = Web3(Web3.HTTPProvider(RPC)) if RPC else None
-_contract = _w3.eth.contract(address=Web3.to_checksum_address(TOKEN), abi=ERC20_ABI) if (_w3 and TOKEN) else None
-
-def get_balance(address: str) -> int:
-    if not _contract:
-        raise RuntimeError("PRVX RPC or token not configured")
-    return int(_contract.functions.balanceOf(Web3.to_checksum_address(address)).call())
-
-def is_eligible(address: str, threshold_wei: int | None = None) -> tuple[bool, int]:
-    thr = THRESHOLD_WEI if threshold_wei is None else int(threshold_wei)
-    bal = get_balance(address)
-    return (bal >= thr, bal)
+QOS_CACHE_TTL_S = float(os.getenv("QOS_CACHE_TTL_S", "60"))
+QOS_NEGATIVE_TTL_S = float(os.getenv("QOS_NEGATIVE_TTL_S", "300"))
+QOS_CACHE_ENTRIES = int(os.getenv("QOS_CACHE_ENTRIES", "100000"))
+QOS_REFRESH_AHEAD = float(os.getenv("QOS_REFRESH_AHEAD", "0.8"))  # 0 = désactivé
+QOS_HOT_HITS = int(os.getenv("QOS_HOT_HITS", "3"))
+QOS_STALE_IF_ERROR_S = float(os.getenv("QOS_STALE_IF_ERROR_S", "600"))  # solde expiré servi si le RPC échoue
+QOS_ERROR_RETRY_S = float(os.getenv("QOS_ERROR_RETRY_S", "5"))  # pendant ce délai, le solde expiré est servi sans RPC
+QOS_BATCH_MAX = int(os.getenv("QOS_BATCH_MAX", "50"))
+QOS_BATCH_WAIT_MS = float(os.getenv("QOS_BATCH_WAIT_MS", "2"))
+QOS_RPC_CONCURRENCY = int(os.getenv("QOS_RPC_CONCURRENCY", "4"))
+QOS_RPC_TIMEOUT_S = float(os.getenv("QOS_RPC_TIMEOUT_S", "2"))
+
+_BALANCE_OF = "0x70a08231"  # sélecteur de balanceOf(address)
+_ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+
+log = logging.getLogger("uvicorn.error")
+
+_LOOKUPS = metrics.Counter("gateway_qos_lookups", "Lookups d'éligibilité PRVX par issue", ["result"])
+_RPC_SECONDS = metrics.Histogram("gateway_qos_rpc_seconds", "Aller-retour JSON-RPC (un POST, batch compris)")
+_RPC_BATCH = metrics.Histogram("gateway_qos_rpc_batch_size", "Adresses par POST JSON-RPC",
+                               buckets=(1, 2, 4, 8, 16, 32, 64))
+_RPC_ERRORS = metrics.Counter("gateway_qos_rpc_errors", "Erreurs JSON-RPC (transport ou par adresse)", ["kind"])
+_CACHE_ENTRIES = metrics.Gauge("gateway_qos_cache_entries", "Adresses dans le cache d'éligibilité")
+
+
+class InvalidAddress(ValueError):
+    pass
+
+
+class QosUnavailable(RuntimeError):
+    pass
+
+
+class _Entry:
+    __slots__ = ("balance", "fetched", "ttl", "hits", "retry_at")
+
+    def __init__(self, balance: Optional[int], ttl: float) -> None:
+        self.balance = balance  # None : adresse non résolue par le nœud (cache négatif)
+        self.fetched = time.monotonic()
+        self.ttl = ttl
+        self.hits = 0
+        self.retry_at = 0.0
+
+
+def _calldata(address: str) -> str:
+    return _BALANCE_OF + address[2:].rjust(64, "0")
+
+
+class EligibilityService:
+    def __init__(self, rpc_url: Optional[str] = RPC, token: Optional[str] = TOKEN,
+                 threshold_wei: int = THRESHOLD_WEI) -> None:
+        self.rpc_url = rpc_url
+        self.token = token.lower() if token else None
+        self.threshold_wei = threshold_wei
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._flights = SingleFlight()
+        self._http = ClientPool("prvx_rpc", timeout=QOS_RPC_TIMEOUT_S, max_connections=QOS_RPC_CONCURRENCY)
+        self._batcher: Optional[MicroBatcher] = None
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.counts: Dict[str, int] = {}
+        self.rpc_posts = 0
+        self.rpc_calls = 0
+        self.rpc_s_sum = 0.0
+        _CACHE_ENTRIES.set_function(lambda: len(self._cache))
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.rpc_url and self.token)
+
+    async def aclose(self) -> None:
+        for t in list(self._refreshing.values()):
+            t.cancel()
+        if self._batcher is not None:
+            await self._batcher.stop()
+            self._batcher = None
+        await self._http.aclose()
+
+    # ---------- API ----------
+    async def is_eligible(self, address: str, threshold_wei: int | None = None) -> tuple[bool, int]:
+        thr = self.threshold_wei if threshold_wei is None else int(threshold_wei)
+        bal = await self.balance(address)
+        return (bal >= thr, bal)
+
+    async def balance(self, address: str) -> int:
+        if not _ADDRESS_RE.match(address or ""):
+            self._count("invalid")
+            raise InvalidAddress(f"invalid address: {address!r}")
+        if not self.configured:
+            raise QosUnavailable("PRVX RPC or token not configured")
+        addr = address.lower()
+        now = time.monotonic()
+        entry = self._cache.get(addr)
+        if entry is not None and now - entry.fetched < entry.ttl:
+            self._cache.move_to_end(addr)
+            entry.hits += 1
+            self._count("negative_hit" if self._negative(entry) else "hit")
+            if (QOS_REFRESH_AHEAD > 0 and entry.hits >= QOS_HOT_HITS
+                    and now - entry.fetched >= entry.ttl * QOS_REFRESH_AHEAD):
+                self._refresh(addr)
+            return self._value(addr, entry)
+        if entry is not None and now < entry.retry_at:
+            self._count("stale")
+            return self._value(addr, entry)
+        try:
+            fresh, shared = await self._flights.do(addr, lambda: self._fetch(addr))
+        except Exception as e:
+            if entry is not None and now - entry.fetched < entry.ttl + QOS_STALE_IF_ERROR_S:
+                entry.retry_at = now + QOS_ERROR_RETRY_S
+                self._count("stale")
+                return self._value(addr, entry)
+            self._count("error")
+            raise QosUnavailable(f"rpc error: {e}") from e
+        self._count("coalesced" if shared else "miss")
+        return self._value(addr, fresh)
+
+    def stats(self) -> Dict[str, Any]:
+        served = sum(self.counts.get(k, 0) for k in ("hit", "negative_hit", "stale"))
+        total = served + sum(self.counts.get(k, 0) for k in ("miss", "coalesced", "error"))
+        return {
+            "configured": self.configured,
+            "entries": len(self._cache),
+            "lookups": dict(self.counts),
+            "hit_rate": round(served / total, 4) if total else None,
+            "refreshing": len(self._refreshing),
+            "single_flight": self._flights.stats(),
+            "rpc": {
+                "posts": self.rpc_posts,
+                "calls": self.rpc_calls,
+                "avg_ms": round(self.rpc_s_sum * 1000.0 / self.rpc_posts, 3) if self.rpc_posts else None,
+                "batcher": self._batcher.stats() if self._batcher is not None else None,
+            },
+            "ttl_s": {"eligible": QOS_CACHE_TTL_S, "negative": QOS_NEGATIVE_TTL_S},
+        }
+
+    # ---------- Internals ----------
+    def _count(self, result: str) -> None:
+        self.counts[result] = self.counts.get(result, 0) + 1
+        _LOOKUPS.labels(result).inc()
+
+    def _negative(self, entry: _Entry) -> bool:
+        return entry.balance is None or entry.balance < self.threshold_wei
+
+    def _value(self, addr: str, entry: _Entry) -> int:
+        if entry.balance is None:
+            raise InvalidAddress(f"no token balance for {addr}")
+        return entry.balance
+
+    async def _fetch(self, addr: str) -> _Entry:
+        if self._batcher is None:
+            self._batcher = MicroBatcher(
+                self._rpc_batch,
+                max_batch_size=QOS_BATCH_MAX,
+                max_wait_ms=QOS_BATCH_WAIT_MS,
+                max_inflight_batches=QOS_RPC_CONCURRENCY,
+            )
+            self._batcher.start()
+        res = await self._batcher.submit(addr)
+        entry = _Entry(res, QOS_CACHE_TTL_S)
+        if self._negative(entry):
+            entry.ttl = QOS_NEGATIVE_TTL_S
+        self._cache[addr] = entry
+        self._cache.move_to_end(addr)
+        while len(self._cache) > QOS_CACHE_ENTRIES:
+            self._cache.popitem(last=False)
+        return entry
+
+    def _refresh(self, addr: str) -> None:
+        # relecture anticipée, hors du chemin de la requête
+        if addr in self._refreshing:
+            return
+
+        async def _run():
+            try:
+                await self._flights.do(addr, lambda: self._fetch(addr))
+                self._count("refresh")
+            except Exception as e:
+                self._count("refresh_error")
+                log.info("qos: refresh of %s failed: %s", addr, e)
+            finally:
+                self._refreshing.pop(addr, None)
+
+        self._refreshing[addr] = asyncio.create_task(_run())
+
+    async def _rpc_batch(self, addrs: List[str]) -> List[Any]:
+        # un POST pour le lot ; par adresse : solde (int), None (non résolue) ou exception
+        calls = [
+            {"jsonrpc": "2.0", "id": i, "method": "eth_call",
+             "params": [{"to": self.token, "data": _calldata(a)}, "latest"]}
+            for i, a in enumerate(addrs)
+        ]
+        t0 = time.perf_counter()
+        try:
+            r = await self._http.client.post(self.rpc_url, json=calls if len(calls) > 1 else calls[0])
+            r.raise_for_status()
+            body = r.json()
+        except Exception:
+            _RPC_ERRORS.labels("transport").inc()
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            _RPC_SECONDS.observe(dt)
+            _RPC_BATCH.observe(len(addrs))
+            self.rpc_posts += 1
+            self.rpc_calls += len(addrs)
+            self.rpc_s_sum += dt
+        replies = {rep.get("id"): rep for rep in (body if isinstance(body, list) else [body]) if isinstance(rep, dict)}
+        return [self._decode(replies.get(i)) for i in range(len(addrs))]
+
+    def _decode(self, rep: Optional[dict]) -> Any:
+        if rep is None:
+            _RPC_ERRORS.labels("missing").inc()
+            return QosUnavailable("no JSON-RPC reply for address")
+        if "error" in rep:
+            err = rep["error"] or {}
+            if err.get("code") == 3 or "revert" in str(err.get("message", "")).lower():
+                return None  # balanceOf a reverté : rien à relire avant le TTL négatif
+            _RPC_ERRORS.labels("rpc").inc()
+            return QosUnavailable(f"rpc error {err.get('code')}: {err.get('message')}")
+        res = rep.get("result")
+        if not res or res == "0x":
+            return None  # pas de contrat à cette adresse de token / réponse vide
+        try:
+            return int(res, 16)
+        except (TypeError, ValueError):
+            _RPC_ERRORS.labels("decode").inc()
+            return QosUnavailable(f"undecodable balance: {res!r}")
+
+
+eligibility = EligibilityService()
+
+
+async def get_balance(address: str) -> int:
+    return await eligibility.balance(address)
+
+
+async def is_eligible(address: str, threshold_wei: int | None = None) -> tuple[bool, int]:
+    return await eligibility.is_eligible(address, threshold_wei)
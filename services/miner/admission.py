@@ -0,0 +1,80 @@
+# services/miner/admission.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List
+
+# Pool d'inférence borné : l'inférence (décodage b64, PIL, session.run) tourne
+# dans un executor dédié pour ne jamais bloquer la boucle uvicorn, et la file
+# d'admission est bornée pour refuser vite (503) plutôt que d'empiler.
+
+
+class QueueFull(Exception):
+    pass
+
+
+class InferencePool:
+    def __init__(self, workers: int = 1, max_queue: int = 64) -> None:
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="infer")
+
+        self._lock = threading.Lock()
+        self.pending = 0        # admises, pas encore terminées (côté boucle)
+        self.in_flight = 0      # en cours d'exécution sur un worker
+        self.admitted = 0
+        self.rejected = 0
+
+    # ---------- Admission ----------
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def queue_depth(self) -> int:
+        return max(0, self.pending - self.in_flight)
+
+    @asynccontextmanager
+    async def admit(self):
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise QueueFull(f"inference queue full ({self.pending}/{self.capacity})")
+        self.pending += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+
+    # ---------- Exécution ----------
+    def _track(self, n: int, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self.in_flight += n
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.in_flight -= n
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._track, 1, fn, *args)
+
+    def tracked_batch(self, fn: Callable[[List[Any]], List[Any]]) -> Callable[[List[Any]], List[Any]]:
+        # pour le MicroBatcher : in_flight compte les items du batch en cours
+        def _run(items: List[Any]) -> List[Any]:
+            return self._track(len(items), fn, items)
+        return _run
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self.queue_depth(),
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
@@ -1,28 +1,117 @@
 # services/miner/app/api.py
 import os
-import base64
+import json
+import binascii
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Union
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, HttpUrl
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from PIL import Image, UnidentifiedImageError
+from pydantic import BaseModel, HttpUrl, ValidationError
+
+from services.common import metrics
+from services.common.batching import MicroBatcher
+from services.common.fetcher import Fetcher, FetchError
+from services.common.timing import REQUEST_ID_HEADER, SERVER_TIMING_HEADER, Timings
+from services.miner import telemetry as tm
+from services.miner.admission import InferencePool, QueueFull
+from services.miner.cache import CachedDetector, ResultCache
+from services.miner.preprocess import ImageTooLarge
 
 # Choix de l’implémentation via l’env
 MODEL_IMPL = os.getenv("MODEL_IMPL", "stub").lower()
 MODEL_PATH = os.getenv("MODEL_PATH", "/app/services/miner/models/detector.onnx")
+# fp32 | int8 (MODEL_PATH_INT8, défaut : <MODEL_PATH sans .onnx>.int8.onnx)
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+
+# Pool de sessions ONNX derrière un seul port (1 = session unique, comportement historique)
+ORT_SESSIONS = int(os.getenv("ORT_SESSIONS", "1"))
+ORT_PIN_CORES = os.getenv("ORT_PIN_CORES", "1").lower() in ("1", "true", "yes", "on")
+ORT_SHARE_WEIGHTS = os.getenv("ORT_SHARE_WEIGHTS", "1").lower() in ("1", "true", "yes", "on")
+
+# Micro-batching (désactivé si BATCH_MAX_SIZE <= 1 ou détecteur sans detect_batch)
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# Pool d'inférence : workers dédiés + file d'admission bornée (503 au-delà)
+INFER_WORKERS = int(os.getenv("INFER_WORKERS", str(ORT_SESSIONS)))
+INFER_QUEUE_MAX = int(os.getenv("INFER_QUEUE_MAX", "64"))
+# téléchargement + démux/décodage vidéo : threads à part, seuls les batchs de
+# frames passent par le pool d'inférence
+VIDEO_DECODE_WORKERS = int(os.getenv("VIDEO_DECODE_WORKERS", "2"))
+RETRY_AFTER_S = int(os.getenv("RETRY_AFTER_S", "1"))
+
+# /infer/image/batch : images par appel, annoncé au scheduler dans /info
+# (défaut : de quoi remplir un micro-batch par worker)
+BATCH_ENDPOINT_MAX_ITEMS = int(os.getenv("BATCH_ENDPOINT_MAX_ITEMS", str(max(1, BATCH_MAX_SIZE) * INFER_WORKERS)))
+
+MAX_IMAGE_BYTES = int(float(os.getenv("MAX_IMAGE_MB", "10")) * 1024 * 1024)
+# source_url reçu sans image : téléchargement asynchrone borné (services/common/fetcher.py)
+_fetcher = Fetcher("miner_fetch")
+
+# Cache de résultats (0 entrée = désactivé)
+RESULT_CACHE_ENTRIES = int(os.getenv("RESULT_CACHE_ENTRIES", "10000"))
+RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", "64"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "3600"))
+
+# Index de quasi-doublons (dHash) : réutilise le résultat d'une image redimensionnée /
+# recompressée (0 entrée = désactivé ; distance de Hamming max sur 64 bits, <= 7)
+NEAR_DUP_ENTRIES = int(os.getenv("NEAR_DUP_ENTRIES", "50000"))
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "3"))
+
+# Warmup avant de se déclarer prêt (/ready) : tailles de batch passées à vide
+# dans chaque session (vide = pas de warmup)
+WARMUP_BATCHES = [int(x) for x in os.getenv("WARMUP_BATCHES", f"1,{BATCH_MAX_SIZE}").split(",") if x.strip()]
+
+METRICS_ENABLED = metrics.enabled()
+
+log = logging.getLogger("uvicorn.error")
 
 # ---------- Impl selection ----------
 DetectorType = Any
 _detector: Optional[DetectorType] = None
+_batcher: Optional[MicroBatcher] = None
+_pool: Optional[InferencePool] = None
+_video_executor: Optional[ThreadPoolExecutor] = None
+_cache: Optional[ResultCache] = None
+_near_dups: Any = None
+# Démarrage en tâche de fond : /health répond tout de suite, /ready seulement
+# une fois le modèle chargé et chauffé
+_ready = False
+_startup_error: Optional[str] = None
+_startup_timings: Dict[str, Any] = {}
+
+# gauges évaluées au scrape de /metrics
+tm.READY.set_function(lambda: 1.0 if _ready else 0.0)
+tm.IN_FLIGHT.set_function(lambda: _pool.in_flight if _pool is not None else 0)
+tm.PENDING.set_function(lambda: _pool.pending if _pool is not None else 0)
+tm.QUEUE_DEPTH.labels("admission").set_function(lambda: _pool.queue_depth() if _pool is not None else 0)
+tm.QUEUE_DEPTH.labels("batcher").set_function(lambda: _batcher.queue_depth() if _batcher is not None else 0)
 
 
 def _build_detector() -> DetectorType:
+    global _near_dups
     if MODEL_IMPL == "onnx":
+        if NEAR_DUP_ENTRIES > 0:
+            from services.miner.phash import NearDupIndex
+            _near_dups = NearDupIndex(NEAR_DUP_ENTRIES, NEAR_DUP_MAX_DISTANCE)
+        if ORT_SESSIONS > 1:
+            from services.miner.impl_onnx import OnnxDetectorPool, _env_threads
+            return OnnxDetectorPool(
+                ORT_SESSIONS, _env_threads(), pin_cores=ORT_PIN_CORES, near_dups=_near_dups,
+                share_weights=ORT_SHARE_WEIGHTS,
+            )
         from services.miner.impl_onnx import OnnxDetector
-        return OnnxDetector()
+        return OnnxDetector(near_dups=_near_dups)
     else:
         class StubDetector:
-            def detect_image(self, image_b64: str, return_explanation: bool = False) -> Dict[str, Any]:
+            def detect_image(self, image_b64: Union[str, bytes], return_explanation: bool = False,
+                             timings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
                 out = {"detections": [{"label": "stub", "score": 0.5}]}
                 if return_explanation:
                     out["explanation"] = {"note": "stub implementation"}
@@ -30,12 +119,91 @@ def _build_detector() -> DetectorType:
         return StubDetector()
 
 
+def _with_cache(detector: DetectorType) -> DetectorType:
+    global _cache
+    # le stub n'a rien à mettre en cache
+    if RESULT_CACHE_ENTRIES <= 0 or not hasattr(detector, "detect_batch"):
+        return detector
+    _cache = ResultCache(
+        max_entries=RESULT_CACHE_ENTRIES,
+        max_bytes=int(RESULT_CACHE_MB * 1024 * 1024),
+        ttl_s=RESULT_CACHE_TTL_S,
+    )
+    return CachedDetector(detector, _cache)
+
+
+def _build_batcher(detector: DetectorType, pool: InferencePool) -> Optional[MicroBatcher]:
+    if BATCH_MAX_SIZE <= 1 or not hasattr(detector, "detect_batch"):
+        return None
+    # modèle à batch fixe : rien à gagner
+    if not getattr(detector, "dynamic_batch", True):
+        return None
+    return MicroBatcher(
+        pool.tracked_batch(detector.detect_batch),
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_inflight_batches=pool.workers,
+        executor=pool.executor,
+        on_queue_wait=tm.st_queue_wait.observe,
+    )
+
+
+async def _startup() -> None:
+    global _detector, _batcher, _ready, _startup_error
+    t0 = time.perf_counter()
+    timings = _startup_timings
+    try:
+        detector = await asyncio.to_thread(_build_detector)
+        timings["load_s"] = round(time.perf_counter() - t0, 3)
+        timings.update({f"load.{k}": round(v, 3) for k, v in getattr(detector, "load_timings", {}).items()})
+        timings["graph_cache"] = getattr(detector, "graph_cache", None)
+
+        if WARMUP_BATCHES and hasattr(detector, "warmup"):
+            t1 = time.perf_counter()
+            # pas d'observation pendant le warmup (aucune requête admise avant /ready)
+            metrics.set_enabled(False)
+            try:
+                await asyncio.to_thread(detector.warmup, WARMUP_BATCHES)
+            finally:
+                metrics.set_enabled(METRICS_ENABLED)
+            timings["warmup_s"] = round(time.perf_counter() - t1, 3)
+            timings["warmup_batches"] = WARMUP_BATCHES
+
+        _detector = _with_cache(detector)
+        _batcher = _build_batcher(_detector, _pool)
+        if _batcher is not None:
+            _batcher.start()
+        timings["total_s"] = round(time.perf_counter() - t0, 3)
+        _ready = True
+        log.info("miner ready: %s", " ".join(f"{k}={v}" for k, v in timings.items()))
+    except Exception as e:
+        _startup_error = f"{type(e).__name__}: {e}"
+        log.exception("miner startup failed")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global _detector
-    _detector = _build_detector()
+    global _detector, _batcher, _pool, _video_executor, _cache, _near_dups, _ready, _startup_error
+    _pool = InferencePool(INFER_WORKERS, INFER_QUEUE_MAX)
+    _video_executor = ThreadPoolExecutor(max(1, VIDEO_DECODE_WORKERS), thread_name_prefix="video")
+    startup = asyncio.create_task(_startup())
     yield
+    _ready = False
+    if not startup.done():
+        startup.cancel()
+    if _batcher is not None:
+        await _batcher.stop()
+    _pool.shutdown()
+    _video_executor.shutdown(wait=False, cancel_futures=True)
+    await _fetcher.aclose()
+    _startup_error = None
+    _startup_timings.clear()
+    _batcher = None
+    _pool = None
+    _video_executor = None
     _detector = None
+    _cache = None
+    _near_dups = None
 
 
 app = FastAPI(lifespan=lifespan)
@@ -48,39 +216,61 @@ class ImageReq(BaseModel):
     return_explanation: bool = False
 
 
+class BatchReq(BaseModel):
+    items: List[ImageReq]
+
+
 class VideoReq(BaseModel):
     video_url: HttpUrl
     max_duration_sec: int = 6
-    sampling: str = "keyframes"
+    sampling: str = "keyframes"  # "keyframes" | "fps"
+    sample_fps: Optional[float] = None  # mode "fps" (défaut VIDEO_SAMPLE_FPS)
+    return_explanation: bool = False
 
 
 # ---------- Utils ----------
-def _url_to_data_url(url: str) -> str:
-    import requests
-    resp = requests.get(url, timeout=10)
-    resp.raise_for_status()
-    content = resp.content
-    # Devine un mimetype simple
-    mime = "image/jpeg"
-    u = url.lower()
-    if u.endswith(".png"):
-        mime = "image/png"
-    elif u.endswith(".webp"):
-        mime = "image/webp"
-    return f"data:{mime};base64,{base64.b64encode(content).decode()}"
+async def _fetch_source(url: str, timing: Optional[Timings] = None) -> bytes:
+    # octets bruts passés au décodeur : ni b64 ni type deviné d'après l'URL
+    t0 = time.perf_counter()
+    try:
+        return (await _fetcher.fetch(url)).data
+    except FetchError as e:
+        raise HTTPException(e.status_code, f"failed_to_fetch_source_url: {e}")
+    except Exception as e:
+        raise HTTPException(400, f"failed_to_fetch_source_url: {e}")
+    finally:
+        tm.st_fetch.observe(time.perf_counter() - t0)
+        if timing is not None:
+            timing.add("miner.fetch", (time.perf_counter() - t0) * 1000.0)
 
 
 # ---------- Routes ----------
 @app.get("/health")
 async def health():
+    # liveness : ok pendant le chargement, 503 seulement si le démarrage a échoué
+    if _startup_error is not None:
+        raise HTTPException(503, f"startup_failed: {_startup_error}")
     return {
         "status": "ok",
+        "ready": _ready,
         "model_impl": MODEL_IMPL,
         "has_detector": bool(_detector is not None),
-        "model_path": MODEL_PATH,
+        "model_path": getattr(_detector, "model_path", None) or MODEL_PATH,
+        "inference": _pool.stats() if _pool is not None else None,
     }
 
 
+@app.get("/ready")
+async def ready():
+    # readiness : modèle chargé + warmup terminé (utilisé par le scheduler)
+    body = {"ready": _ready, "startup": _startup_timings}
+    if not _ready:
+        if _startup_error is not None:
+            body["error"] = _startup_error
+        return JSONResponse(body, status_code=503, headers={"Retry-After": str(RETRY_AFTER_S)})
+    return body
+
+
 @app.get("/info")
 async def info():
     try:
@@ -92,51 +282,281 @@ async def info():
         "env": {
             "OMP_NUM_THREADS": os.getenv("OMP_NUM_THREADS"),
             "ORT_NUM_THREADS": os.getenv("ORT_NUM_THREADS"),
+            "ORT_SESSIONS": ORT_SESSIONS,
+            "ORT_SHARE_WEIGHTS": ORT_SHARE_WEIGHTS,
+            "MODEL_PRECISION": MODEL_PRECISION,
         },
         "onnxruntime": {"providers": providers},
-        "model_path": MODEL_PATH,
+        "model_path": getattr(_detector, "model_path", None) or MODEL_PATH,
         "model_impl": MODEL_IMPL,
+        "model_precision": getattr(_detector, "precision", None),
+        "batching": _batcher.stats() if _batcher is not None else {"enabled": False},
+        "capacity": {"max_batch_items": BATCH_ENDPOINT_MAX_ITEMS, "infer_workers": INFER_WORKERS},
+        "sessions": _detector.stats() if hasattr(_detector, "stats") else {"sessions": 1},
+        "model_hash": getattr(_detector, "model_hash", None),
+        "result_cache": _cache.stats() if _cache is not None else {"enabled": False},
+        "near_dup": _near_dups.stats() if _near_dups is not None else {"enabled": False},
+        "startup": _startup_timings,
     }
 
 
-def _run_image_inference(body: ImageReq) -> Dict[str, Any]:
-    if _detector is None:
-        raise HTTPException(500, "detector not initialized")
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if not metrics.enabled():
+        raise HTTPException(404, "metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
-    if not body.image_b64 and body.source_url:
-        # Tolérance : si le gateway n’a pas fait le b64, on le fait ici
-        try:
-            image_b64 = _url_to_data_url(str(body.source_url))
-        except Exception as e:
-            raise HTTPException(400, f"failed_to_fetch_source_url: {e}")
-    elif body.image_b64:
-        image_b64 = body.image_b64
-    else:
-        raise HTTPException(400, "image_b64 or source_url is required")
 
+@asynccontextmanager
+async def _observed(endpoint: str):
+    # durée totale et issue par endpoint (ok ou code HTTP renvoyé)
+    t0 = time.perf_counter()
+    outcome = "ok"
     try:
-        return _detector.detect_image(
-            image_b64=image_b64,
-            return_explanation=body.return_explanation,
-        )
+        yield
+    except HTTPException as e:
+        outcome = str(e.status_code)
+        raise
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        tm.REQUESTS.labels(endpoint, outcome).inc()
+        tm.REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - t0)
+
+
+@asynccontextmanager
+async def _admission():
+    if not _ready or _detector is None or _pool is None:
+        raise HTTPException(503, "miner_not_ready", headers={"Retry-After": str(RETRY_AFTER_S)})
+    try:
+        async with _pool.admit():
+            yield
+    except QueueFull:
+        # rejet rapide : le scheduler peut réessayer ailleurs
+        raise HTTPException(503, "miner_overloaded", headers={"Retry-After": str(RETRY_AFTER_S)})
+
+
+@asynccontextmanager
+async def _timed(response: Response, request_id: Optional[str]):
+    # étapes miner.* renvoyées en Server-Timing (fusionnées par le scheduler)
+    timing = Timings(request_id or "")
+    yield timing
+    timing.add("miner.total", timing.elapsed_ms())
+    response.headers[SERVER_TIMING_HEADER] = timing.header()
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+
+
+# clé du dict rempli par detect_batch (s) -> nom Server-Timing
+_SINK_STAGES = (
+    ("b64", "miner.b64"),
+    ("decode", "miner.decode"),
+    ("phash", "miner.phash"),
+    ("normalize", "miner.normalize"),
+    ("infer", "miner.infer"),
+    ("format", "miner.format"),
+)
+
+
+def _add_sink(timing: Timings, sink: Dict[str, Any], t_submit: float) -> None:
+    if "start" in sink:
+        # attente micro-batcher / worker avant le premier traitement
+        timing.add("miner.queue", (sink["start"] - t_submit) * 1000.0)
+    for key, name in _SINK_STAGES:
+        if key in sink:
+            timing.add(name, sink[key] * 1000.0, f"batch={sink['batch']}" if key == "infer" else None)
+    if sink.get("cache") == "hit" or sink.get("cache") == "dup":
+        timing.add("miner.cache", 0.0, sink["cache"])
+    elif sink.get("near_dup"):
+        timing.add("miner.cache", 0.0, "near_dup")
+
+
+async def _infer(image: Union[str, bytes], return_explanation: bool,
+                 timing: Optional[Timings] = None) -> Dict[str, Any]:
+    # image : data URL / b64 (str) ou octets bruts de l'image (bytes)
+    sink: Optional[Dict[str, Any]] = {} if timing is not None else None
+    t0 = time.perf_counter()
+    try:
+        if _batcher is not None:
+            res = await _batcher.submit((image, return_explanation, sink))
+        else:
+            res = await _pool.run(_detector.detect_image, image, return_explanation, sink)
+    except ImageTooLarge as e:
+        raise HTTPException(413, str(e))
+    except (UnidentifiedImageError, Image.DecompressionBombError, binascii.Error) as e:
+        # image illisible : erreur du client, le scheduler ne la réessaie pas ailleurs
+        raise HTTPException(400, f"invalid_image: {e}")
     except Exception as e:
         raise HTTPException(500, f"onnx_error: {e}")
+    if timing is not None:
+        _add_sink(timing, sink, t0)
+    return res
+
+
+async def _run_image_inference(body: ImageReq, timing: Optional[Timings] = None,
+                               endpoint: str = "image") -> Dict[str, Any]:
+    # endpoint : libellé des séries miner_requests (image_batch pour un élément de lot)
+    async with _observed(endpoint):
+        if not body.image_b64 and body.source_url:
+            # Tolérance : si le gateway n’a pas envoyé l'image, on la télécharge
+            # ici, hors admission (un slot d'inférence n'attend pas le réseau)
+            data = await _fetch_source(str(body.source_url), timing)
+            return await _run_bytes_inference(data, body.return_explanation, timing)
+        if not body.image_b64:
+            raise HTTPException(400, "image_b64 or source_url is required")
+        async with _admission():
+            return await _infer(body.image_b64, body.return_explanation, timing)
+
+
+async def _run_raw_inference(request: Request, return_explanation: bool,
+                             timing: Optional[Timings] = None) -> Dict[str, Any]:
+    # Corps = octets de l'image, passés tels quels au décodeur (pas de b64)
+    async with _observed("image_raw"):
+        data = await request.body()
+        return await _run_bytes_inference(data, return_explanation, timing)
+
+
+async def _run_bytes_inference(data: bytes, return_explanation: bool,
+                               timing: Optional[Timings] = None) -> Dict[str, Any]:
+    if not data:
+        raise HTTPException(400, "empty image body")
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(413, "image too large")
+    async with _admission():
+        return await _infer(data, return_explanation, timing)
+
+
+async def _read_batch(request: Request) -> List[Union[ImageReq, Tuple[bytes, bool]]]:
+    # multipart : parties "image" (octets bruts, dans l'ordre) + champ "items"
+    # (JSON, options par image) ; JSON : {"items": [{image_b64|source_url, ...}]}
+    ct = request.headers.get("content-type", "application/json")
+    if ct.split(";", 1)[0].strip().lower() == "multipart/form-data":
+        form = await request.form()
+        images = [await f.read() for f in form.getlist("image") if not isinstance(f, str)]
+        try:
+            opts = json.loads(form.get("items") or "[]")
+        except ValueError:
+            raise HTTPException(400, "invalid 'items' field")
+        if not isinstance(opts, list) or not all(isinstance(o, dict) for o in opts):
+            raise HTTPException(400, "'items' must be a JSON list of objects")
+        opts += [{}] * (len(images) - len(opts))
+        return [(data, bool(o.get("return_explanation"))) for data, o in zip(images, opts)]
+    try:
+        return BatchReq.model_validate_json(await request.body()).items
+    except ValidationError as e:
+        raise HTTPException(422, e.errors(include_url=False))
+
+
+async def _batch_item(item: Union[ImageReq, Tuple[bytes, bool]]) -> Dict[str, Any]:
+    # une erreur ne touche que son image : {"error": {"status", "detail"}}
+    try:
+        if isinstance(item, ImageReq):
+            return await _run_image_inference(item, endpoint="image_batch")
+        async with _observed("image_batch"):
+            return await _run_bytes_inference(*item)
+    except HTTPException as e:
+        return {"error": {"status": e.status_code, "detail": e.detail}}
+
+
+async def _run_batch_inference(request: Request, timing: Timings) -> Dict[str, Any]:
+    items = await _read_batch(request)
+    if not items:
+        raise HTTPException(400, "empty batch")
+    if len(items) > BATCH_ENDPOINT_MAX_ITEMS:
+        raise HTTPException(413, f"batch too large ({len(items)} > {BATCH_ENDPOINT_MAX_ITEMS})")
+    # images soumises ensemble : elles remplissent le même micro-batch
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*[_batch_item(it) for it in items])
+    timing.add("miner.batch", (time.perf_counter() - t0) * 1000.0, f"items={len(items)}")
+    return {"results": results}
 
 
 # Nouveau endpoint (notre préférence)
 @app.post("/detect/image")
-async def detect_image(body: ImageReq):
-    return _run_image_inference(body)
+async def detect_image(body: ImageReq, response: Response, x_request_id: Optional[str] = Header(None)):
+    async with _timed(response, x_request_id) as timing:
+        return await _run_image_inference(body, timing)
 
 
 # Endpoint legacy appelé par le scheduler/gateway actuel
 @app.post("/infer/image")
-async def infer_image(body: ImageReq):
-    return _run_image_inference(body)
+async def infer_image(body: ImageReq, response: Response, x_request_id: Optional[str] = Header(None)):
+    async with _timed(response, x_request_id) as timing:
+        return await _run_image_inference(body, timing)
+
+
+# Variantes binaires (Content-Type: image/* ou application/octet-stream)
+@app.post("/detect/image/raw")
+async def detect_image_raw(request: Request, response: Response, return_explanation: bool = False,
+                           x_request_id: Optional[str] = Header(None)):
+    async with _timed(response, x_request_id) as timing:
+        return await _run_raw_inference(request, return_explanation, timing)
+
+
+@app.post("/infer/image/raw")
+async def infer_image_raw(request: Request, response: Response, return_explanation: bool = False,
+                          x_request_id: Optional[str] = Header(None)):
+    async with _timed(response, x_request_id) as timing:
+        return await _run_raw_inference(request, return_explanation, timing)
+
+
+# Plusieurs images en un aller-retour (scheduler -> miner)
+@app.post("/infer/image/batch")
+async def infer_image_batch(request: Request, response: Response, x_request_id: Optional[str] = Header(None)):
+    async with _timed(response, x_request_id) as timing:
+        return await _run_batch_inference(request, timing)
+
+
+async def _run_video_inference(body: VideoReq) -> Dict[str, Any]:
+    async with _observed("video"), _admission():
+        if not hasattr(_detector, "predict_rgb"):
+            # stub : pas de modèle à faire tourner
+            return {"detections": [{"label": "bunny", "score": 0.91}]}
+        from services.miner.video import (
+            VIDEO_BATCH_SIZE, VIDEO_MAX_FRAMES, VIDEO_SAMPLE_FPS, VideoError, analyze_video,
+        )
+        loop = asyncio.get_running_loop()
+        detector, pool = _detector, _pool
+
+        def _infer_frames(frames):
+            # copie sur le worker : le buffer de sortie ORT sert à l'appel suivant
+            return detector.predict_rgb(frames).copy()
+
+        def _predict(frames):
+            # appelé par le thread de décodage : un batch de frames = un passage
+            # sur le pool d'inférence, intercalé avec les images
+            return asyncio.run_coroutine_threadsafe(pool.run(_infer_frames, frames), loop).result()
+
+        try:
+            return await loop.run_in_executor(
+                _video_executor,
+                analyze_video,
+                str(body.video_url),
+                _predict,
+                _detector._label,
+                body.max_duration_sec,
+                body.sampling,
+                body.sample_fps or VIDEO_SAMPLE_FPS,
+                VIDEO_MAX_FRAMES,
+                VIDEO_BATCH_SIZE,
+                body.return_explanation,
+            )
+        except VideoError as e:
+            raise HTTPException(400, str(e))
+        except Exception as e:
+            raise HTTPException(500, f"onnx_error: {e}")
 
 
 @app.post("/detect/video")
-async def detect_video(body: VideoReq):
-    # Stub vidéo, identique à avant
-    return {"detections": [{"label": "bunny", "score": 0.91}]}
+async def detect_video(body: VideoReq, response: Response, x_request_id: Optional[str] = Header(None)):
+    async with _timed(response, x_request_id):
+        return await _run_video_inference(body)
+
+
+# Endpoint legacy appelé par le scheduler (/dispatch/video)
+@app.post("/infer/video")
+async def infer_video(body: VideoReq, response: Response, x_request_id: Optional[str] = Header(None)):
+    async with _timed(response, x_request_id):
+        return await _run_video_inference(body)
 
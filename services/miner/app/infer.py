@@ -2,13 +2,13 @@ import os, time, base64
 import numpy as np, cv2
 from pydantic import BaseModel
 
+from services.miner.preprocess import preprocess_bytes
+
 MODEL_ID = os.getenv("MODEL_ID","px-detector-v1")
 MODEL_PATH = os.getenv("MODEL_PATH","/app/models/detector.onnx")
 MODEL_HASH = os.getenv("MODEL_HASH","sha256:unknown")
 NODE_ID = os.getenv("NODE_ID","miner_local")
 IMG_SIZE = int(os.getenv("IMG_SIZE","224"))
-MEAN = np.array([0.485,0.456,0.406], dtype=np.float32)
-STD  = np.array([0.229,0.224,0.225], dtype=np.float32)
 
 ORT = None
 if os.path.exists(MODEL_PATH):
@@ -27,27 +27,28 @@ class Req(BaseModel):
     deadline_ms: int | None = 4000
     job_id: str | None = None
 
-def _decode_image_b64(b64url: str) -> np.ndarray | None:
+def _decode_b64(b64url: str) -> bytes | None:
     try:
         if b64url.startswith("data:"):
             b64 = b64url.split(",",1)[1]
         else:
             b64 = b64url
-        raw = base64.b64decode(b64)
-        arr = np.frombuffer(raw, np.uint8)
-        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-        return img
+        return base64.b64decode(b64)
     except Exception:
         return None
 
-def _preprocess_bchw(img_bgr: np.ndarray) -> np.ndarray:
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    img_rgb = cv2.resize(img_rgb, (IMG_SIZE, IMG_SIZE), interpolation=cv2.INTER_AREA)
-    x = img_rgb.astype(np.float32)/255.0
-    x = (x - MEAN) / STD
-    x = np.transpose(x, (2,0,1))  # HWC->CHW
-    x = np.expand_dims(x, 0)      # NCHW
-    return x
+def _decode_image(raw: bytes) -> np.ndarray | None:
+    try:
+        return cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+    except Exception:
+        return None
+
+def _preprocess_bchw(raw: bytes) -> np.ndarray | None:
+    # prétraitement partagé (draft JPEG + normalisation fusionnée)
+    try:
+        return preprocess_bytes(raw, IMG_SIZE)
+    except Exception:
+        return None
 
 def _postprocess(y: np.ndarray) -> float:
     if y.ndim == 2 and y.shape[1] == 1:
@@ -70,11 +71,12 @@ def _heuristic(img: np.ndarray) -> float:
 
 def infer_image_prob(req: Req):
     t0 = time.perf_counter()
-    img = _decode_image_b64(req.payload_b64 or "")
-    if img is None:
+    raw = _decode_b64(req.payload_b64 or "")
+    x = _preprocess_bchw(raw) if (raw and ORT is not None) else None
+    img = _decode_image(raw) if (raw and x is None) else None
+    if x is None and img is None:
         return {"prob":0.5,"uncertainty":0.5,"inference_ms":0,"model_id":MODEL_ID,"model_hash":MODEL_HASH,"node_id":NODE_ID}
-    if ORT is not None:
-        x = _preprocess_bchw(img)
+    if x is not None:
         y = ORT.run([OUT_NAME], {IN_NAME: x})[0]
         prob = _postprocess(y)
     else:
@@ -23,6 +23,8 @@ class ImageReq(BaseModel):
 
 class VideoReq(BaseModel):
     video_url: HttpUrl
+    max_duration_sec: int = 6
+    sampling: str = "keyframes"  # "keyframes" | "fps"
 
 # --- utils
 def _load_from_data_url(data_url: str):
@@ -55,16 +57,9 @@ def _ensure_onnx():
     _onnx_session = ort.InferenceSession(MODEL_PATH, providers=providers)
 
 def _preprocess_img(img_bytes: bytes, size: int = 224):
-    # Image → NCHW float32 [0..1], mean/std ImageNet
-    img = _Image.open(io:=__import__("io").BytesIO(img_bytes)).convert("RGB")
-    img = img.resize((size, size))
-    arr = _np.asarray(img).astype("float32") / 255.0
-    mean = _np.array([0.485, 0.456, 0.406], dtype=_np.float32)
-    std  = _np.array([0.229, 0.224, 0.225], dtype=_np.float32)
-    arr = (arr - mean) / std
-    arr = _np.transpose(arr, (2, 0, 1))  # HWC->CHW
-    arr = _np.expand_dims(arr, 0)        # NCHW
-    return arr
+    # Image → NCHW float32 normalisée ImageNet (module partagé)
+    from services.miner.preprocess import preprocess_bytes
+    return preprocess_bytes(img_bytes, size)
 
 def _run_onnx(img_bytes: bytes):
     _ensure_onnx()
@@ -79,6 +74,19 @@ def _run_onnx(img_bytes: bytes):
     # NB: "cat" est fictif tant que tu n’as pas de mapping de classes
     return [{"label": f"class_{cls}", "score": round(score, 5)}]
 
+def _predict_frames(frames):
+    # frames uint8 HWC 224x224 (services/miner/video.py) -> softmax (N, C)
+    _ensure_onnx()
+    from services.miner.preprocess import normalize_into
+    x = _np.empty((len(frames), 3, 224, 224), dtype=_np.float32)
+    for i, rgb in enumerate(frames):
+        normalize_into(rgb, x[i])
+    input_name = _onnx_session.get_inputs()[0].name
+    # modèle potentiellement à batch fixe = 1 : on déroule
+    logits = _np.concatenate([_onnx_session.run(None, {input_name: x[i:i + 1]})[0] for i in range(len(frames))])
+    e = _np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
 @app.post("/infer/image")
 def infer_image(req: ImageReq):
     if not (req.image_b64 or req.source_url):
@@ -109,6 +117,18 @@ def infer_image(req: ImageReq):
 @app.post("/infer/video")
 def infer_video(req: VideoReq):
     t0 = time.time()
-    # TODO: échantillonnage de frames + inférence; pour l’instant stub
-    dets = [{"label":"bunny","score":0.91}]
-    return {"detections": dets, "label": "uncertain", "latency_ms": int((time.time()-t0)*1000)}
+    if MODEL_IMPL != "onnx":
+        dets = [{"label":"bunny","score":0.91}]
+        return {"detections": dets, "label": "uncertain", "latency_ms": int((time.time()-t0)*1000)}
+
+    from services.miner.video import VideoError, analyze_video
+    try:
+        out = analyze_video(
+            str(req.video_url), _predict_frames, lambda i: f"class_{i}",
+            req.max_duration_sec, req.sampling,
+        )
+    except VideoError as e:
+        raise HTTPException(400, f"video error: {e}")
+    out["label"] = "uncertain"
+    out["latency_ms"] = int((time.time()-t0)*1000)
+    return out
@@ -0,0 +1,176 @@
+# services/miner/cache.py
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.miner import telemetry as tm
+from services.miner.preprocess import to_bytes
+
+# Cache de résultats adressé par contenu, devant detect_image / detect_batch.
+# Clé = blake2b(octets de l'image) + identité du modèle + return_explanation.
+# LRU borné en nombre d'entrées et en octets, avec TTL. Le modèle est chargé une
+# fois au démarrage et jamais rechargé à chaud : le cache vit avec le process,
+# changer de modèle = redémarrer le miner (cache vide).
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl_s: float = 3600.0) -> None:
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_s = float(ttl_s)
+        self.model_id: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[bytes, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def key(image: bytes, model_id: Optional[str], return_explanation: bool) -> bytes:
+        h = hashlib.blake2b(image, digest_size=16)
+        h.update(b"\0" + (model_id or "").encode() + (b"\1" if return_explanation else b"\0"))
+        return h.digest()
+
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, size, value = entry
+            if expires <= now:
+                del self._data[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        # copie : l'appelant peut enrichir la réponse sans polluer le cache
+        return copy.deepcopy(value)
+
+    def put(self, key: bytes, value: Dict[str, Any]) -> None:
+        if self.max_entries == 0:
+            return
+        size = len(key) + len(json.dumps(value, separators=(",", ":")))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl_s, size, copy.deepcopy(value))
+            self.bytes += size
+            while self._data and (len(self._data) > self.max_entries or self.bytes > self.max_bytes):
+                _k, (_e, sz, _v) = self._data.popitem(last=False)
+                self.bytes -= sz
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "model_id": self.model_id,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def _to_bytes(image: Any, sink: Optional[Dict[str, Any]] = None) -> bytes:
+    # le décodage b64 a lieu ici quand le cache est actif (clé = octets)
+    t0 = time.perf_counter()
+    if sink is not None:
+        sink["start"] = t0
+    data = to_bytes(image)
+    if isinstance(image, str):
+        dt = time.perf_counter() - t0
+        tm.st_b64.observe(dt)
+        if sink is not None:
+            sink["b64"] = dt
+    return data
+
+
+class CachedDetector:
+    # Enveloppe un détecteur (OnnxDetector, OnnxDetectorPool) : mêmes
+    # méthodes, les hits ne touchent pas à session.run.
+    def __init__(self, inner: Any, cache: ResultCache) -> None:
+        self.inner = inner
+        self.cache = cache
+        # identité du modèle figée au chargement (pas de rechargement à chaud)
+        self.model_id = cache.model_id = getattr(inner, "model_hash", None)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    def detect_image(self, image_b64: Any, return_explanation: bool = False,
+                     timings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = _to_bytes(image_b64, timings)
+        key = self.cache.key(data, self.model_id, return_explanation)
+        hit = self.cache.get(key)
+        if timings is not None:
+            timings["cache"] = "hit" if hit is not None else "miss"
+        if hit is not None:
+            tm.result_hit.inc()
+            return hit
+        tm.result_miss.inc()
+        result = self.inner.detect_image(data, return_explanation, timings)
+        self.cache.put(key, result)
+        return result
+
+    def detect_batch(self, items: List[Tuple[Any, ...]]) -> List[Any]:
+        model_id = self.model_id
+        results: List[Any] = [None] * len(items)
+        # doublons dans un même batch : une seule inférence par clé
+        misses: "OrderedDict[bytes, Tuple[Tuple[Any, ...], List[int]]]" = OrderedDict()
+        for i, item in enumerate(items):
+            image, expl = item[0], item[1]
+            sink = item[2] if len(item) > 2 else None
+            try:
+                data = _to_bytes(image, sink)
+            except Exception as e:
+                results[i] = e
+                continue
+            key = self.cache.key(data, model_id, expl)
+            if key in misses:
+                if sink is not None:
+                    sink["cache"] = "dup"
+                misses[key][1].append(i)
+                continue
+            hit = self.cache.get(key)
+            if sink is not None:
+                sink["cache"] = "hit" if hit is not None else "miss"
+            if hit is not None:
+                tm.result_hit.inc()
+                results[i] = hit
+            else:
+                tm.result_miss.inc()
+                misses[key] = ((data, expl, sink), [i])
+        if misses:
+            outs = self.inner.detect_batch([item for item, _idx in misses.values()])
+            for (key, (_item, idxs)), res in zip(misses.items(), outs):
+                if not isinstance(res, BaseException):
+                    self.cache.put(key, res)
+                for n, i in enumerate(idxs):
+                    results[i] = res if n == 0 or isinstance(res, BaseException) else copy.deepcopy(res)
+        return results
@@ -1,14 +1,19 @@
 # services/miner/impl_onnx.py
-import base64
-import io
+import hashlib
 import os
-from typing import Dict, Any, List, Tuple
+import platform
+import threading
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
 
 import numpy as np
-from PIL import Image
 
 import onnxruntime as ort
 
+from services.miner import telemetry as tm
+from services.miner.phash import NearDupIndex, dhash
+from services.miner.preprocess import IMG_SIZE, batch_buffer, decode_b64, load_rgb_crop, normalize_into, preprocess_bytes, to_bytes
+
 IMAGENET_LABELS_PATH = os.getenv(
     "IMAGENET_LABELS_PATH",
     "/app/services/miner/models/imagenet_classes.txt",
@@ -19,10 +24,21 @@ MODEL_PATH = os.getenv(
     "/app/services/miner/models/detector.onnx",
 )
 
-# Prétraitement ImageNet standard (224x224, RGB, NCHW, normalisation)
-_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+# Précision chargée au démarrage : fp32 (MODEL_PATH) ou int8 (MODEL_PATH_INT8,
+# produit par scripts/quantize_model.py)
+MODEL_PRECISIONS = ("fp32", "int8")
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+MODEL_PATH_INT8 = os.getenv(
+    "MODEL_PATH_INT8",
+    os.path.splitext(MODEL_PATH)[0] + ".int8.onnx",
+)
 
+# Graphe optimisé (ORT_ENABLE_ALL) persisté sur disque et rechargé tel quel aux
+# démarrages suivants ; clé = hash du modèle + version ORT + CPU. Vide = désactivé.
+ORT_GRAPH_CACHE_DIR = os.getenv(
+    "ORT_GRAPH_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "privacyx", "ort"),
+)
 
 def _load_labels(path: str) -> List[str]:
     labels = []
@@ -42,91 +58,250 @@ def _softmax(x: np.ndarray) -> np.ndarray:
 
 
 def _preprocess_b64(image_b64: str) -> np.ndarray:
-    # supporte data URL ou b64 pur
-    if image_b64.startswith("data:"):
-        image_b64 = image_b64.split(",", 1)[1]
-    img_bytes = base64.b64decode(image_b64)
-    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-
-    # resize + center crop pour resnet50
-    short_side = 256
-    w, h = img.size
-    if w < h:
-        new_w = short_side
-        new_h = int(h * short_side / w)
-    else:
-        new_h = short_side
-        new_w = int(w * short_side / h)
-    img = img.resize((new_w, new_h), Image.BILINEAR)
-
-    # center crop 224x224
-    left = (img.width - 224) // 2
-    top = (img.height - 224) // 2
-    img = img.crop((left, top, left + 224, top + 224))
-
-    x = np.asarray(img).astype(np.float32) / 255.0
-    x = (x - _MEAN) / _STD              # HWC, float32
-    x = np.transpose(x, (2, 0, 1))      # -> CHW
-    x = np.expand_dims(x, 0)            # -> NCHW
-    return x
+    # -> (1,3,224,224) alloué ; le chemin chaud écrit dans batch_buffer()
+    return preprocess_bytes(decode_b64(image_b64))
+
+
+def _env_threads() -> Optional[int]:
+    try:
+        return int(os.environ["ORT_NUM_THREADS"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _read_model_bytes(path: str) -> bytes:
+    # fichier lu une seule fois ; le partage des poids entre sessions passe par
+    # _shared_initializers (une InferenceSession copie sinon ce qu'on lui donne)
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data:
+        raise ValueError(f"empty model file: {path}")
+    return data
+
+
+def _shared_initializers(model_bytes: bytes) -> Optional[List[Tuple[str, "ort.OrtValue"]]]:
+    # Poids du graphe extraits une fois en OrtValue (buffer numpy) : chaque session
+    # les reçoit par SessionOptions.add_initializer et lit ce buffer au lieu
+    # d'allouer le sien. None si le paquet onnx manque ou si les poids sont en
+    # données externes : chaque session garde alors sa copie.
+    try:
+        import onnx
+        from onnx import numpy_helper
+    except ImportError:
+        return None
+    model = onnx.load_from_string(model_bytes)
+    inits = model.graph.initializer
+    if any(t.data_location == onnx.TensorProto.EXTERNAL for t in inits):
+        return None
+    return [(t.name, ort.OrtValue.ortvalue_from_numpy(np.ascontiguousarray(numpy_helper.to_array(t))))
+            for t in inits]
+
+
+def _model_hash(model_bytes: bytes) -> str:
+    return "sha256:" + hashlib.sha256(model_bytes).hexdigest()
+
+
+def _model_path(precision: str) -> str:
+    if precision not in MODEL_PRECISIONS:
+        raise ValueError(f"MODEL_PRECISION must be one of {MODEL_PRECISIONS}, got {precision!r}")
+    path = MODEL_PATH_INT8 if precision == "int8" else MODEL_PATH
+    if not os.path.exists(path):
+        var = "MODEL_PATH_INT8" if precision == "int8" else "MODEL_PATH"
+        raise FileNotFoundError(f"{var} not found: {path}")
+    return path
+
+
+def _cpu_tag() -> str:
+    # le graphe ENABLE_ALL contient des layouts propres au jeu d'instructions
+    # (NCHWc AVX2 vs AVX-512) : pas réutilisable sur un autre CPU
+    flags = ""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    flags = line
+                    break
+    except OSError:
+        pass
+    return hashlib.sha256((platform.machine() + flags).encode()).hexdigest()[:8]
+
+
+def _graph_cache_path(model_hash: str) -> Optional[str]:
+    if not ORT_GRAPH_CACHE_DIR:
+        return None
+    digest = model_hash.split(":", 1)[-1][:16]
+    return os.path.join(ORT_GRAPH_CACHE_DIR, f"{digest}-ort{ort.__version__}-{_cpu_tag()}.onnx")
+
+
+def _read_graph_cache(path: Optional[str]) -> Optional[bytes]:
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return _read_model_bytes(path)
+    except (OSError, ValueError):
+        # illisible ou vide : on réoptimise
+        return None
+
+
+def _available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
 
 
 class OnnxDetector:
-    def __init__(self) -> None:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"MODEL_PATH not found: {MODEL_PATH}")
-        self.labels = _load_labels(IMAGENET_LABELS_PATH)
+    def __init__(
+        self,
+        model_bytes: Optional[bytes] = None,
+        labels: Optional[List[str]] = None,
+        n_threads: Optional[int] = None,
+        cores: Optional[List[int]] = None,
+        shared_allocator: bool = False,
+        model_hash: Optional[str] = None,
+        near_dups: Optional[NearDupIndex] = None,
+        precision: Optional[str] = None,
+        optimized: bool = False,
+        graph_cache: Optional[str] = None,
+        shared_weights: Optional[List[Tuple[str, "ort.OrtValue"]]] = None,
+    ) -> None:
+        # optimized : model_bytes est déjà le graphe optimisé (cache disque) ;
+        # graph_cache : chemin où écrire le graphe optimisé s'il ne l'est pas ;
+        # shared_weights : initializers de model_bytes communs à plusieurs sessions
+        self.precision = precision or MODEL_PRECISION
+        self.model_path: Optional[str] = None
+        self.load_timings: Dict[str, float] = {}
+        t0 = time.perf_counter()
+        if model_bytes is None:
+            self.model_path = _model_path(self.precision)
+            model_bytes = _read_model_bytes(self.model_path)
+            self.load_timings["read_s"] = time.perf_counter() - t0
+        # identité du modèle (cache de résultats, /info) : toujours celle du fichier source
+        t0 = time.perf_counter()
+        self.model_hash = model_hash or _model_hash(model_bytes)
+        if model_hash is None:
+            self.load_timings["hash_s"] = time.perf_counter() - t0
+            graph_cache = _graph_cache_path(self.model_hash)
+            cached = _read_graph_cache(graph_cache)
+            if cached is not None:
+                model_bytes, optimized = cached, True
+        self.labels = labels if labels is not None else _load_labels(IMAGENET_LABELS_PATH)
+        self.cores = cores
+        self.near_dups = near_dups
 
         # Session ONNX
         sess_opts = ort.SessionOptions()
-        # Optimisation niveau 3
-        sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        tmp_graph = None
+        if optimized:
+            # graphe déjà optimisé hors ligne : ne pas repasser les optimisations
+            sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            self.graph_cache = "hit"
+        else:
+            # Optimisation niveau 3
+            sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.graph_cache = "off"
+            if graph_cache:
+                try:
+                    os.makedirs(os.path.dirname(graph_cache), exist_ok=True)
+                except OSError:
+                    pass
+                # ORT échoue à la création de session s'il ne peut pas écrire le
+                # graphe : répertoire non inscriptible = on optimise sans persister
+                if os.access(os.path.dirname(graph_cache), os.W_OK):
+                    tmp_graph = f"{graph_cache}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    sess_opts.optimized_model_filepath = tmp_graph
+                    self.graph_cache = "miss"
 
         # Threads via env (fallback 1)
-        try:
-            n_threads = int(os.getenv("ORT_NUM_THREADS", "1"))
-        except ValueError:
-            n_threads = 1
+        if n_threads is None:
+            n_threads = _env_threads() or 1
         sess_opts.intra_op_num_threads = max(1, n_threads)
         sess_opts.inter_op_num_threads = 1
+        if cores and n_threads > 1:
+            # threads 2..n de l'intra-op pool épinglés sur notre tranche de cœurs
+            # (ids 1-based côté ORT ; le thread appelant est épinglé par le pool)
+            groups = [str(cores[i % len(cores)] + 1) for i in range(1, n_threads)]
+            sess_opts.add_session_config_entry("session.intra_op_thread_affinities", ";".join(groups))
+        if shared_allocator:
+            # arène CPU commune à toutes les sessions du process
+            sess_opts.add_session_config_entry("session.use_env_allocators", "1")
+        if shared_weights:
+            # poids lus dans le buffer commun ; sans pré-packing, sinon chaque session
+            # en referait une copie réorganisée (l'API Python n'expose pas de
+            # conteneur de poids pré-packés partagé)
+            for name, value in shared_weights:
+                sess_opts.add_initializer(name, value)
+            sess_opts.add_session_config_entry("session.disable_prepacking", "1")
 
         # Providers : CPU par défaut (explicite)
         providers = ["CPUExecutionProvider"]
 
+        t0 = time.perf_counter()
         self.session = ort.InferenceSession(
-            MODEL_PATH,
+            model_bytes,
             sess_options=sess_opts,
             providers=providers,
         )
+        self.load_timings["session_s"] = time.perf_counter() - t0
+        if tmp_graph:
+            # écriture atomique : un autre process peut lire le cache en parallèle
+            try:
+                os.replace(tmp_graph, graph_cache)
+            except OSError:
+                self.graph_cache = "off"
 
         # Entrée/sortie
-        self.input_name = self.session.get_inputs()[0].name
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
         self.output_name = self.session.get_outputs()[0].name
+        # Batch dynamique si la 1re dimension est symbolique ("N", None...)
+        dim0 = inp.shape[0] if inp.shape else 1
+        self.dynamic_batch = not (isinstance(dim0, int) and dim0 == 1)
 
-    def _inference(self, x: np.ndarray) -> Tuple[int, float, np.ndarray]:
+    def warmup(self, batch_sizes: List[int]) -> None:
+        # premiers session.run : arène, noyaux, pool de threads ORT
+        size = self.session.get_inputs()[0].shape[-1]
+        size = size if isinstance(size, int) else IMG_SIZE
+        for n in sorted({n if self.dynamic_batch else 1 for n in batch_sizes if n > 0}):
+            self._inference_batch(np.zeros((n, 3, size, size), dtype=np.float32))
+
+    def _inference_batch(self, x: np.ndarray) -> np.ndarray:
+        # x : (N,3,224,224) -> probs (N, 1000)
+        if x.shape[0] > 1 and not self.dynamic_batch:
+            # modèle à batch fixe = 1 : on déroule
+            return np.concatenate([self._inference_batch(x[i:i + 1]) for i in range(x.shape[0])])
+        t0 = time.perf_counter()
         outputs = self.session.run([self.output_name], {self.input_name: x})[0]
-        # outputs shape -> (N, 1000) ou (1000,)
-        logits = outputs[0] if outputs.ndim == 2 else outputs
-        probs = _softmax(logits)
+        if outputs.ndim == 1:
+            outputs = outputs[None, :]
+        probs = _softmax(outputs)
+        tm.st_session_run.observe(time.perf_counter() - t0)
+        tm.BATCH_SIZE.observe(x.shape[0])
+        return probs
+
+    def _inference(self, x: np.ndarray) -> Tuple[int, float, np.ndarray]:
+        probs = self._inference_batch(x)[0]
         top1_idx = int(np.argmax(probs))
         top1_prob = float(probs[top1_idx])
         return top1_idx, top1_prob, probs
 
-    def detect_image(
-        self,
-        image_b64: str,
-        return_explanation: bool = False
-    ) -> Dict[str, Any]:
-        x = _preprocess_b64(image_b64)
-        idx, prob, probs = self._inference(x)
+    def predict_rgb(self, frames: List[np.ndarray]) -> np.ndarray:
+        # frames uint8 HWC déjà recadrées (vidéo) -> probs (N, 1000), sans cache
+        x = batch_buffer(len(frames))
+        with tm.st_normalize.time():
+            for i, rgb in enumerate(frames):
+                normalize_into(rgb, x[i])
+        return self._inference_batch(x)
 
-        label = self.labels[idx] if 0 <= idx < len(self.labels) else f"class_{idx}"
+    def _label(self, idx: int) -> str:
+        return self.labels[idx] if 0 <= idx < len(self.labels) else f"class_{idx}"
 
+    def _format(self, probs: np.ndarray, return_explanation: bool) -> Dict[str, Any]:
+        idx = int(np.argmax(probs))
         result: Dict[str, Any] = {
             "detections": [
                 {
-                    "label": label,
-                    "score": round(prob, 6),
+                    "label": self._label(idx),
+                    "score": round(float(probs[idx]), 6),
                 }
             ]
         }
@@ -136,9 +311,267 @@ class OnnxDetector:
             top5_idx = np.argsort(-probs)[:5].tolist()
             top5 = []
             for i in top5_idx:
-                lbl = self.labels[i] if 0 <= i < len(self.labels) else f"class_{i}"
-                top5.append({"label": lbl, "score": float(round(probs[i], 6))})
+                top5.append({"label": self._label(i), "score": float(round(probs[i], 6))})
             result["explanation"] = {"top5": top5}
 
         return result
 
+    def detect_image(
+        self,
+        image_b64: Union[str, bytes],
+        return_explanation: bool = False,
+        timings: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        res = self.detect_batch([(image_b64, return_explanation, timings)])[0]
+        if isinstance(res, BaseException):
+            raise res
+        return res
+
+    def detect_batch(self, items: List[Tuple[Any, ...]]) -> List[Any]:
+        # items : [(image_b64 | octets bruts, return_explanation[, timings]), ...]
+        # Une image invalide ne fait échouer qu'elle-même (Exception à sa place).
+        # Les images valides sont écrites directement dans le buffer NCHW du thread ;
+        # les quasi-doublons déjà vus (dHash) sont servis sans session.run.
+        # timings (dict optionnel) reçoit les durées par étape de l'image, en s.
+        results: List[Any] = [None] * len(items)
+        x = batch_buffer(len(items))
+        index = self.near_dups
+        if index is not None:
+            index.set_model(self.model_hash)
+        idxs: List[int] = []
+        hashes: List[int] = []
+        clock = time.perf_counter
+        sinks: List[Optional[Dict[str, Any]]] = []
+        for i, item in enumerate(items):
+            image, expl = item[0], item[1]
+            sink = item[2] if len(item) > 2 else None
+            t0 = clock()
+            if sink is not None:
+                sink.setdefault("start", t0)  # déjà posé par CachedDetector
+            try:
+                data = to_bytes(image)
+                t1 = clock()
+                if isinstance(image, str):
+                    tm.st_b64.observe(t1 - t0)
+                    if sink is not None:
+                        sink["b64"] = t1 - t0
+                rgb = load_rgb_crop(data, x.shape[-1])
+            except Exception as e:
+                results[i] = e
+                continue
+            t2 = clock()
+            tm.st_decode.observe(t2 - t1)
+            if sink is not None:
+                sink["decode"] = t2 - t1
+            if index is not None:
+                h = dhash(rgb)
+                hit = index.lookup(h)
+                t3 = clock()
+                tm.st_phash.observe(t3 - t2)
+                if sink is not None:
+                    sink["phash"] = t3 - t2
+                    sink["near_dup"] = hit is not None
+                t2 = t3
+                if hit is not None:
+                    tm.near_dup_hit.inc()
+                    results[i] = _select_explanation(hit[0], expl)
+                    continue
+                tm.near_dup_miss.inc()
+                hashes.append(h)
+            normalize_into(rgb, x[len(idxs)])
+            t3 = clock()
+            tm.st_normalize.observe(t3 - t2)
+            if sink is not None:
+                sink["normalize"] = t3 - t2
+            idxs.append(i)
+            sinks.append(sink)
+        if idxs:
+            t0 = clock()
+            probs = self._inference_batch(x[:len(idxs)])
+            run_s = clock() - t0
+            for sink in sinks:
+                if sink is not None:
+                    sink["infer"] = run_s
+                    sink["batch"] = len(idxs)
+            t0 = clock()
+            for j, i in enumerate(idxs):
+                if index is not None:
+                    # on stocke la version complète (top-5) pour servir les deux variantes
+                    full = self._format(probs[j], True)
+                    index.insert(hashes[j], full)
+                    results[i] = _select_explanation(full, items[i][1])
+                else:
+                    results[i] = self._format(probs[j], items[i][1])
+            fmt_s = (clock() - t0) / len(idxs)
+            tm.st_format.observe(fmt_s)
+            for sink in sinks:
+                if sink is not None:
+                    sink["format"] = fmt_s
+        return results
+
+
+def _select_explanation(result: Dict[str, Any], return_explanation: bool) -> Dict[str, Any]:
+    if not return_explanation:
+        result.pop("explanation", None)
+    return result
+
+
+class OnnxDetectorPool:
+    # N sessions ONNX derrière un même port : le modèle est lu une seule fois,
+    # ses poids sont partagés (share_weights), chaque session reçoit une tranche
+    # de cœurs, et chaque appel part sur la session la moins occupée. Même
+    # interface que OnnxDetector.
+    def __init__(
+        self,
+        n_sessions: int,
+        threads_per_session: Optional[int] = None,
+        pin_cores: bool = True,
+        near_dups: Optional[NearDupIndex] = None,
+        precision: Optional[str] = None,
+        share_weights: bool = True,
+    ) -> None:
+        precision = precision or MODEL_PRECISION
+        model_path = _model_path(precision)
+        n_sessions = max(1, int(n_sessions))
+        cores = _available_cores()
+        per = threads_per_session or max(1, len(cores) // n_sessions)
+
+        labels = _load_labels(IMAGENET_LABELS_PATH)
+        t0 = time.perf_counter()
+        model_bytes = _read_model_bytes(model_path)
+        t1 = time.perf_counter()
+        model_hash = _model_hash(model_bytes)
+        self.load_timings: Dict[str, float] = {"read_s": t1 - t0, "hash_s": time.perf_counter() - t1}
+        env_alloc = _register_shared_allocator()
+
+        graph_cache = _graph_cache_path(model_hash)
+        cached = _read_graph_cache(graph_cache)
+        self.graph_cache = "hit" if cached is not None else ("miss" if graph_cache else "off")
+        share_weights = share_weights and n_sessions > 1
+        t0 = time.perf_counter()
+        if share_weights and cached is None and graph_cache:
+            # 1er démarrage : le graphe optimisé (poids fusionnés / réordonnés) est
+            # écrit par une session jetable, pour que toutes partagent ses poids
+            OnnxDetector(model_bytes=model_bytes, labels=labels, model_hash=model_hash,
+                         precision=precision, graph_cache=graph_cache)
+            cached = _read_graph_cache(graph_cache)
+            if cached is None:
+                self.graph_cache = "off"
+            graph_cache = None
+        if cached is not None:
+            model_bytes = cached
+        weights = _shared_initializers(model_bytes) if share_weights else None
+        self.shared_weights = weights is not None
+
+        self.sessions: List[OnnxDetector] = []
+        for i in range(n_sessions):
+            slice_ = None
+            if pin_cores and len(cores) >= n_sessions:
+                slice_ = [cores[(i * per + k) % len(cores)] for k in range(per)]
+            self.sessions.append(OnnxDetector(
+                model_bytes=model_bytes,
+                labels=labels,
+                n_threads=per,
+                cores=slice_,
+                shared_allocator=env_alloc,
+                model_hash=model_hash,
+                near_dups=near_dups,
+                precision=precision,
+                optimized=cached is not None,
+                graph_cache=graph_cache if cached is None and i == 0 else None,
+                shared_weights=weights,
+            ))
+            if cached is None and i == 0:
+                # la 1re session vient d'écrire le graphe optimisé : les suivantes le chargent
+                cached = _read_graph_cache(graph_cache)
+                if cached is not None:
+                    model_bytes = cached
+                elif self.graph_cache == "miss":
+                    self.graph_cache = "off"
+        self.load_timings["session_s"] = time.perf_counter() - t0
+        # les OrtValue restent vivantes : les sessions lisent leurs buffers
+        self._weights = weights
+        del model_bytes, cached
+
+        self.labels = labels
+        self.model_hash = model_hash
+        self.precision = precision
+        self.model_path = model_path
+        self.near_dups = near_dups
+        self.dynamic_batch = all(d.dynamic_batch for d in self.sessions)
+        self.threads_per_session = per
+        self._lock = threading.Lock()
+        self._busy = [0] * n_sessions
+        self._calls = [0] * n_sessions
+
+    def warmup(self, batch_sizes: List[int]) -> None:
+        for d in self.sessions:
+            d.warmup(batch_sizes)
+
+    def _acquire(self) -> Tuple[int, Optional[Set[int]]]:
+        with self._lock:
+            i = min(range(len(self._busy)), key=self._busy.__getitem__)
+            self._busy[i] += 1
+            self._calls[i] += 1
+        cores = self.sessions[i].cores
+        prev = None
+        if cores and hasattr(os, "sched_setaffinity"):
+            # 0 = thread appelant sous Linux ; masque d'origine rendu au release
+            # (le thread appartient à l'exécuteur partagé)
+            prev = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, cores)
+        return i, prev
+
+    def _release(self, i: int, prev: Optional[Set[int]]) -> None:
+        if prev is not None:
+            os.sched_setaffinity(0, prev)
+        with self._lock:
+            self._busy[i] -= 1
+
+    def detect_image(self, image_b64: Union[str, bytes], return_explanation: bool = False,
+                     timings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        i, prev = self._acquire()
+        try:
+            return self.sessions[i].detect_image(image_b64, return_explanation, timings)
+        finally:
+            self._release(i, prev)
+
+    def detect_batch(self, items: List[Tuple[Any, ...]]) -> List[Any]:
+        i, prev = self._acquire()
+        try:
+            return self.sessions[i].detect_batch(items)
+        finally:
+            self._release(i, prev)
+
+    def predict_rgb(self, frames: List[np.ndarray]) -> np.ndarray:
+        i, prev = self._acquire()
+        try:
+            return self.sessions[i].predict_rgb(frames)
+        finally:
+            self._release(i, prev)
+
+    def _label(self, idx: int) -> str:
+        return self.sessions[0]._label(idx)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "threads_per_session": self.threads_per_session,
+            "busy": list(self._busy),
+            "calls": list(self._calls),
+            "cores": [d.cores for d in self.sessions],
+            "shared_weights": self.shared_weights,
+            "shared_initializers": len(self._weights) if self._weights else 0,
+        }
+
+
+def _register_shared_allocator() -> bool:
+    try:
+        mem_info = ort.OrtMemoryInfo(
+            "Cpu", ort.OrtAllocatorType.ORT_ARENA_ALLOCATOR, 0, ort.OrtMemType.DEFAULT
+        )
+        ort.create_and_register_allocator(mem_info, None)
+        return True
+    except Exception:
+        # déjà enregistré ou ORT trop ancien : chaque session garde son arène
+        return False
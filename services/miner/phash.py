@@ -0,0 +1,146 @@
+# services/miner/phash.py
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Index de quasi-doublons : dHash 64 bits calculé sur la vignette déjà
+# décodée par le prétraitement, recherché dans un index "multi-index hashing"
+# (4 tables de 16 bits). Principe des tiroirs : deux hashes à distance de
+# Hamming <= r ont au moins un bloc de 16 bits à distance <= r // 4, donc on
+# sonde chaque table sur le bloc exact (+ ses 16 voisins à 1 bit si r >= 4).
+# Réutilise le résultat stocké au lieu de relancer session.run pour une image
+# redimensionnée, recompressée ou sans EXIF.
+
+_CHUNKS = 4
+_CHUNK_BITS = 16
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+MAX_SUPPORTED_DISTANCE = 2 * _CHUNKS - 1
+
+
+def dhash(rgb: np.ndarray) -> int:
+    # rgb : uint8 HWC (sortie de preprocess.load_rgb_crop)
+    g = Image.fromarray(rgb).convert("L").resize((9, 8), Image.BILINEAR)
+    px = np.asarray(g, dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class NearDupIndex:
+    def __init__(self, max_entries: int = 50_000, max_distance: int = 3) -> None:
+        if not 0 <= max_distance <= MAX_SUPPORTED_DISTANCE:
+            raise ValueError(f"max_distance must be in [0, {MAX_SUPPORTED_DISTANCE}]")
+        self.max_entries = max(0, int(max_entries))
+        self.max_distance = int(max_distance)
+        self.model_id: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(_CHUNKS)]
+        self._probe_bits = self.max_distance // _CHUNKS
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.candidates = 0
+
+    @staticmethod
+    def _chunks(h: int) -> List[int]:
+        return [(h >> (i * _CHUNK_BITS)) & _CHUNK_MASK for i in range(_CHUNKS)]
+
+    def _probe(self, c: int) -> List[int]:
+        if self._probe_bits == 0:
+            return [c]
+        return [c] + [c ^ (1 << b) for b in range(_CHUNK_BITS)]
+
+    def set_model(self, model_id: Optional[str]) -> None:
+        if model_id == self.model_id:
+            return
+        with self._lock:
+            if model_id == self.model_id:
+                return
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._tables = [{} for _ in range(_CHUNKS)]
+            self.model_id = model_id
+
+    def lookup(self, h: int) -> Optional[Tuple[Dict[str, Any], int]]:
+        # -> (résultat stocké, distance) du plus proche voisin <= max_distance
+        best: Optional[Tuple[int, int]] = None
+        with self._lock:
+            if h in self._entries:
+                best = (0, h)
+            else:
+                seen = set()
+                for i, c in enumerate(self._chunks(h)):
+                    table = self._tables[i]
+                    for probe in self._probe(c):
+                        for cand in table.get(probe, ()):
+                            if cand in seen:
+                                continue
+                            seen.add(cand)
+                            d = hamming(h, cand)
+                            if d <= self.max_distance and (best is None or d < best[0]):
+                                best = (d, cand)
+                self.candidates += len(seen)
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best[1])
+            return copy.deepcopy(self._entries[best[1]]), best[0]
+
+    def insert(self, h: int, result: Dict[str, Any]) -> None:
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            if h in self._entries:
+                self._entries[h] = copy.deepcopy(result)
+                self._entries.move_to_end(h)
+                return
+            self._entries[h] = copy.deepcopy(result)
+            for i, c in enumerate(self._chunks(h)):
+                self._tables[i].setdefault(c, []).append(h)
+            while len(self._entries) > self.max_entries:
+                old, _v = self._entries.popitem(last=False)
+                self._remove(old)
+                self.evictions += 1
+
+    def _remove(self, h: int) -> None:
+        for i, c in enumerate(self._chunks(h)):
+            bucket = self._tables[i].get(c)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(h)
+            except ValueError:
+                pass
+            if not bucket:
+                del self._tables[i][c]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_distance": self.max_distance,
+            "model_id": self.model_id,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "avg_candidates": round(self.candidates / lookups, 2) if lookups else 0.0,
+        }
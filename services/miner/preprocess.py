@@ -0,0 +1,123 @@
+# services/miner/preprocess.py
+import base64
+import io
+import os
+import threading
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+# Prétraitement ImageNet partagé (resize côté court 256 → crop 224, RGB, NCHW,
+# normalisation mean/std), utilisé par impl_onnx, app/infer.py et app/main.py.
+#
+#  - décodage JPEG en mode "draft" : la DCT est réduite (1/2, 1/4, 1/8) pour
+#    atterrir juste au-dessus de la taille cible au lieu de décoder 12 MP ;
+#  - resize + crop en une seule opération (paramètre `box` de PIL) ;
+#  - normalisation fusionnée (x * 1/(255*std) - mean/std) écrite directement
+#    dans un buffer NCHW préalloué et réutilisé par thread ;
+#  - garde-fou contre les "decompression bombs" (pixels max, formats autorisés).
+
+IMG_SIZE = 224
+RESIZE_SHORT = 256
+
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+ALLOWED_FORMATS = ("JPEG", "PNG", "WEBP", "GIF", "BMP")
+
+# PIL lève DecompressionBombError au-delà de 2x cette valeur ; on contrôle
+# nous-mêmes la limite exacte avant tout décodage (Image.open est paresseux).
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+_SCALE = (1.0 / (255.0 * STD)).reshape(3, 1, 1).astype(np.float32)
+_BIAS = (MEAN / STD).reshape(3, 1, 1).astype(np.float32)
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def decode_b64(image_b64: str) -> bytes:
+    # supporte data URL ou b64 pur
+    if image_b64.startswith("data:"):
+        image_b64 = image_b64.split(",", 1)[1]
+    return base64.b64decode(image_b64)
+
+
+def to_bytes(image: Union[str, bytes]) -> bytes:
+    # str = data URL / b64 ; bytes = octets bruts (chemin binaire)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return image
+    return decode_b64(image)
+
+
+def open_image(data: bytes, size: int = IMG_SIZE) -> Image.Image:
+    img = Image.open(io.BytesIO(data), formats=ALLOWED_FORMATS)
+    w, h = img.size
+    if w * h > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"image too large: {w}x{h} > {MAX_IMAGE_PIXELS} pixels")
+    if img.format == "JPEG":
+        # plus petite échelle DCT qui garde le côté court >= taille de resize
+        short = RESIZE_SHORT * size // IMG_SIZE
+        s = short / min(w, h)
+        if s < 1.0:
+            img.draft("RGB", (int(w * s + 0.5), int(h * s + 0.5)))
+    return img
+
+
+def _crop_box(w: int, h: int, size: int) -> Tuple[float, float, float, float]:
+    # équivalent, en coordonnées source, de "resize côté court 256 puis crop 224"
+    short = RESIZE_SHORT * size // IMG_SIZE
+    side = min(w, h) * size / short
+    left = (w - side) / 2.0
+    top = (h - side) / 2.0
+    return (left, top, left + side, top + side)
+
+
+def rgb_crop(img: Image.Image, size: int = IMG_SIZE) -> np.ndarray:
+    # image PIL déjà décodée (ex. frame vidéo) -> uint8 HWC (size, size, 3)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    box = _crop_box(img.width, img.height, size)
+    img = img.resize((size, size), Image.BILINEAR, box=box, reducing_gap=3.0)
+    return np.asarray(img)
+
+
+def load_rgb_crop(data: bytes, size: int = IMG_SIZE) -> np.ndarray:
+    # octets -> uint8 HWC (size, size, 3)
+    return rgb_crop(open_image(data, size), size)
+
+
+def normalize_into(rgb: np.ndarray, out: np.ndarray) -> np.ndarray:
+    # rgb : uint8 HWC ; out : float32 CHW (vue d'une ligne du batch NCHW)
+    np.multiply(rgb.transpose(2, 0, 1), _SCALE, out=out)
+    np.subtract(out, _BIAS, out=out)
+    return out
+
+
+def preprocess_into(data: bytes, out: np.ndarray) -> np.ndarray:
+    return normalize_into(load_rgb_crop(data, out.shape[-1]), out)
+
+
+def preprocess_bytes(data: bytes, size: int = IMG_SIZE, out: Optional[np.ndarray] = None) -> np.ndarray:
+    # -> (1, 3, size, size) float32 ; alloue si aucun buffer n'est fourni
+    if out is None:
+        out = np.empty((1, 3, size, size), dtype=np.float32)
+    preprocess_into(data, out[0])
+    return out
+
+
+# ---------- Buffers réutilisables ----------
+_local = threading.local()
+
+
+def batch_buffer(n: int, size: int = IMG_SIZE) -> np.ndarray:
+    # Buffer NCHW propre au thread appelant, agrandi au besoin et jamais rendu.
+    # Le contenu n'est valide que jusqu'au prochain appel sur le même thread.
+    buf = getattr(_local, "buf", None)
+    if buf is None or buf.shape[0] < n or buf.shape[-1] != size:
+        cap = max(n, buf.shape[0] if buf is not None and buf.shape[-1] == size else 0)
+        buf = np.empty((cap, 3, size, size), dtype=np.float32)
+        _local.buf = buf
+    return buf[:n]
@@ -0,0 +1,32 @@
+# services/miner/telemetry.py
+from services.common import metrics
+
+# Métriques du miner, partagées par api / cache / impl_onnx / batcher.
+# Séries pré-étiquetées : une observation = bisect + incréments sous verrou.
+
+STAGE = metrics.Histogram("miner_stage_seconds", "Durée par étape d'inférence (par image ou par batch)", ["stage"])
+st_fetch = STAGE.labels("fetch")              # source_url -> octets
+st_b64 = STAGE.labels("b64_decode")           # data URL / b64 -> octets
+st_decode = STAGE.labels("decode")            # octets -> RGB recadré (PIL)
+st_phash = STAGE.labels("phash")              # dHash + recherche quasi-doublon
+st_normalize = STAGE.labels("normalize")      # uint8 HWC -> float32 NCHW
+st_session_run = STAGE.labels("session_run")  # session.run + softmax, par batch
+st_format = STAGE.labels("format")            # top-1 / top-5 -> JSON
+st_queue_wait = STAGE.labels("queue_wait")    # attente dans le micro-batcher
+
+BATCH_SIZE = metrics.Histogram(
+    "miner_batch_size", "Images par session.run", buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+CACHE_LOOKUPS = metrics.Counter("miner_cache_lookups", "Recherches en cache par couche et issue", ["layer", "outcome"])
+result_hit = CACHE_LOOKUPS.labels("result", "hit")
+result_miss = CACHE_LOOKUPS.labels("result", "miss")
+near_dup_hit = CACHE_LOOKUPS.labels("near_dup", "hit")
+near_dup_miss = CACHE_LOOKUPS.labels("near_dup", "miss")
+
+REQUEST_SECONDS = metrics.Histogram("miner_request_seconds", "Durée totale par endpoint", ["endpoint"])
+REQUESTS = metrics.Counter("miner_requests", "Requêtes par endpoint et issue (ok ou code HTTP)", ["endpoint", "outcome"])
+
+READY = metrics.Gauge("miner_ready", "1 une fois le modèle chargé et chauffé")
+IN_FLIGHT = metrics.Gauge("miner_inflight_items", "Images en cours d'exécution sur un worker")
+PENDING = metrics.Gauge("miner_admitted_requests", "Requêtes admises non terminées")
+QUEUE_DEPTH = metrics.Gauge("miner_queue_depth", "Profondeur des files (admission, micro-batcher)", ["queue"])
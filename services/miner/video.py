@@ -0,0 +1,338 @@
+# services/miner/video.py
+import io
+import math
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+import av
+
+from services.common.urlguard import FETCH_ALLOWED_HOSTS, check_public_url_sync
+from services.miner.preprocess import IMG_SIZE, RESIZE_SHORT, rgb_crop
+
+# Inférence vidéo en flux : PyAV lit l'URL au fil de l'eau via _RangeReader
+# (requêtes Range pour les MP4 dont l'index est en fin de fichier), seules les
+# frames échantillonnées sont converties (déjà réduites à ~256 px) puis passées
+# au détecteur par batchs. Les probas par frame sont moyennées ; on s'arrête dès
+# que l'avance du top-1 sur le top-2 est significative.
+
+SAMPLING_MODES = ("keyframes", "fps")
+
+VIDEO_MAX_DURATION_S = float(os.getenv("VIDEO_MAX_DURATION_S", "60"))
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "1"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "64"))
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+VIDEO_MAX_MB = float(os.getenv("VIDEO_MAX_MB", "200"))  # octets téléchargés, Range compris
+VIDEO_TIMEOUT_S = float(os.getenv("VIDEO_TIMEOUT_S", "15"))
+
+# Arrêt anticipé : au moins VIDEO_MIN_FRAMES frames, et borne basse
+# (moyenne - z * erreur standard) de l'écart top-1 / top-2 > marge.
+# VIDEO_EARLY_EXIT_Z=0 désactive l'arrêt anticipé.
+VIDEO_MIN_FRAMES = int(os.getenv("VIDEO_MIN_FRAMES", "4"))
+VIDEO_EARLY_EXIT_MARGIN = float(os.getenv("VIDEO_EARLY_EXIT_MARGIN", "0.05"))
+VIDEO_EARLY_EXIT_Z = float(os.getenv("VIDEO_EARLY_EXIT_Z", "2.0"))
+
+_CHUNK = 64 * 1024
+_SKIP_MAX = 256 * 1024  # saut en avant plus court : lu et jeté plutôt qu'une nouvelle requête
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-\d+/(\d+|\*)")
+
+
+class VideoError(ValueError):
+    pass
+
+
+class ScoreAggregator:
+    def __init__(self, min_frames: int = VIDEO_MIN_FRAMES, margin: float = VIDEO_EARLY_EXIT_MARGIN,
+                 z: float = VIDEO_EARLY_EXIT_Z) -> None:
+        self.min_frames = max(2, int(min_frames))
+        self.margin = float(margin)
+        self.z = float(z)
+        self._probs: List[np.ndarray] = []
+        self._sum: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return sum(p.shape[0] for p in self._probs)
+
+    def add(self, probs: np.ndarray) -> None:
+        probs = np.array(probs, dtype=np.float32, copy=True)  # le buffer ORT est réutilisé
+        self._probs.append(probs)
+        s = probs.sum(axis=0)
+        self._sum = s if self._sum is None else self._sum + s
+
+    def mean(self) -> np.ndarray:
+        return self._sum / len(self)
+
+    def per_frame(self) -> np.ndarray:
+        return np.concatenate(self._probs)
+
+    def confident(self) -> bool:
+        n = len(self)
+        if self.z <= 0 or n < self.min_frames:
+            return False
+        a, b = np.argsort(-self.mean())[:2]
+        p = self.per_frame()
+        lead = p[:, a] - p[:, b]
+        lower = float(lead.mean()) - self.z * float(lead.std(ddof=1)) / math.sqrt(n)
+        return lower > self.margin
+
+
+def _guard_request(request: httpx.Request) -> None:
+    # appelé par httpx avant chaque requête, y compris après une redirection
+    try:
+        check_public_url_sync(str(request.url), FETCH_ALLOWED_HOSTS, "video_url")
+    except ValueError as e:
+        raise VideoError(str(e))
+
+
+class _RangeReader(io.RawIOBase):
+    # URL http(s) vue comme un fichier seekable pour PyAV. Chaque octet reçu
+    # est compté, sauts et relectures compris : au-delà de max_bytes la
+    # lecture s'arrête (EOF, truncated) et on garde les frames déjà vues.
+    # Seul http(s) est ouvert : pas de file:, pipe:, concat... côté ffmpeg ; et
+    # seulement https vers une adresse publique, redirections comprises
+    # (services/common/urlguard.py ; exemptions : FETCH_ALLOWED_HOSTS).
+    def __init__(self, url: str, max_bytes: int, timeout: float) -> None:
+        super().__init__()
+        self.url = url
+        self.max_bytes = max_bytes
+        self.size: Optional[int] = None
+        self.downloaded = 0
+        self.requests = 0
+        self.truncated = False
+        self._client = httpx.Client(
+            timeout=timeout, follow_redirects=True, event_hooks={"request": [_guard_request]},
+        )
+        self._resp: Optional[httpx.Response] = None
+        self._chunks: Iterator[bytes] = iter(())
+        self._buf = b""
+        self._buf_pos = 0  # position de _buf[0] dans le fichier
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            if self.size is None:
+                self._open(self._pos)
+            if self.size is None:
+                raise OSError("video size unknown")
+            pos = self.size + offset
+        else:
+            raise ValueError(f"unsupported whence: {whence}")
+        self._pos = max(0, pos)
+        return self._pos
+
+    def readinto(self, b: Any) -> int:
+        if self.truncated or (self.size is not None and self._pos >= self.size):
+            return 0
+        end = self._buf_pos + len(self._buf)
+        if self._resp is None or self._pos < self._buf_pos or self._pos > end + _SKIP_MAX:
+            self._open(self._pos)
+        while self._pos >= self._buf_pos + len(self._buf):
+            chunk = next(self._chunks, b"")
+            if not chunk:
+                return 0
+            self.downloaded += len(chunk)
+            if self.downloaded > self.max_bytes:
+                self.truncated = True
+                self._close_response()
+                return 0
+            self._buf_pos += len(self._buf)
+            self._buf = chunk
+        off = self._pos - self._buf_pos
+        n = min(len(b), len(self._buf) - off)
+        b[:n] = self._buf[off:off + n]
+        self._pos += n
+        return n
+
+    def _open(self, pos: int) -> None:
+        self._close_response()
+        req = self._client.build_request("GET", self.url, headers={"range": f"bytes={pos}-"})
+        resp = self._client.send(req, stream=True)
+        self.requests += 1
+        if resp.status_code == 416:
+            # au-delà de la fin
+            resp.close()
+            self.size = pos if self.size is None else self.size
+            return
+        if resp.status_code >= 400:
+            resp.close()
+            raise VideoError(f"cannot fetch video: HTTP {resp.status_code}")
+        start = 0
+        m = _CONTENT_RANGE.match(resp.headers.get("content-range", "")) if resp.status_code == 206 else None
+        if m:
+            start = int(m.group(1))
+            if m.group(2) != "*":
+                self.size = int(m.group(2))
+        elif resp.headers.get("content-length", "").isdigit():
+            # serveur sans Range : le corps repart de 0, readinto saute jusqu'à pos
+            self.size = int(resp.headers["content-length"])
+        self._resp = resp
+        self._chunks = resp.iter_bytes(_CHUNK)
+        self._buf = b""
+        self._buf_pos = start
+
+    def _close_response(self) -> None:
+        if self._resp is not None:
+            self._resp.close()
+            self._resp = None
+        self._chunks = iter(())
+
+    def close(self) -> None:
+        self._close_response()
+        self._client.close()
+        super().close()
+
+
+def _scaled_size(w: int, h: int, size: int) -> Tuple[int, int]:
+    # conversion RGB directement à ~256 px de côté court (comme le draft JPEG)
+    s = (RESIZE_SHORT * size // IMG_SIZE) / min(w, h)
+    if s >= 1.0:
+        return w, h
+    return max(1, int(w * s + 0.5)), max(1, int(h * s + 0.5))
+
+
+def _sampled_frames(container: Any, sampling: str, sample_fps: float, max_duration_s: float,
+                    stats: Dict[str, Any]) -> Iterator[Tuple[float, Any]]:
+    stream = container.streams.video[0]
+    if sampling == "keyframes":
+        # le décodeur saute tout sauf les images clés : coût ~ nombre de GOP
+        stream.codec_context.skip_frame = "NONKEY"
+    rate = float(stream.average_rate or stream.guessed_rate or 25)
+    step = 1.0 / sample_fps if sample_fps > 0 else 0.0
+    next_t = 0.0
+    for packet in container.demux(stream):
+        for frame in packet.decode():
+            stats["frames_decoded"] += 1
+            t = float(frame.time) if frame.time is not None else stats["frames_decoded"] / rate
+            if t > max_duration_s:
+                stats["stop_reason"] = "max_duration"
+                return
+            if sampling == "fps":
+                if t + 1e-6 < next_t:
+                    continue
+                next_t = t + step
+            yield t, frame
+    stats["stop_reason"] = "end"
+
+
+def analyze_video(
+    url: str,
+    predict: Callable[[List[np.ndarray]], np.ndarray],
+    label: Callable[[int], str],
+    max_duration_s: float = 6.0,
+    sampling: str = "keyframes",
+    sample_fps: float = VIDEO_SAMPLE_FPS,
+    max_frames: int = VIDEO_MAX_FRAMES,
+    batch_size: int = VIDEO_BATCH_SIZE,
+    return_explanation: bool = False,
+    size: int = IMG_SIZE,
+    aggregator: Optional[ScoreAggregator] = None,
+) -> Dict[str, Any]:
+    # predict : frames uint8 HWC (size, size, 3) -> probs (N, C) ; appelé depuis
+    # le thread de décodage, il peut déléguer au pool d'inférence
+    if sampling not in SAMPLING_MODES:
+        raise VideoError(f"sampling must be one of {SAMPLING_MODES}")
+    if not url.lower().startswith(("http://", "https://")):
+        raise VideoError("video_url must be http(s)")
+    try:
+        check_public_url_sync(url, FETCH_ALLOWED_HOSTS, "video_url")
+    except ValueError as e:
+        raise VideoError(str(e))
+    max_duration_s = min(float(max_duration_s), VIDEO_MAX_DURATION_S)
+    agg = aggregator or ScoreAggregator()
+    stats: Dict[str, Any] = {"frames_decoded": 0, "stop_reason": "end"}
+    times: List[float] = []
+    pending: List[np.ndarray] = []
+    batches = 0
+    infer_s = 0.0
+
+    def _flush() -> None:
+        nonlocal batches, infer_s
+        if pending:
+            t0 = time.perf_counter()
+            agg.add(predict(pending))
+            infer_s += time.perf_counter() - t0
+            batches += 1
+            pending.clear()
+
+    t_start = time.perf_counter()
+    reader = _RangeReader(url, int(VIDEO_MAX_MB * 1024 * 1024), VIDEO_TIMEOUT_S)
+    try:
+        container = av.open(reader, mode="r")
+    except av.error.FFmpegError as e:
+        reader.close()
+        raise VideoError(f"cannot open video: {e}")
+    except httpx.HTTPError as e:
+        reader.close()
+        raise VideoError(f"cannot fetch video: {e}")
+    try:
+        if not container.streams.video:
+            raise VideoError("no video stream")
+        frames = _sampled_frames(container, sampling, sample_fps, max_duration_s, stats)
+        for t, frame in frames:
+            w, h = _scaled_size(frame.width, frame.height, size)
+            pending.append(rgb_crop(frame.to_image(width=w, height=h), size))
+            times.append(t)
+            if len(pending) >= batch_size or len(times) >= max_frames:
+                _flush()
+                if agg.confident():
+                    stats["stop_reason"] = "confident"
+                    break
+                if len(times) >= max_frames:
+                    stats["stop_reason"] = "max_frames"
+                    break
+        frames.close()
+        _flush()
+    except av.error.FFmpegError as e:
+        raise VideoError(f"video decode error: {e}")
+    except httpx.HTTPError as e:
+        raise VideoError(f"cannot fetch video: {e}")
+    finally:
+        container.close()
+        reader.close()
+    if reader.truncated:
+        stats["stop_reason"] = "max_bytes"
+
+    if not times:
+        raise VideoError("no decodable video frame")
+
+    mean = agg.mean()
+    idx = int(np.argmax(mean))
+    per_frame = agg.per_frame()
+    total_s = time.perf_counter() - t_start
+    result: Dict[str, Any] = {
+        "detections": [{"label": label(idx), "score": round(float(mean[idx]), 6)}],
+        "frames": [{"t": round(t, 3), "score": round(float(p[idx]), 6)} for t, p in zip(times, per_frame)],
+        "video": {
+            "sampling": sampling,
+            "frames_decoded": stats["frames_decoded"],
+            "frames_inferred": len(times),
+            "batches": batches,
+            "analyzed_s": round(times[-1], 3),
+            "stop_reason": stats["stop_reason"],
+            "bytes_read": reader.downloaded,
+            "early_exit": stats["stop_reason"] == "confident",
+            "decode_ms": int((total_s - infer_s) * 1000),
+            "infer_ms": int(infer_s * 1000),
+        },
+    }
+    if return_explanation:
+        top5 = np.argsort(-mean)[:5].tolist()
+        result["explanation"] = {"top5": [{"label": label(i), "score": round(float(mean[i]), 6)} for i in top5]}
+    return result
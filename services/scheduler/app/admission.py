@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+# File d'admission du scheduler : au plus ADMISSION_MINER_CONCURRENCY dispatchs
+# en cours par miner (slots = ce nombre x nombre de miners). Au-delà, une file
+# par classe ; à chaque slot libéré, la classe servie est choisie par stride
+# scheduling (file équitable pondérée) : sous contention, priority passe
+# ADMISSION_WEIGHT_PRIORITY fois plus souvent que best_effort, sans l'affamer.
+# Un best_effort qui attend plus de ADMISSION_SHED_WAIT_MS est rejeté (429).
+
+ADMISSION_MINER_CONCURRENCY = int(os.getenv("ADMISSION_MINER_CONCURRENCY", "16"))  # 0 = pas de file
+ADMISSION_WEIGHT_PRIORITY = float(os.getenv("ADMISSION_WEIGHT_PRIORITY", "4"))
+ADMISSION_WEIGHT_BEST_EFFORT = float(os.getenv("ADMISSION_WEIGHT_BEST_EFFORT", "1"))
+ADMISSION_SHED_WAIT_MS = float(os.getenv("ADMISSION_SHED_WAIT_MS", "2000"))
+ADMISSION_PRIORITY_MAX_WAIT_MS = float(os.getenv("ADMISSION_PRIORITY_MAX_WAIT_MS", "0"))  # 0 = sans limite
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "1000"))  # par classe
+RETRY_AFTER_S = int(os.getenv("RETRY_AFTER_S", "1"))
+
+PRIORITY = "priority"
+BEST_EFFORT = "best_effort"
+
+
+class Shed(Exception):
+    def __init__(self, cls: str, reason: str) -> None:
+        super().__init__(f"{cls} request shed ({reason})")
+        self.cls = cls
+        self.reason = reason
+
+
+class FairQueue:
+    def __init__(
+        self,
+        slots: int,
+        weights: Optional[Dict[str, float]] = None,
+        max_wait_s: Optional[Dict[str, Optional[float]]] = None,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+    ) -> None:
+        self.slots = max(0, int(slots))
+        self.weights = weights or {PRIORITY: ADMISSION_WEIGHT_PRIORITY, BEST_EFFORT: ADMISSION_WEIGHT_BEST_EFFORT}
+        self.max_wait_s = max_wait_s or {}
+        self.max_queue = max_queue
+        self.busy = 0
+        self.queues: Dict[str, deque] = {c: deque() for c in self.weights}
+        self._pass = {c: 0.0 for c in self.weights}  # temps virtuel de chaque classe
+        self._vtime = 0.0
+        self.admitted = {c: 0 for c in self.weights}
+        self.shed = {c: 0 for c in self.weights}
+
+    # ---------- Admission ----------
+    @asynccontextmanager
+    async def admit(self, cls: str):
+        # renvoie l'attente en file (s) ; lève Shed si la classe est rejetée
+        t0 = time.perf_counter()
+        if self.slots and (self.busy >= self.slots or any(self.queues.values())):
+            await self._wait(cls)
+        else:
+            self.busy += 1
+        self.admitted[cls] += 1
+        try:
+            yield time.perf_counter() - t0
+        finally:
+            self._release()
+
+    async def _wait(self, cls: str) -> None:
+        q = self.queues[cls]
+        if len(q) >= self.max_queue:
+            self.shed[cls] += 1
+            raise Shed(cls, "queue_full")
+        if not q:
+            # classe qui (re)devient active : pas de crédit accumulé pendant l'inactivité
+            self._pass[cls] = max(self._pass[cls], self._vtime)
+        fut = asyncio.get_running_loop().create_future()
+        q.append(fut)
+        try:
+            await asyncio.wait({fut}, timeout=self.max_wait_s.get(cls))
+        except asyncio.CancelledError:
+            self._abandon(q, fut)
+            raise
+        if not fut.done():
+            self._abandon(q, fut)
+            self.shed[cls] += 1
+            raise Shed(cls, "wait")
+
+    def _abandon(self, q: deque, fut: asyncio.Future) -> None:
+        if fut.done() and not fut.cancelled():
+            self._release()  # slot transmis entre-temps : on le rend
+        else:
+            q.remove(fut)
+            fut.cancel()
+
+    def _release(self) -> None:
+        # le slot passe directement à la classe active de plus petit temps virtuel
+        active = [c for c, q in self.queues.items() if q]
+        if not active:
+            self.busy -= 1
+            return
+        cls = min(active, key=lambda c: self._pass[c])
+        self._vtime = self._pass[cls]
+        self._pass[cls] += 1.0 / self.weights[cls]
+        self.queues[cls].popleft().set_result(None)
+
+    def depth(self, cls: str) -> int:
+        return len(self.queues[cls])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "busy": self.busy,
+            "weights": self.weights,
+            "max_wait_ms": {c: (w * 1000.0 if w else None) for c, w in self.max_wait_s.items()},
+            "queue_depth": {c: len(q) for c, q in self.queues.items()},
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
@@ -0,0 +1,51 @@
+import os
+from typing import Dict, Optional
+
+# Hedging : si le miner choisi n'a pas répondu après un délai adaptatif (son
+# p95 récent), la même requête part vers un second miner ; la première réponse
+# gagne, l'autre est annulée. Le budget plafonne la charge ajoutée : chaque
+# requête crédite HEDGE_BUDGET jeton, chaque hedge en consomme un (0.05 = au
+# plus ~5 % de requêtes en double, HEDGE_BURST jetons d'avance au maximum).
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0").lower() in ("1", "true", "yes", "on")
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "10"))
+# tant qu'un miner a moins de HEDGE_MIN_SAMPLES latences mesurées, délai fixe
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "500"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "10"))
+
+
+class HedgeBudget:
+    def __init__(self, ratio: float = HEDGE_BUDGET, burst: float = HEDGE_BURST) -> None:
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+def hedge_delay_s(quantile_ms: Optional[float], samples: int) -> float:
+    if quantile_ms is None or samples < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_MS / 1000.0
+    return max(HEDGE_MIN_DELAY_MS, quantile_ms) / 1000.0
+
+
+def config() -> Dict:
+    return {
+        "enabled": HEDGE_ENABLED,
+        "quantile": HEDGE_QUANTILE,
+        "budget": HEDGE_BUDGET,
+        "burst": HEDGE_BURST,
+        "min_samples": HEDGE_MIN_SAMPLES,
+        "default_delay_ms": HEDGE_DEFAULT_DELAY_MS,
+        "min_delay_ms": HEDGE_MIN_DELAY_MS,
+    }
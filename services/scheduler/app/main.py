@@ -1,9 +1,18 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, HttpUrl
-import os, itertools, httpx, asyncio, time, random
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field, HttpUrl, ValidationError
+import os, httpx, asyncio, time, random, base64, binascii, json, logging
+from contextlib import asynccontextmanager
 from typing import List, Dict
+from services.common import consensus, metrics
+from services.common.batching import MicroBatcher
+from services.common.http import ClientPool
+from services.common.timing import REQUEST_ID_HEADER, SERVER_TIMING_HEADER, Timings, request_id
+from . import admission, hedging
+from .routing import Router
 
 app = FastAPI()
+log = logging.getLogger("uvicorn.error")
 
 MINER_URLS = [u.strip() for u in os.getenv("MINER_URLS", "http://127.0.0.1:6061").split(",") if u.strip()]
 if not MINER_URLS:
@@ -15,22 +24,118 @@ _miners: List[Dict] = [{
     "healthy": True,
     "fail_count": 0,
     "last_ok": 0.0,
+    "batch_max": None,  # images par POST batch annoncées par le miner (/info), 0 = pas d'endpoint batch
+    "votes": None,  # sa dernière réponse portait-elle un vote (consensus.miner_vote) ? None = inconnu
 } for u in MINER_URLS]
 
-# Round-robin séparé pour les healthy
-def _healthy_cycle():
-    while True:
-        healthy = [m for m in _miners if m["healthy"]]
-        pool = healthy if healthy else _miners[:]  # fallback sur tous si aucun healthy
-        for m in pool:
-            yield m
+# un client keep-alive par miner : connexions réutilisées entre requêtes et
+# health-checks, plafond de connexions propre à chaque miner
+MINER_MAX_CONNECTIONS = int(os.getenv("MINER_MAX_CONNECTIONS", "32"))
+MINER_HTTP2 = os.getenv("MINER_HTTP2", "0").lower() in ("1", "true", "yes", "on")
+_http: Dict[str, ClientPool] = {
+    u: ClientPool(u, timeout=20.0, max_connections=MINER_MAX_CONNECTIONS, http2=MINER_HTTP2)
+    for u in MINER_URLS
+}
+
+# métriques Prometheus (/metrics)
+_DISPATCH_SECONDS = metrics.Histogram("scheduler_dispatch_seconds", "Durée d'un dispatch, retries compris", ["endpoint"])
+_ATTEMPT_SECONDS = metrics.Histogram("scheduler_attempt_seconds", "Durée d'une tentative vers un miner", ["miner"])
+_ATTEMPTS = metrics.Counter("scheduler_attempts", "Tentatives par miner et issue", ["miner", "outcome"])
+_RETRIES = metrics.Counter("scheduler_retries", "Tentatives supplémentaires après un échec", ["endpoint"])
+_REQUESTS = metrics.Counter("scheduler_requests", "Dispatchs par endpoint et issue", ["endpoint", "outcome"])
+_INFLIGHT = metrics.Gauge("scheduler_inflight_requests", "Dispatchs en cours", ["endpoint"])
+_HEALTHY = metrics.Gauge("scheduler_miner_healthy", "1 si le miner est marqué healthy", ["miner"])
+for _m in _miners:
+    _HEALTHY.labels(_m["url"]).set_function(lambda m=_m: 1.0 if m["healthy"] else 0.0)
+
+# Sélection du miner (ROUTING_POLICY=p2c | lor | round_robin), voir routing.py
+_router = Router(_miners, max_in_flight=admission.ADMISSION_MINER_CONCURRENCY)
+_SCORE = metrics.Gauge("scheduler_miner_score", "Coût de routage du miner (plus bas = préféré)", ["miner"])
+_LATENCY = metrics.Gauge("scheduler_miner_latency_ms", "Latence EWMA vue par le scheduler", ["miner"])
+_MINER_INFLIGHT = metrics.Gauge("scheduler_miner_inflight", "Requêtes en cours par miner", ["miner"])
+for _m in _miners:
+    _SCORE.labels(_m["url"]).set_function(lambda u=_m["url"]: _router.score(u))
+    _LATENCY.labels(_m["url"]).set_function(lambda u=_m["url"]: _router.latency_ms(u))
+    _MINER_INFLIGHT.labels(_m["url"]).set_function(lambda u=_m["url"]: _router.stats[u].in_flight)
+
+# Hedging des requêtes image (HEDGE_ENABLED=1), voir hedging.py
+_hedge_budget = hedging.HedgeBudget()
+_HEDGES = metrics.Counter("scheduler_hedges", "Hedges par endpoint et issue (fired, won, lost, denied)", ["endpoint", "result"])
+_HEDGE_TOKENS = metrics.Gauge("scheduler_hedge_budget_tokens", "Jetons de hedge disponibles")
+_HEDGE_TOKENS.set_function(lambda: _hedge_budget.tokens)
+
+# File d'admission par classe (priority = détenteurs PRVX éligibles, marqués
+# par le gateway), voir admission.py
+_queue = admission.FairQueue(
+    admission.ADMISSION_MINER_CONCURRENCY * len(_miners),
+    max_wait_s={
+        admission.BEST_EFFORT: admission.ADMISSION_SHED_WAIT_MS / 1000.0,
+        admission.PRIORITY: (admission.ADMISSION_PRIORITY_MAX_WAIT_MS / 1000.0) or None,
+    },
+)
+_QUEUE_DEPTH = metrics.Gauge("scheduler_admission_queue_depth", "Dispatchs en attente d'un slot par classe", ["class"])
+_QUEUE_WAIT = metrics.Histogram("scheduler_admission_wait_seconds", "Attente avant admission par classe", ["class"])
+_SHED = metrics.Counter("scheduler_admission_shed", "Dispatchs rejetés (429) par classe et motif", ["class", "reason"])
+_SLOTS_BUSY = metrics.Gauge("scheduler_admission_slots_busy", "Slots de dispatch occupés")
+_SLOTS_BUSY.set_function(lambda: _queue.busy)
+for _c in _queue.weights:
+    _QUEUE_DEPTH.labels(_c).set_function(lambda c=_c: _queue.depth(c))
 
-_rr = _healthy_cycle()
+# Fan-out : la requête part vers k miners distincts en parallèle, le consensus
+# (z-score + moyenne tronquée, même algorithme que le validator) est calculé
+# ici ; dès qu'un quorum de réponses s'accorde à CONSENSUS_TOLERANCE près, les
+# retardataires sont annulés. k / quorum / timeout réglables par requête.
+COMMITTEE_SIZE_IMAGE = int(os.getenv("COMMITTEE_SIZE_IMAGE", "1"))
+COMMITTEE_SIZE_VIDEO = int(os.getenv("COMMITTEE_SIZE_VIDEO", "1"))
+CONSENSUS_QUORUM = int(os.getenv("CONSENSUS_QUORUM", "0"))  # 0 = majorité du comité
+CONSENSUS_TOLERANCE = float(os.getenv("CONSENSUS_TOLERANCE", "0.1"))
+CONSENSUS_TIMEOUT_MS = int(os.getenv("CONSENSUS_TIMEOUT_MS", "10000"))
+OUTLIER_Z = float(os.getenv("OUTLIER_Z", "2.0"))
+TRIM_RATIO = float(os.getenv("TRIM_RATIO", "0.2"))
+_CONSENSUS_FIELDS = {"committee_size", "quorum", "consensus_timeout_ms"}
+_FANOUT = metrics.Counter("scheduler_fanout", "Dispatchs multi-miners par issue (early, complete, timeout, no_vote)", ["endpoint", "result"])
+# Dispatch par lots : les images en attente (requêtes unitaires regroupées
+# pendant DISPATCH_BATCH_MAX_WAIT_MS, ou reçues déjà groupées sur
+# /dispatch/image/batch) partent en un POST /infer/image/batch par miner,
+# découpé à la capacité annoncée par chaque miner ; chaque appelant récupère
+# son résultat. Même MicroBatcher que l'inférence côté miner.
+DISPATCH_BATCH_SINGLES = os.getenv("DISPATCH_BATCH_SINGLES", "1").lower() in ("1", "true", "yes", "on")
+DISPATCH_BATCH_MAX_ITEMS = int(os.getenv("DISPATCH_BATCH_MAX_ITEMS", "32"))
+DISPATCH_BATCH_MAX_WAIT_MS = float(os.getenv("DISPATCH_BATCH_MAX_WAIT_MS", "2"))
+DISPATCH_BATCH_MAX_INFLIGHT = int(os.getenv("DISPATCH_BATCH_MAX_INFLIGHT", str(2 * len(MINER_URLS))))
+DISPATCH_BATCH_MAX_REQUEST_ITEMS = int(os.getenv("DISPATCH_BATCH_MAX_REQUEST_ITEMS", "256"))
+_BATCH_PATH = "/infer/image/batch"
+_dbatcher: MicroBatcher | None = None
+_BATCH_SIZE = metrics.Histogram("scheduler_dispatch_batch_size", "Images par POST batch vers un miner", ["miner"],
+                                buckets=(1, 2, 4, 8, 16, 32, 64))
+_BATCH_SECONDS = metrics.Histogram("scheduler_dispatch_batch_seconds", "Durée d'un POST batch vers un miner", ["miner"])
+_BATCH_WAIT = metrics.Histogram("scheduler_dispatch_batch_wait_seconds", "Attente d'une image avant l'envoi de son lot")
+_BATCH_FALLBACK = metrics.Counter("scheduler_dispatch_batch_fallback", "Images renvoyées en POST unitaire, par motif", ["reason"])
+_FANOUT_ANSWERS = metrics.Histogram("scheduler_fanout_answers", "Réponses retenues par dispatch multi-miners",
+                                    ["endpoint"], buckets=(1, 2, 3, 4, 5, 7, 10))
 
 @app.on_event("startup")
 async def _start():
+    global _dbatcher
     # boucle de health-check en tâche de fond
     asyncio.create_task(_health_loop())
+    if max(COMMITTEE_SIZE_IMAGE, COMMITTEE_SIZE_VIDEO) > 1 and not consensus.AI_LABELS:
+        log.warning("consensus: COMMITTEE_SIZE_* > 1 but CONSENSUS_AI_LABELS is empty; only miners that "
+                    "return an explicit \"prob\" can vote, fan-out is skipped otherwise")
+    _dbatcher = MicroBatcher(
+        _send_batch,
+        max_batch_size=DISPATCH_BATCH_MAX_ITEMS,
+        max_wait_ms=DISPATCH_BATCH_MAX_WAIT_MS,
+        max_inflight_batches=DISPATCH_BATCH_MAX_INFLIGHT,
+        on_queue_wait=_BATCH_WAIT.observe,
+    )
+    _dbatcher.start()
+
+@app.on_event("shutdown")
+async def _stop():
+    if _dbatcher is not None:
+        await _dbatcher.stop()
+    await asyncio.gather(*[p.aclose() for p in _http.values()])
 
 async def _health_loop():
     # ping régulier des miners, baisse/relève le flag healthy
@@ -39,14 +144,21 @@ async def _health_loop():
         await asyncio.sleep(10)
 
 async def _check_one(m: Dict):
-    url = f'{m["url"]}/health'
+    # /ready : 503 tant que le miner charge / chauffe son modèle ;
+    # /health pour les miners qui n'exposent pas /ready
     try:
-        async with httpx.AsyncClient(timeout=5.0) as cx:
-            r = await cx.get(url)
-            m["healthy"] = (r.status_code == 200)
-            if m["healthy"]:
-                m["fail_count"] = 0
-                m["last_ok"] = time.time()
+        cx = _http[m["url"]].client
+        r = await cx.get(f'{m["url"]}/ready', timeout=5.0)
+        if r.status_code == 404:
+            r = await cx.get(f'{m["url"]}/health', timeout=5.0)
+        m["healthy"] = (r.status_code == 200)
+        if m["healthy"]:
+            m["fail_count"] = 0
+            m["last_ok"] = time.time()
+            if m["batch_max"] is None:
+                r = await cx.get(f'{m["url"]}/info', timeout=5.0)
+                cap = r.json().get("capacity", {}) if r.status_code == 200 else {}
+                m["batch_max"] = int(cap.get("max_batch_items", 0))
     except Exception:
         m["healthy"] = False
 
@@ -56,56 +168,584 @@ def health():
         "status": "ok",
         "miners": [m["url"] for m in _miners],
         "status_by_miner": [
-            {"url": m["url"], "healthy": m["healthy"], "fail_count": m["fail_count"], "last_ok": m["last_ok"]}
+            {"url": m["url"], "healthy": m["healthy"], "fail_count": m["fail_count"], "last_ok": m["last_ok"],
+             "batch_max": m["batch_max"], "votes": m["votes"], "http": _http[m["url"]].stats()}
             for m in _miners
         ],
+        "routing": _router.snapshot(),
+        "admission": _queue.stats(),
+        "dispatch_batching": {"singles": DISPATCH_BATCH_SINGLES,
+                              **(_dbatcher.stats() if _dbatcher is not None else {})},
+        "hedging": {**hedging.config(), "tokens": round(_hedge_budget.tokens, 2)},
+        "consensus": {
+            "committee_size_image": COMMITTEE_SIZE_IMAGE, "committee_size_video": COMMITTEE_SIZE_VIDEO,
+            "quorum": CONSENSUS_QUORUM or "majority", "tolerance": CONSENSUS_TOLERANCE,
+            "timeout_ms": CONSENSUS_TIMEOUT_MS, "outlier_z": OUTLIER_Z, "trim_ratio": TRIM_RATIO,
+            "ai_labels": list(consensus.AI_LABELS),
+        },
     }
 
-class ImageReq(BaseModel):
+class ConsensusOpts(BaseModel):
+    # None = valeur du scheduler (COMMITTEE_SIZE_*, CONSENSUS_QUORUM, CONSENSUS_TIMEOUT_MS)
+    committee_size: int | None = Field(None, ge=1)
+    quorum: int | None = Field(None, ge=1)
+    consensus_timeout_ms: int | None = Field(None, ge=1)
+
+class QosOpts(BaseModel):
+    # posés par le gateway après vérification du solde PRVX
+    priority: bool = False
+    prvx_address: str | None = None
+
+class ImageReq(ConsensusOpts, QosOpts):
     source_url: HttpUrl | None = None
     image_b64: str | None = None
+    return_explanation: bool = False
+
+class BatchReq(BaseModel):
+    items: List[ImageReq]
 
-class VideoReq(BaseModel):
+class VideoReq(ConsensusOpts, QosOpts):
     video_url: HttpUrl
+    max_duration_sec: int = 6
+    sampling: str = "keyframes"
+    sample_fps: float | None = None
+    return_explanation: bool = False
+
+def _committee(path: str, opts: ConsensusOpts, default_size: int) -> Dict | None:
+    # None = un seul miner (chemin historique : retries, hedging)
+    k = min(opts.committee_size or default_size, len(_miners))
+    if k <= 1:
+        return None
+    # fan-out inutile si moins de deux miners peuvent voter : k fois la charge
+    # et la latence du plus lent, sans consensus au bout
+    k = min(k, len([m for m in _miners if m["votes"] is not False]))
+    if k <= 1:
+        _FANOUT.labels(path, "no_vote").inc()
+        _warn_no_vote()
+        return None
+    quorum = opts.quorum or CONSENSUS_QUORUM or k // 2 + 1
+    timeout_ms = opts.consensus_timeout_ms or CONSENSUS_TIMEOUT_MS
+    return {"k": k, "quorum": max(1, min(quorum, k)), "timeout_s": timeout_ms / 1000.0}
+
+_no_vote_warned = 0.0
+
+def _warn_no_vote() -> None:
+    # au plus une fois par minute : le fan-out demandé est ignoré
+    global _no_vote_warned
+    if time.monotonic() - _no_vote_warned < 60.0:
+        return
+    _no_vote_warned = time.monotonic()
+    log.warning(
+        "consensus: committee requested but no miner answer carries a vote (no \"prob\" and no detection "
+        "label in CONSENSUS_AI_LABELS=%r); fan-out skipped, single-miner dispatch used instead",
+        ",".join(consensus.AI_LABELS),
+    )
+
+async def _forward_json(path: str, payload: dict, timing: Timings | None = None, hedge: bool = False,
+                        committee: Dict | None = None, priority: bool = False):
+    return await _forward(path, timing, hedge, committee, priority, json=payload)
+
+async def _forward(path: str, timing: Timings | None = None, hedge: bool = False, committee: Dict | None = None,
+                   priority: bool = False, batch_item: tuple | None = None, **request_kwargs):
+    # durée totale, requêtes en cours et issue par endpoint miner
+    if timing is not None:
+        request_kwargs["headers"] = {**request_kwargs.get("headers", {}), REQUEST_ID_HEADER: timing.request_id}
+    cls = admission.PRIORITY if priority else admission.BEST_EFFORT
+    inflight = _INFLIGHT.labels(path)
+    inflight.inc()
+    t0 = time.perf_counter()
+    try:
+        async with _admitted(cls, timing):
+            if committee is not None:
+                data = await _fan_out(path, committee, timing, request_kwargs)
+            elif batch_item is not None:
+                data = await _dispatch_batched(batch_item, timing)
+            else:
+                data = await _forward_attempts(path, timing, hedge, **request_kwargs)
+    except HTTPException as e:
+        _REQUESTS.labels(path, str(e.status_code)).inc()
+        raise
+    finally:
+        inflight.dec()
+        _DISPATCH_SECONDS.labels(path).observe(time.perf_counter() - t0)
+    _REQUESTS.labels(path, "ok").inc()
+    return data
+
+@asynccontextmanager
+async def _admitted(cls: str, timing: Timings | None):
+    # slot de dispatch ; 429 si la classe est délestée (attente ou file trop longues)
+    try:
+        async with _queue.admit(cls) as waited:
+            _QUEUE_WAIT.labels(cls).observe(waited)
+            if timing is not None:
+                timing.add("sched.queue", waited * 1000.0, cls)
+            yield
+    except admission.Shed as e:
+        _SHED.labels(e.cls, e.reason).inc()
+        headers = {"Retry-After": str(admission.RETRY_AFTER_S)}
+        if timing is not None:
+            headers[SERVER_TIMING_HEADER] = timing.header()
+        raise HTTPException(429, f"scheduler_overloaded: {e}", headers=headers)
 
-async def _forward_json(path: str, payload: dict):
-    # retry avec backoff doux
+async def _forward_attempts(path: str, timing: Timings | None = None, hedge: bool = False, **request_kwargs):
+    # retry avec backoff doux ; request_kwargs = json=... ou content=/headers=/params= (binaire)
+    # timing : une étape sched.attemptN par tentative (miner + issue), sched.hedgeN
+    # pour un hedge, puis les étapes miner.* renvoyées par le miner retenu
+    hedge = hedge and hedging.HEDGE_ENABLED
+    if hedge:
+        _hedge_budget.deposit()
     errors = []
+    tried: List[str] = []
     for attempt in range(3):
-        target = next(_rr)
-        url = f'{target["url"]}{path}'
+        if attempt:
+            _RETRIES.labels(path).inc()
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(20.0)) as cx:
-                r = await cx.post(url, json=payload)
-                if r.status_code >= 400:
-                    raise HTTPException(r.status_code, f'miner error: {r.text}')
-                data = r.json()
-                data["miner_url"] = target["url"]
-                # succès → on marque healthy
-                target["healthy"] = True
-                target["fail_count"] = 0
-                target["last_ok"] = time.time()
-                return data
+            if hedge:
+                data, server_timing = await _hedged_attempt(path, attempt, tried, errors, timing, request_kwargs)
+            else:
+                data, server_timing = await _attempt(_pick(tried), path, attempt, errors, timing, request_kwargs)
         except HTTPException as e:
-            target["fail_count"] += 1
-            target["healthy"] = False
-            errors.append((url, f'HTTP {e.status_code}'))
-        except Exception as e:
-            target["fail_count"] += 1
-            target["healthy"] = False
-            errors.append((url, str(e)))
-        await asyncio.sleep(0.2 * (attempt + 1) + random.random() * 0.1)
+            if _client_error(e):
+                raise  # entrée refusée par le miner : même verdict ailleurs, pas de retry
+            if e.status_code in (429, 503):
+                # miner saturé (file d'admission pleine) : on réessaie ailleurs sans le déclasser
+                await _backoff(timing, 0.05 + random.random() * 0.05)
+                continue
+        except Exception:
+            pass
+        else:
+            if timing is not None:
+                timing.merge(server_timing)
+            return data
+        await _backoff(timing, 0.2 * (attempt + 1) + random.random() * 0.1)
 
     # si on est ici, 3 tentatives ont échoué
     detail = "; ".join([f"{u}: {msg}" for u, msg in errors])
-    raise HTTPException(502, f"All miners failed: {detail}")
+    headers = {SERVER_TIMING_HEADER: timing.header()} if timing is not None else None
+    raise HTTPException(502, f"All miners failed: {detail}", headers=headers)
 
-@app.post("/dispatch/image")
-async def dispatch_image(req: ImageReq):
+def _client_error(e: BaseException) -> bool:
+    # 4xx du miner (image illisible, requête invalide) : faute du client, pas du miner
+    return isinstance(e, HTTPException) and 400 <= e.status_code < 500 and e.status_code != 429
+
+def _miner_detail(r: httpx.Response):
+    # "detail" FastAPI du miner tel quel, sinon le corps brut
+    try:
+        return r.json()["detail"]
+    except Exception:
+        return r.text
+
+def _pick(tried: List[str]) -> Dict:
+    target = _router.pick(exclude=tried)
+    tried.append(target["url"])
+    return target
+
+async def _attempt(target: Dict, path: str, attempt: int, errors: list, timing: Timings | None,
+                   request_kwargs: dict, label: str = "attempt", batch_items: int = 0):
+    # un POST vers un miner ; renvoie (données, Server-Timing du miner) ou lève.
+    # batch_items > 0 : POST d'un lot, sa durée ne compte pas comme latence d'une requête
+    url = f'{target["url"]}{path}'
+    seconds = (_BATCH_SECONDS if batch_items else _ATTEMPT_SECONDS).labels(target["url"])
+    t0 = time.perf_counter()
+    outcome = "error"
+    _router.begin(target["url"])
+    routed_ok = False  # 4xx client (image invalide...) : latence valable, pas une erreur du miner
+    cancelled = False
+    try:
+        r = await _http[target["url"]].client.post(url, **request_kwargs)
+        seconds.observe(time.perf_counter() - t0)
+        outcome = str(r.status_code)
+        if 400 <= r.status_code < 500 and r.status_code != 429:
+            raise HTTPException(r.status_code, _miner_detail(r))
+        if r.status_code >= 400:
+            raise HTTPException(r.status_code, f'miner error: {r.text}')
+        data = r.json()
+        data["miner_url"] = target["url"]
+        if path != _BATCH_PATH:
+            target["votes"] = consensus.miner_vote(data) is not None
+        # succès → on marque healthy
+        target["healthy"] = True
+        target["fail_count"] = 0
+        target["last_ok"] = time.time()
+        _ATTEMPTS.labels(target["url"], "ok").inc()
+        if timing is not None:
+            _attempt_timing(timing, label, attempt, target["url"], outcome, t0)
+        routed_ok = True
+        return data, r.headers.get(SERVER_TIMING_HEADER)
+    except HTTPException as e:
+        routed_ok = e.status_code < 500 and e.status_code != 429
+        _ATTEMPTS.labels(target["url"], str(e.status_code)).inc()
+        errors.append((url, f'HTTP {e.status_code}'))
+        if timing is not None:
+            _attempt_timing(timing, label, attempt, target["url"], outcome, t0)
+        if e.status_code >= 500 and e.status_code != 503:
+            target["fail_count"] += 1
+            target["healthy"] = False
+        raise
+    except asyncio.CancelledError:
+        # hedge perdant (ou client parti) : ni erreur ni latence pour le routage
+        cancelled = True
+        _ATTEMPTS.labels(target["url"], "cancelled").inc()
+        if timing is not None:
+            _attempt_timing(timing, label, attempt, target["url"], "cancelled", t0)
+        raise
+    except Exception as e:
+        if isinstance(e, httpx.HTTPError):  # échec du POST lui-même (connexion, timeout)
+            seconds.observe(time.perf_counter() - t0)
+        outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+        _ATTEMPTS.labels(target["url"], outcome).inc()
+        if timing is not None:
+            _attempt_timing(timing, label, attempt, target["url"], outcome, t0)
+        target["fail_count"] += 1
+        target["healthy"] = False
+        errors.append((url, str(e)))
+        raise
+    finally:
+        if cancelled:
+            _router.cancel(target["url"])
+        elif batch_items:
+            _router.end_batch(target["url"], time.perf_counter() - t0, batch_items, routed_ok)
+        else:
+            _router.end(target["url"], time.perf_counter() - t0, routed_ok)
+
+async def _hedged_attempt(path: str, attempt: int, tried: List[str], errors: list, timing: Timings | None,
+                          request_kwargs: dict):
+    # tentative principale ; passé le délai de hedge (p95 du miner), même requête
+    # vers un second miner si le budget le permet, la première réponse gagne
+    primary = _pick(tried)
+    tasks = [asyncio.create_task(_attempt(primary, path, attempt, errors, timing, request_kwargs))]
+    try:
+        delay = hedging.hedge_delay_s(
+            _router.quantile_ms(primary["url"], hedging.HEDGE_QUANTILE),
+            len(_router.stats[primary["url"]].recent_ms),
+        )
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            other = _router.pick(exclude=tried)
+            if other["url"] in tried:
+                pass  # aucun autre miner disponible
+            elif not _hedge_budget.try_spend():
+                _HEDGES.labels(path, "denied").inc()
+            else:
+                tried.append(other["url"])
+                _HEDGES.labels(path, "fired").inc()
+                tasks.append(asyncio.create_task(
+                    _attempt(other, path, attempt, errors, timing, request_kwargs, label="hedge")))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in tasks:
+                if t in done and (t.exception() is None or _client_error(t.exception())):
+                    if len(tasks) > 1:
+                        _HEDGES.labels(path, "won" if t is tasks[1] else "lost").inc()
+                    return t.result()  # 4xx : relevée tout de suite, l'autre miner dirait pareil
+        return tasks[0].result()  # tout a échoué : on relève l'erreur du miner principal
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _fan_out(path: str, committee: Dict, timing: Timings | None, request_kwargs: dict) -> dict:
+    # une tentative par miner du comité (pas de retry : les autres votent),
+    # arrêt anticipé dès qu'un quorum s'accorde, puis consensus sur les réponses reçues
+    k, quorum = committee["k"], committee["quorum"]
+    t0 = time.perf_counter()
+    targets: List[Dict] = []
+    tried: List[str] = [m["url"] for m in _miners if m["votes"] is False]  # ne votent pas
+    while len(targets) < k:
+        m = _router.pick(exclude=tried)
+        if m["url"] in tried:
+            break
+        tried.append(m["url"])
+        targets.append(m)
+    errors: list = []
+    tasks = {
+        asyncio.create_task(_attempt(m, path, i, errors, timing, request_kwargs, label="leg")): m["url"]
+        for i, m in enumerate(targets)
+    }
+    answers: List[tuple] = []  # (url, données, Server-Timing, vote (label, proba) | None)
+    refused: HTTPException | None = None  # 4xx d'un miner : renvoyée si personne ne répond
+    pending = set(tasks)
+    deadline = t0 + committee["timeout_s"]
+    result = "complete"
+    try:
+        while pending:
+            left = deadline - time.perf_counter()
+            if left <= 0:
+                result = "timeout"
+                break
+            done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    data, server_timing = t.result()
+                    answers.append((tasks[t], data, server_timing, consensus.miner_vote(data)))
+                elif _client_error(t.exception()):
+                    refused = t.exception()
+            votes = [a[3] for a in answers if a[3] is not None]
+            if pending and len(votes) >= quorum and consensus.agreeing_votes(votes, CONSENSUS_TOLERANCE) >= quorum:
+                result = "early"
+                break
+    finally:
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)  # bilan routage / timing des annulés
+    _FANOUT.labels(path, result).inc()
+    _FANOUT_ANSWERS.labels(path).observe(len(answers))
+    if timing is not None:
+        timing.add("sched.fanout", (time.perf_counter() - t0) * 1000.0,
+                   f"k={len(targets)} answered={len(answers)} quorum={quorum} result={result}")
+    if not answers and refused is not None:
+        raise refused
+    if not answers:
+        detail = "; ".join([f"{u}: {msg}" for u, msg in errors]) or "timeout"
+        headers = {SERVER_TIMING_HEADER: timing.header()} if timing is not None else None
+        raise HTTPException(502, f"No miner answered: {detail}", headers=headers)
+
+    votes = [a[3] for a in answers if a[3] is not None]
+    if votes:
+        # consensus sur le label le plus voté ; les autres labels ne comptent pas
+        labels = [v[0] for v in votes]
+        label = max(labels, key=labels.count)
+        voters = [a for a in answers if a[3] is not None and a[3][0] == label]
+        verdict = consensus.assess([a[3][1] for a in voters], OUTLIER_Z, TRIM_RATIO)
+        if len(voters) < len(votes):
+            verdict["flags"].append("label_split")
+        # réponse renvoyée = celle du miner le plus proche du consensus
+        best = min(voters, key=lambda a: abs(a[3][1] - verdict["consensus_prob"]))
+    else:
+        verdict = {"flags": ["no_prob"]}
+        best = answers[0]
+    if consensus.agreeing_votes(votes, CONSENSUS_TOLERANCE) < quorum:
+        verdict["flags"].append("no_quorum")
+    if timing is not None:
+        timing.merge(best[2])
+    return {
+        **best[1],
+        **verdict,
+        "committee": {
+            "size": len(targets),
+            "quorum": quorum,
+            "answered": len(answers),
+            "result": result,
+            "votes": [{"miner_url": a[0], "label": a[3][0] if a[3] else None, "prob": a[3][1] if a[3] else None}
+                      for a in answers],
+        },
+    }
+
+async def _dispatch_batched(item: tuple, timing: Timings | None) -> dict:
+    # item = (octets, content-type, return_explanation, corps JSON d'origine | None) ; attend son lot
+    data, info = await _dbatcher.submit(item)
+    if timing is not None and info is not None:
+        timing.add("sched.batch", info["ms"], f'miner={info["miner"]} size={info["size"]}')
+        timing.merge(info["server_timing"])  # étapes du lot entier (miner.batch, miner.total)
+    return data
+
+async def _send_batch(items: List[tuple]) -> list:
+    # un lot -> un POST par miner, au plus batch_max images chacun
+    results: list = [None] * len(items)
+    todo = list(range(len(items)))
+    used: List[str] = []
+    sends = []
+    while todo:
+        m = _router.pick(exclude=used)
+        used.append(m["url"])
+        n = max(1, min(m["batch_max"] or 1, DISPATCH_BATCH_MAX_ITEMS))
+        chunk, todo = todo[:n], todo[n:]
+        sends.append(_send_chunk(m, chunk, items, results))
+    await asyncio.gather(*sends)
+    return results
+
+async def _send_chunk(m: Dict, idx: List[int], items: List[tuple], results: list) -> None:
+    if not m["batch_max"]:
+        # miner sans /infer/image/batch (ou capacité pas encore connue) : POST unitaires
+        _BATCH_FALLBACK.labels("no_batch_endpoint").inc(len(idx))
+        await asyncio.gather(*[_send_single(i, items, results) for i in idx])
+        return
+    files = [("image", (str(i), items[i][0], items[i][1])) for i in idx]
+    meta = json.dumps([{"return_explanation": items[i][2]} for i in idx])
+    t0 = time.perf_counter()
+    try:
+        data, server_timing = await _attempt(m, _BATCH_PATH, 0, [], None, {"files": files, "data": {"items": meta}},
+                                             label="batch", batch_items=len(idx))
+        answers = data["results"]
+        if len(answers) != len(idx):
+            raise ValueError(f"{len(answers)} results for {len(idx)} images")
+    except Exception:
+        # lot entier en échec : chaque image repart seule (retries sur les autres miners)
+        _BATCH_FALLBACK.labels("batch_failed").inc(len(idx))
+        await asyncio.gather(*[_send_single(i, items, results) for i in idx])
+        return
+    _BATCH_SIZE.labels(m["url"]).observe(len(idx))
+    info = {"miner": m["url"], "size": len(idx), "ms": (time.perf_counter() - t0) * 1000.0,
+            "server_timing": server_timing}
+    retry = []
+    for i, res in zip(idx, answers):
+        err = res.get("error")
+        if err is None:
+            res["miner_url"] = m["url"]
+            m["votes"] = consensus.miner_vote(res) is not None
+            results[i] = (res, info)
+        elif err.get("status") in (429, 503):
+            retry.append(i)  # file du miner pleine : l'image repart seule, ailleurs
+        else:
+            status = err.get("status", 502)
+            detail = err.get("detail") if 400 <= status < 500 else f'miner error: {err.get("detail")}'
+            results[i] = HTTPException(status, detail)
+    if retry:
+        _BATCH_FALLBACK.labels("item_overloaded").inc(len(retry))
+        await asyncio.gather(*[_send_single(i, items, results) for i in retry])
+
+async def _send_single(i: int, items: List[tuple], results: list) -> None:
+    # repli unitaire dans la forme d'arrivée : une image reçue en JSON repart sur
+    # /infer/image (servi par tous les miners, legacy compris), une image reçue
+    # en binaire sur /infer/image/raw
+    data, ct, expl, body = items[i]
+    try:
+        if body is not None:
+            res = await _forward_attempts("/infer/image", None, False, json=body)
+        else:
+            res = await _forward_attempts("/infer/image/raw", None, False, content=data, headers={"content-type": ct},
+                                          params={"return_explanation": str(expl).lower()})
+        results[i] = (res, None)
+    except Exception as e:
+        results[i] = e
+
+def _attempt_timing(timing: Timings, label: str, attempt: int, miner: str, outcome: str, t0: float) -> None:
+    timing.add(f"sched.{label}{attempt + 1}", (time.perf_counter() - t0) * 1000.0, f"miner={miner} status={outcome}")
+
+async def _backoff(timing: Timings | None, delay_s: float) -> None:
+    await asyncio.sleep(delay_s)
+    if timing is not None:
+        timing.add("sched.backoff", delay_s * 1000.0)
+
+def _timed(response: Response, timing: Timings, data: dict) -> dict:
+    timing.add("sched.total", timing.elapsed_ms())
+    response.headers[SERVER_TIMING_HEADER] = timing.header()
+    response.headers[REQUEST_ID_HEADER] = timing.request_id
+    return data
+
+def _truthy(v: str | None) -> bool:
+    return (v or "").strip().lower() in ("1", "true", "yes", "on")
+
+def _batchable(committee: Dict | None) -> bool:
+    # hedge et fan-out raisonnent par requête : pas de regroupement
+    return committee is None and not hedging.HEDGE_ENABLED
+
+def _b64_bytes(image_b64: str) -> bytes:
+    try:
+        return base64.b64decode(image_b64.split(",", 1)[-1])
+    except (binascii.Error, ValueError):
+        raise HTTPException(400, "invalid image_b64")
+
+async def _dispatch_image(req: ImageReq, timing: Timings | None, batch: bool) -> dict:
     if not (req.image_b64 or req.source_url):
         raise HTTPException(400, "image_b64 or source_url required")
-    return await _forward_json("/infer/image", req.model_dump(mode="json"))
+    committee = _committee("/infer/image", req, COMMITTEE_SIZE_IMAGE)
+    body = req.model_dump(mode="json", exclude=_CONSENSUS_FIELDS)
+    if batch and req.image_b64 and _batchable(committee):
+        item = (_b64_bytes(req.image_b64), "application/octet-stream", req.return_explanation, body)
+        return await _forward("/infer/image", timing, priority=req.priority, batch_item=item)
+    return await _forward_json("/infer/image", body, timing, hedge=True, committee=committee, priority=req.priority)
+
+@app.post("/dispatch/image")
+async def dispatch_image(req: ImageReq, response: Response, x_request_id: str | None = Header(None)):
+    timing = Timings(request_id(x_request_id))
+    data = await _dispatch_image(req, timing, DISPATCH_BATCH_SINGLES)
+    return _timed(response, timing, data)
+
+async def _read_dispatch_batch(request: Request) -> list:
+    # JSON {"items": [ImageReq]} ou multipart comme /infer/image/batch du miner :
+    # parties "image" (octets bruts, dans l'ordre) + champ "items" (options JSON
+    # par image) -> ImageReq ou (octets, content-type, options)
+    ct = request.headers.get("content-type", "application/json")
+    if ct.split(";", 1)[0].strip().lower() == "multipart/form-data":
+        form = await request.form()
+        images = [(await f.read(), f.content_type or "application/octet-stream")
+                  for f in form.getlist("image") if not isinstance(f, str)]
+        try:
+            opts = json.loads(form.get("items") or "[]")
+        except ValueError:
+            raise HTTPException(400, "invalid 'items' field")
+        if not isinstance(opts, list) or not all(isinstance(o, dict) for o in opts):
+            raise HTTPException(400, "'items' must be a JSON list of objects")
+        opts += [{}] * (len(images) - len(opts))
+        return [(data, img_ct, o) for (data, img_ct), o in zip(images, opts)]
+    try:
+        return BatchReq.model_validate_json(await request.body()).items
+    except ValidationError as e:
+        raise HTTPException(422, e.errors(include_url=False))
+
+@app.post("/dispatch/image/batch")
+async def dispatch_image_batch(request: Request, response: Response, x_request_id: str | None = Header(None)):
+    # plusieurs images en un appel ; une erreur ne touche que son image
+    items = await _read_dispatch_batch(request)
+    if not items:
+        raise HTTPException(400, "empty batch")
+    if len(items) > DISPATCH_BATCH_MAX_REQUEST_ITEMS:
+        raise HTTPException(413, f"batch too large ({len(items)} > {DISPATCH_BATCH_MAX_REQUEST_ITEMS})")
+    timing = Timings(request_id(x_request_id))
+
+    async def _one(item) -> dict:
+        try:
+            if isinstance(item, ImageReq):
+                return await _dispatch_image(item, None, True)
+            data, img_ct, opts = item
+            if not data:
+                raise HTTPException(400, "empty image body")
+            params = {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in opts.items() if v is not None}
+            return await _dispatch_raw(data, img_ct, params, None, True)
+        except HTTPException as e:
+            return {"error": {"status": e.status_code, "detail": e.detail}}
+
+    results = await asyncio.gather(*[_one(it) for it in items])
+    return _timed(response, timing, {"results": results})
+
+@app.post("/dispatch/image/raw")
+async def dispatch_image_raw(request: Request, response: Response, x_request_id: str | None = Header(None)):
+    # octets de l'image relayés tels quels au miner (ni b64 ni JSON)
+    data = await request.body()
+    if not data:
+        raise HTTPException(400, "empty image body")
+    timing = Timings(request_id(x_request_id))
+    result = await _dispatch_raw(data, request.headers.get("content-type", "application/octet-stream"),
+                                 dict(request.query_params), timing, DISPATCH_BATCH_SINGLES)
+    return _timed(response, timing, result)
+
+async def _dispatch_raw(data: bytes, content_type: str, params: dict, timing: Timings | None, batch: bool) -> dict:
+    # params : options en chaînes (query string) ; le reste est relayé au miner
+    try:
+        opts = ConsensusOpts(**{f: params.pop(f) for f in _CONSENSUS_FIELDS if f in params})
+        qos = QosOpts(**{f: params[f] for f in ("priority", "prvx_address") if f in params})
+    except ValidationError as e:
+        raise HTTPException(422, e.errors(include_url=False))
+    headers = {"content-type": content_type}
+    committee = _committee("/infer/image/raw", opts, COMMITTEE_SIZE_IMAGE)
+    batch_item = None
+    if batch and _batchable(committee):
+        batch_item = (data, content_type, _truthy(params.get("return_explanation")), None)
+    return await _forward(
+        "/infer/image/raw",
+        timing,
+        hedge=True,
+        committee=committee,
+        priority=qos.priority,
+        batch_item=batch_item,
+        content=data,
+        headers=headers,
+        params=params,
+    )
 
 @app.post("/dispatch/video")
-async def dispatch_video(req: VideoReq):
-    return await _forward_json("/infer/video", req.model_dump(mode="json"))
+async def dispatch_video(req: VideoReq, response: Response, x_request_id: str | None = Header(None)):
+    timing = Timings(request_id(x_request_id))
+    # pas de hedge : une vidéo coûte des secondes de calcul, la doubler coûte trop cher
+    data = await _forward_json("/infer/video", req.model_dump(mode="json", exclude=_CONSENSUS_FIELDS), timing,
+                               committee=_committee("/infer/video", req, COMMITTEE_SIZE_VIDEO), priority=req.priority)
+    return _timed(response, timing, data)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not metrics.enabled():
+        raise HTTPException(404, "metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,198 @@
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+# Choix du miner par requête, d'après ce que le scheduler observe lui-même :
+# latence (EWMA), requêtes en cours, taux d'erreur (EWMA). Coût d'un miner
+# (plus bas = meilleur), chaque poids à 0 neutralise son signal :
+#
+#   (W_LATENCY * latence_ms + 1) * (1 + W_INFLIGHT * en_cours) * (1 + W_ERRORS * taux_erreur)
+#
+# Politiques : p2c (deux miners tirés au hasard, le moins coûteux gagne),
+# lor (moins de requêtes en cours, coût en départage), round_robin (historique).
+
+ROUTING_POLICIES = ("p2c", "lor", "round_robin")
+ROUTING_POLICY = os.getenv("ROUTING_POLICY", "p2c").lower()
+ROUTING_EWMA_ALPHA = float(os.getenv("ROUTING_EWMA_ALPHA", "0.3"))
+ROUTING_W_LATENCY = float(os.getenv("ROUTING_W_LATENCY", "1.0"))
+ROUTING_W_INFLIGHT = float(os.getenv("ROUTING_W_INFLIGHT", "1.0"))
+ROUTING_W_ERRORS = float(os.getenv("ROUTING_W_ERRORS", "4.0"))
+# une mesure ancienne retourne vers la moyenne du parc (un miner lent qui ne
+# reçoit plus de trafic finit par être réessayé)
+ROUTING_DECAY_S = float(os.getenv("ROUTING_DECAY_S", "30"))
+# latences récentes (succès) gardées par miner pour les quantiles (hedging)
+ROUTING_LATENCY_WINDOW = int(os.getenv("ROUTING_LATENCY_WINDOW", "256"))
+
+
+class MinerStats:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.ewma_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_update = 0.0
+        self.recent_ms: deque = deque(maxlen=ROUTING_LATENCY_WINDOW)
+        # POST batch (/infer/image/batch) : durée d'un lot entier, à part de la
+        # latence par requête (coût p2c/lor, délai de hedge)
+        self.batch_ewma_ms: Optional[float] = None
+        self.batch_item_ewma_ms: Optional[float] = None
+        self.batches = 0
+
+    def observe(self, latency_s: float, ok: bool, alpha: float) -> None:
+        ms = latency_s * 1000.0
+        if ok:
+            self.recent_ms.append(ms)
+        self.ewma_ms = ms if self.ewma_ms is None else self.ewma_ms + alpha * (ms - self.ewma_ms)
+        self.last_update = time.monotonic()  # âge de ewma_ms (décroissance vers le parc)
+        self._observe_outcome(ok, alpha)
+
+    def observe_batch(self, latency_s: float, items: int, ok: bool, alpha: float) -> None:
+        if ok:
+            ms = latency_s * 1000.0
+            per_item = ms / max(1, items)
+            self.batch_ewma_ms = ms if self.batch_ewma_ms is None else self.batch_ewma_ms + alpha * (ms - self.batch_ewma_ms)
+            self.batch_item_ewma_ms = (per_item if self.batch_item_ewma_ms is None
+                                       else self.batch_item_ewma_ms + alpha * (per_item - self.batch_item_ewma_ms))
+            self.batches += 1
+        self._observe_outcome(ok, alpha)
+
+    def _observe_outcome(self, ok: bool, alpha: float) -> None:
+        self.error_rate += alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        self.requests += 1
+        self.errors += 0 if ok else 1
+
+
+class Router:
+    def __init__(
+        self,
+        miners: List[Dict],
+        policy: str = ROUTING_POLICY,
+        alpha: float = ROUTING_EWMA_ALPHA,
+        w_latency: float = ROUTING_W_LATENCY,
+        w_inflight: float = ROUTING_W_INFLIGHT,
+        w_errors: float = ROUTING_W_ERRORS,
+        decay_s: float = ROUTING_DECAY_S,
+        max_in_flight: int = 0,
+    ) -> None:
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"ROUTING_POLICY must be one of {ROUTING_POLICIES}, got {policy!r}")
+        self.miners = miners  # dicts partagés avec main.py (url, healthy, ...)
+        self.policy = policy
+        self.alpha = alpha
+        self.w_latency = w_latency
+        self.w_inflight = w_inflight
+        self.w_errors = w_errors
+        self.decay_s = decay_s
+        self.max_in_flight = max_in_flight  # 0 = pas de plafond par miner
+        self.stats: Dict[str, MinerStats] = {m["url"]: MinerStats(m["url"]) for m in miners}
+        self._rr = 0
+
+    # ---------- Sélection ----------
+    def _candidates(self, exclude: Iterable[str]) -> List[Dict]:
+        healthy = [m for m in self.miners if m["healthy"]]
+        pool = healthy or self.miners  # fallback sur tous si aucun healthy
+        # on évite le miner qui vient d'échouer tant qu'il reste un autre choix
+        others = [m for m in pool if m["url"] not in exclude] or pool
+        if self.max_in_flight:
+            # miners sous leur plafond de requêtes en cours, s'il y en a
+            free = [m for m in others if self.stats[m["url"]].in_flight < self.max_in_flight]
+            others = free or others
+        return others
+
+    def _fleet_ms(self) -> float:
+        known = [s.ewma_ms for s in self.stats.values() if s.ewma_ms is not None]
+        return sum(known) / len(known) if known else 0.0
+
+    def latency_ms(self, url: str, fleet_ms: Optional[float] = None) -> float:
+        s = self.stats[url]
+        fleet = self._fleet_ms() if fleet_ms is None else fleet_ms
+        if s.ewma_ms is None:
+            return fleet  # miner jamais mesuré : ni favorisé ni pénalisé
+        if self.decay_s <= 0:
+            return s.ewma_ms
+        w = math.exp(-(time.monotonic() - s.last_update) / self.decay_s)
+        return fleet + (s.ewma_ms - fleet) * w
+
+    def score(self, url: str, fleet_ms: Optional[float] = None) -> float:
+        s = self.stats[url]
+        return (
+            (self.w_latency * self.latency_ms(url, fleet_ms) + 1.0)
+            * (1.0 + self.w_inflight * s.in_flight)
+            * (1.0 + self.w_errors * s.error_rate)
+        )
+
+    def quantile_ms(self, url: str, q: float) -> Optional[float]:
+        recent = sorted(self.stats[url].recent_ms)
+        if not recent:
+            return None
+        return recent[min(len(recent) - 1, int(q * len(recent)))]
+
+    def pick(self, exclude: Iterable[str] = ()) -> Dict:
+        cands = self._candidates(set(exclude))
+        if len(cands) == 1:
+            return cands[0]
+        if self.policy == "round_robin":
+            self._rr = (self._rr + 1) % len(cands)
+            return cands[self._rr]
+        fleet = self._fleet_ms()
+        if self.policy == "p2c":
+            a, b = random.sample(cands, 2)
+            return a if self.score(a["url"], fleet) <= self.score(b["url"], fleet) else b
+        # lor : en cours d'abord, coût ensuite, hasard pour les ex aequo
+        random.shuffle(cands)
+        return min(cands, key=lambda m: (self.stats[m["url"]].in_flight, self.score(m["url"], fleet)))
+
+    # ---------- Retour d'expérience ----------
+    def begin(self, url: str) -> None:
+        self.stats[url].in_flight += 1
+
+    def end(self, url: str, latency_s: float, ok: bool) -> None:
+        s = self.stats[url]
+        s.in_flight = max(0, s.in_flight - 1)
+        s.observe(latency_s, ok, self.alpha)
+
+    def end_batch(self, url: str, latency_s: float, items: int, ok: bool) -> None:
+        # un lot : taux d'erreur commun, latence dans ses propres stats
+        s = self.stats[url]
+        s.in_flight = max(0, s.in_flight - 1)
+        s.observe_batch(latency_s, items, ok, self.alpha)
+
+    def cancel(self, url: str) -> None:
+        # requête abandonnée (hedge perdant) : latence inconnue, rien à apprendre
+        s = self.stats[url]
+        s.in_flight = max(0, s.in_flight - 1)
+
+    def snapshot(self) -> Dict:
+        fleet = self._fleet_ms()
+        return {
+            "policy": self.policy,
+            "weights": {"latency": self.w_latency, "inflight": self.w_inflight, "errors": self.w_errors},
+            "ewma_alpha": self.alpha,
+            "decay_s": self.decay_s,
+            "miners": [
+                {
+                    "url": s.url,
+                    "score": round(self.score(s.url, fleet), 3),
+                    "latency_ms": round(self.latency_ms(s.url, fleet), 3),
+                    "ewma_ms": _round(s.ewma_ms),
+                    "p95_ms": _round(self.quantile_ms(s.url, 0.95)),
+                    "in_flight": s.in_flight,
+                    "error_rate": round(s.error_rate, 4),
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "batches": s.batches,
+                    "batch_ewma_ms": _round(s.batch_ewma_ms),
+                    "batch_item_ewma_ms": _round(s.batch_item_ewma_ms),
+                }
+                for s in self.stats.values()
+            ],
+        }
+
+
+def _round(v: Optional[float]) -> Optional[float]:
+    return round(v, 3) if v is not None else None